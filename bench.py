@@ -0,0 +1,200 @@
+"""Mesures de performance des opérations de Database et de BinaryFile.
+
+Chaque mesure est faite sur une table synthétique semblable à cours (MNEMONIQUE, NOM, COORDINATEUR, CREDITS), remplie
+de rows entrées dont les chaînes ont string_length caractères. Elle donne, par opération, le débit (opérations par
+seconde) et les latences p50 et p99 (en µs). Les opérations de BinaryFile sont mesurées sur un fichier de la taille de
+la table. Les tirages sont faits avec une graine fixe: deux exécutions mesurent exactement les mêmes opérations.
+
+Les résultats peuvent être sauvés dans un fichier JSON de référence (--save), auquel les exécutions suivantes sont
+comparées (--baseline): une opération dont le débit baisse ou dont la latence p50 monte de plus de la tolérance est
+une régression, et le programme se termine alors avec le code 1.
+
+Usage: python3 bench.py [--rows 10000 100000 1000000] [--string-length 20] [--samples 200] [--budget 2]
+                        [--format uldb|heap|columnar] [--journal off|sync|group] [--seed 0]
+                        [--save baseline.json] [--baseline baseline.json] [--tolerance 0.25]
+"""
+from binary import BinaryFile
+from database import Database, FieldType, JournalMode, TableFormat
+from time import perf_counter
+from typing import Callable
+import argparse
+import json
+import os
+import random
+import string
+import sys
+import tempfile
+
+Result = dict[str, float]
+
+MIN_SAMPLES = 3 # Nombre minimal d'appels mesurés par opération, même au-delà du budget de temps
+LOAD_BATCH = 1000 # Nombre d'entrées ajoutées par appel de add_entries pour remplir la table
+LETTERS = string.ascii_letters + ' '
+
+
+def synthetic_entry(mnemonique: int, string_length: int, rng: random.Random) -> Database.Entry:
+    """Renvoie une entrée de la table synthétique, dont les chaînes ont string_length caractères."""
+    return {'MNEMONIQUE': mnemonique, 'NOM': random_string(string_length, rng),
+            'COORDINATEUR': random_string(string_length, rng), 'CREDITS': rng.choice((5, 10, 15))}
+
+
+def random_string(length: int, rng: random.Random) -> str:
+    """Renvoie une chaîne de length caractères tirés au hasard."""
+    return ''.join(rng.choices(LETTERS, k = length))
+
+
+def percentile(latencies: list[float], q: float) -> float:
+    """Renvoie le q-quantile (0 <= q <= 1) des latencies triées, par la méthode du rang le plus proche."""
+    return latencies[min(len(latencies) - 1, max(0, round(q * len(latencies)) - 1))]
+
+
+def measure(operation: Callable[[int], object], samples: int, budget: float, weight: float = 1) -> Result:
+    """Mesure operation(i) pour i = 0, 1, ..., samples - 1, en s'arrêtant après budget secondes (mais pas avant
+       MIN_SAMPLES appels). weight est le nombre (moyen) d'opérations faites par appel, pour le débit."""
+    latencies = []
+    total = 0.0
+    for i in range(samples):
+        start = perf_counter()
+        operation(i)
+        latency = perf_counter() - start
+        latencies.append(latency)
+        total += latency
+        if total >= budget and len(latencies) >= MIN_SAMPLES:
+            break
+    latencies.sort()
+    return {'samples': len(latencies), 'throughput': len(latencies) * weight / total if total else float('inf'),
+            'p50': percentile(latencies, 0.50) * 1e6, 'p99': percentile(latencies, 0.99) * 1e6}
+
+
+def bench_database(rows: int, string_length: int, samples: int, budget: float, table_format: TableFormat,
+                   journal_mode: JournalMode, seed: int) -> tuple[dict[str, Result], int]:
+    """Remplit une table synthétique de rows entrées puis mesure ses opérations.
+       Renvoie les résultats par opération et la taille du fichier de la table."""
+    rng = random.Random(seed)
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        db = Database(os.path.join(directory, 'bench'))
+        db.table_format, db.journal_mode = table_format, journal_mode
+        db.create_table('cours', ('MNEMONIQUE', FieldType.INTEGER), ('NOM', FieldType.STRING),
+                        ('COORDINATEUR', FieldType.STRING), ('CREDITS', FieldType.INTEGER))
+        batches = [[synthetic_entry(mnemonique, string_length, rng) for mnemonique in range(start, min(start + LOAD_BATCH, rows))]
+                   for start in range(0, rows, LOAD_BATCH)]
+        # Le remplissage n'est pas limité par le budget: la table doit avoir ses rows entrées
+        results['add_entries'] = measure(lambda i: db.add_entries('cours', batches[i]), len(batches), float('inf'),
+                                         rows / len(batches))
+        new_entries = [synthetic_entry(rows + i, string_length, rng) for i in range(samples)]
+        results['add_entry'] = measure(lambda i: db.add_entry('cours', new_entries[i]), samples, budget)
+        ids = [rng.randrange(1, rows + 1) for _ in range(samples)]
+        results['get_entry(id)'] = measure(lambda i: db.get_entry('cours', 'id', ids[i]), samples, budget)
+        mnemoniques = rng.sample(range(rows), min(samples, rows))
+        results['get_entries'] = measure(lambda i: db.get_entries('cours', 'MNEMONIQUE', mnemoniques[i]),
+                                         len(mnemoniques), budget)
+        # Des noms de longueurs différentes obligent à déplacer les chaînes dans le string buffer
+        names = [random_string(string_length + i % 7, rng) for i in range(samples)]
+        results['update_entries'] = measure(lambda i: db.update_entries('cours', 'id', ids[i], 'NOM', names[i]),
+                                            samples, budget)
+        results['delete_entries'] = measure(lambda i: db.delete_entries('cours', 'MNEMONIQUE', mnemoniques[i]),
+                                            len(mnemoniques), budget)
+        table_size = os.path.getsize(os.path.join(directory, 'bench', 'cours.table'))
+        db.close()
+    return results, table_size
+
+
+def bench_binary_file(file_size: int, string_length: int, samples: int, budget: float, seed: int) -> dict[str, Result]:
+    """Mesure les lectures et écritures à une position de BinaryFile dans un fichier de file_size bytes."""
+    rng = random.Random(seed)
+    text = random_string(string_length, rng)
+    # Les chaînes sont écrites à des positions alignées sur leur taille: elles ne se chevauchent pas
+    SLOT = string_length + 2
+    positions = [rng.randrange(max(file_size // SLOT, 1)) * SLOT for _ in range(samples)]
+    results = {}
+    with tempfile.TemporaryFile() as f:
+        f.write(bytes(max(file_size, SLOT)))
+        file = BinaryFile(f)
+        results['write_string_to'] = measure(lambda i: file.write_string_to(text, positions[i]), samples, budget)
+        results['read_string_from'] = measure(lambda i: file.read_string_from(positions[i]), samples, budget)
+        results['write_integer_to'] = measure(lambda i: file.write_integer_to(i, 4, positions[i]), samples, budget)
+        results['read_integer_from'] = measure(lambda i: file.read_integer_from(4, positions[i]), samples, budget)
+        results['get_size'] = measure(lambda i: file.get_size(), samples, budget)
+    return results
+
+
+def run(row_counts: list[int], string_length: int = 20, samples: int = 200, budget: float = 2.0,
+        table_format: TableFormat = TableFormat.ULDB, journal_mode: JournalMode = JournalMode.OFF,
+        seed: int = 0) -> dict[str, Result]:
+    """Fait toutes les mesures pour chaque nombre d'entrées de row_counts.
+       Renvoie les résultats par clé <opération>@<nombre d'entrées>."""
+    results = {}
+    for rows in row_counts:
+        database_results, table_size = bench_database(rows, string_length, samples, budget, table_format,
+                                                      journal_mode, seed)
+        file_results = bench_binary_file(table_size, string_length, samples, budget, seed)
+        for operation, result in (database_results | {f'BinaryFile.{name}': result for name, result in file_results.items()}).items():
+            results[f'{operation}@{rows}'] = result
+    return results
+
+
+def compare(results: dict[str, Result], baseline: dict[str, Result], tolerance: float) -> list[str]:
+    """Renvoie les régressions de results par rapport à baseline: les opérations mesurées dans les deux dont le débit
+       est plus petit ou la latence p50 plus grande que dans baseline, de plus de tolerance (0.25 pour 25%)."""
+    regressions = []
+    for key, result in results.items():
+        if key not in baseline:
+            continue
+        reference = baseline[key]
+        if result['throughput'] < reference['throughput'] * (1 - tolerance):
+            regressions.append(f"{key}: {result['throughput']:.0f} op/s instead of {reference['throughput']:.0f} op/s")
+        elif result['p50'] > reference['p50'] * (1 + tolerance):
+            regressions.append(f"{key}: p50 {result['p50']:.1f} µs instead of {reference['p50']:.1f} µs")
+    return regressions
+
+
+def report(results: dict[str, Result], baseline: dict[str, Result] | None = None) -> str:
+    """Renvoie le tableau des résultats, avec l'écart de débit par rapport à baseline s'il est donné."""
+    lines = [f"{'operation':<38}{'samples':>8}{'op/s':>13}{'p50 µs':>12}{'p99 µs':>12}"]
+    for key, result in results.items():
+        line = f"{key:<38}{result['samples']:>8}{result['throughput']:>13.0f}{result['p50']:>12.1f}{result['p99']:>12.1f}"
+        if baseline is not None and key in baseline:
+            line += f"{result['throughput'] / baseline[key]['throughput'] - 1:>+9.0%}"
+        lines.append(line)
+    return '\n'.join(lines)
+
+
+def main(argv: list[str] | None = None) -> int:
+    """Lance les mesures selon les arguments de la ligne de commande (cf. usage) et renvoie le code de sortie."""
+    parser = argparse.ArgumentParser(description = 'Mesures de performance de Database et de BinaryFile.')
+    parser.add_argument('--rows', type = int, nargs = '+', default = [10_000, 100_000])
+    parser.add_argument('--string-length', type = int, default = 20)
+    parser.add_argument('--samples', type = int, default = 200, help = "appels mesurés par opération")
+    parser.add_argument('--budget', type = float, default = 2.0, help = "secondes de mesure maximales par opération")
+    parser.add_argument('--format', choices = ('uldb', 'heap', 'columnar'), default = 'uldb')
+    parser.add_argument('--journal', choices = ('off', 'sync', 'group'), default = 'off')
+    parser.add_argument('--seed', type = int, default = 0)
+    parser.add_argument('--save', help = "fichier JSON où sauver les résultats comme référence")
+    parser.add_argument('--baseline', help = "fichier JSON de référence auquel comparer les résultats")
+    parser.add_argument('--tolerance', type = float, default = 0.25)
+    arguments = parser.parse_args(argv)
+    parameters = {'string_length': arguments.string_length, 'format': arguments.format, 'journal': arguments.journal}
+    baseline = None
+    if arguments.baseline is not None:
+        with open(arguments.baseline, encoding = 'utf-8') as baseline_file:
+            stored = json.load(baseline_file)
+        if stored['parameters'] != parameters:
+            print(f"Warning: the baseline was measured with {stored['parameters']}", file = sys.stderr)
+        baseline = stored['results']
+    results = run(arguments.rows, arguments.string_length, arguments.samples, arguments.budget,
+                  TableFormat[arguments.format.upper()], JournalMode[arguments.journal.upper()], arguments.seed)
+    print(report(results, baseline))
+    if arguments.save is not None:
+        with open(arguments.save, 'w', encoding = 'utf-8') as baseline_file:
+            json.dump({'parameters': parameters, 'results': results}, baseline_file, indent = 2)
+    if baseline is None:
+        return 0
+    regressions = compare(results, baseline, arguments.tolerance)
+    for regression in regressions:
+        print(f"Regression: {regression}", file = sys.stderr)
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,26 +1,58 @@
-from typing import BinaryIO
+from typing import BinaryIO, TYPE_CHECKING
+import io
+import mmap
+import os
+import struct
+
+if TYPE_CHECKING:
+    from stats import Stats
+    from wal import Journal
 
 #TODO: J'aurai besoin de ça -> bytes.expandtabs(tabsize)
 class BinaryFile:
-    def __init__(self, file: BinaryIO):
-        """Constructeur de BinaryFile"""
+    STRING_READ_AHEAD = 62 # Bytes lus en plus de la longueur d'une chaîne pour la lire, le plus souvent, en un seul appel
+    stats: 'Stats | None' = None # Collecteur de l'opération de Database en cours de mesure (cf. stats)
+
+    def __init__(self, file: BinaryIO, journal: 'Journal | None' = None):
+        """Constructeur de BinaryFile. Si journal est donné, les écritures à une position passent par ce journal
+           (cf. wal) au lieu d'être faites en place."""
         self.file = file
+        try:
+            # Les méthodes *_to et *_from lisent et écrivent directement à une position (pread/pwrite)
+            self.fd = file.fileno() if hasattr(os, 'pread') else None
+        except (AttributeError, io.UnsupportedOperation):
+            self.fd = None
+        self.journal = journal
+        self.journal_name = os.path.basename(file.name) if journal is not None else None
+        if self.stats is not None:
+            self.stats.opens += 1
 
 
     def goto(self, pos: int) -> None:
         """Déplace l’endroit pointé dans le fichier à pos bytes après le début du fichier\
             si pos est positif et à pos bytes avant la fin du fichier si est négatif"""
+        if self.stats is not None:
+            self.stats.seeks += 1
         if pos >= 0:
             self.file.seek(pos)
         else:
-            self.file.seek(-pos, whence = 2)
+            self.file.seek(pos, 2)
         
 
     def get_size(self) -> int:
         """Renvoie la taille (nombre de bytes) du fichier, sans déplacer le curseur"""
+        if self.journal is not None:
+            return self.journal.size(self)
+        return self.size_in_place()
+
+
+    def size_in_place(self) -> int:
+        """Renvoie la taille du fichier sur le disque, sans les écritures gardées par le journal."""
+        if self.fd is not None:
+            self.file.flush()
+            return os.fstat(self.fd).st_size
         INITIAL_CURSOR = self.file.tell()
-        self.goto(0)
-        size_of_file = len(self.file.read())
+        size_of_file = self.file.seek(0, 2)
         self.goto(INITIAL_CURSOR)
         return size_of_file
         
@@ -31,6 +63,8 @@ class BinaryFile:
             Renvoie le nombre de bytes écrits dans le fichier.
             Change l’endroit pointé par le fichier après exécution."""
         self.file.write(n.to_bytes(length = size, byteorder = 'little', signed = True ))
+        if self.stats is not None:
+            self.stats.bytes_written += size
         return size
     
 
@@ -38,51 +72,70 @@ class BinaryFile:
         """Écrit l’entier n sur size bytes à la pos-ième position dans le fichier\
             ( *voir def goto() ). Renvoie le nombre de bytes écrits dans le fichier.
             Ne change pas l’endroit pointé par le fichier après exécution"""
-        INITIAL_CURSOR = self.file.tell()
-        self.goto(pos)
-        self.file.write(n.to_bytes(length = size, byteorder = 'little', signed = True ))
-        self.goto(INITIAL_CURSOR)
-        return size
+        return self.write_bytes_to(n.to_bytes(length = size, byteorder = 'little', signed = True ), pos)
     
 
     def write_string(self, s: str)-> int:
         """Écrit la chaîne de caractère s à l’endroit pointé actuellement par le fichier.
             Renvoie le nombre de bytes écrits dans le fichier.
             Change l’endroit pointé par le fichier après exécution."""
-        PREVIOUS_FILE_SIZE = self.get_size()
-        number_of_bytes_needed = 0
-        for character in s:
-            if character.isascii():
-                number_of_bytes_needed += 1
-            else:
-                number_of_bytes_needed += 2
-        self.write_integer(number_of_bytes_needed, 2)     
-        self.file.write(s.encode())
-        return self.get_size() - PREVIOUS_FILE_SIZE
+        encoded_string = s.encode()
+        self.write_integer(len(encoded_string), 2)
+        self.file.write(encoded_string)
+        if self.stats is not None:
+            self.stats.bytes_written += len(encoded_string)
+        return 2 + len(encoded_string)
         
 
     def write_string_to(self, s: str, pos: int) -> int:
         """Écrit la chaîne de caractère s à la pos-ième* position dans le fichier\
             ( *voir def goto() ). Renvoie le nombre de bytes écrits dans le fichier.
             Ne change pas l’endroit pointé par le fichier après exécution."""
-        PREVIOUS_FILE_SIZE, INITIAL_CURSOR = self.get_size(), self.file.tell()
-        number_of_bytes_needed = 0
-        self.goto(pos) # Le self.get_size() me permet de vérifier si seekable
-        for character in s:
-            if character.isascii():
-                number_of_bytes_needed += 1
-            else:
-                number_of_bytes_needed += 2
-        self.write_integer(number_of_bytes_needed, 2)
-        self.file.write(s.encode())
+        encoded_string = s.encode()
+        return self.write_bytes_to(len(encoded_string).to_bytes(2, 'little', signed = True) + encoded_string, pos)
+
+
+    def write_bytes_to(self, data: bytes, pos: int) -> int:
+        """Écrit les bytes data à la pos-ième* position dans le fichier ( *voir def goto() ).
+            Renvoie le nombre de bytes écrits dans le fichier.
+            Ne change pas l’endroit pointé par le fichier après exécution."""
+        if self.stats is not None:
+            self.stats.bytes_written += len(data)
+            self.stats.seeks += self.journal is None and self.fd is not None # Sans pwrite, goto compte le déplacement
+        if self.journal is not None:
+            self.journal.write(self, pos if pos >= 0 else pos + self.get_size(), data)
+            return len(data)
+        if self.fd is None:
+            INITIAL_CURSOR = self.file.tell()
+            self.goto(pos)
+            self.file.write(data)
+            self.goto(INITIAL_CURSOR)
+            return len(data)
+        # flush() vide aussi le buffer de lecture du fichier, qui ne peut donc plus être périmé
+        self.file.flush()
+        if pos < 0:
+            pos += os.fstat(self.fd).st_size
+        return os.pwrite(self.fd, data, pos)
+
+
+    def truncate(self, size: int) -> None:
+        """Change la taille du fichier en size bytes (les bytes ajoutés valent 0).
+        Ne change pas l’endroit pointé par le fichier après exécution."""
+        if self.journal is not None:
+            self.journal.truncate(self, size)
+            return
+        self.file.flush()
+        INITIAL_CURSOR = self.file.tell()
+        self.file.truncate(size)
         self.goto(INITIAL_CURSOR)
-        return self.get_size() - PREVIOUS_FILE_SIZE
     
 
     def read_integer(self, size: int)-> int:
         """Renvoie l’entier encodé sur size bytes à partir de l’endroit pointé\
             actuellement par le fichier. Change l’endroit pointé par le fichier après exécution."""
         encoded_integer = self.file.read(size)
+        if self.stats is not None:
+            self.stats.bytes_read += len(encoded_integer)
         return int.from_bytes(encoded_integer, byteorder = 'little', signed = True )
 
 
@@ -90,11 +143,7 @@ class BinaryFile:
         """Renvoie l’entier encodé sur size bytes à partir de la pos-ième*\
             position dans le fichier( *voir def goto() ).
         Ne change pas l’endroit pointé par le fichier après exécution."""
-        INITIAL_CURSOR = self.file.tell()
-        self.goto(pos)
-        encoded_integer = self.file.read(size)
-        self.goto(INITIAL_CURSOR)
-        return int.from_bytes(encoded_integer, byteorder = 'little', signed = True )
+        return int.from_bytes(self.read_bytes_from(size, pos), byteorder = 'little', signed = True )
         
 
     def read_string(self)-> str:
@@ -104,6 +153,8 @@ class BinaryFile:
         encoded_string = bytearray()
         string_length = self.read_integer(2)
         encoded_string.extend(self.file.read(string_length))
+        if self.stats is not None:
+            self.stats.bytes_read += len(encoded_string)
         return encoded_string.decode()
 
 
@@ -111,10 +162,130 @@ class BinaryFile:
         """Renvoie la chaîne de caractères encodée à partir de la pos-ième*\
             position dans le fichier ( *voir def goto() ).
         Ne change pas l’endroit pointé par le fichier après exécution."""
-        INITIAL_CURSOR, encoded_string = self.file.tell(), bytearray()
-        self.goto(pos)
-        string_length = self.read_integer(2)
-        encoded_string.extend(self.file.read(string_length))
-        self.goto(INITIAL_CURSOR)
-        return encoded_string.decode()
-    
\ No newline at end of file
+        if pos < 0:
+            pos += self.get_size()
+        encoded_string = self.read_bytes_from(2 + self.STRING_READ_AHEAD, pos)
+        string_length = int.from_bytes(encoded_string[:2], byteorder = 'little', signed = True)
+        if len(encoded_string) < 2 + string_length:
+            encoded_string += self.read_bytes_from(2 + string_length - len(encoded_string), pos + len(encoded_string))
+        return encoded_string[2:2 + string_length].decode()
+
+
+    def read_struct_from(self, layout: struct.Struct, pos: int) -> tuple:
+        """Renvoie les valeurs décodées selon layout à partir de la pos-ième* position dans le fichier ( *voir def goto() ).
+        Ne change pas l’endroit pointé par le fichier après exécution."""
+        return layout.unpack(self.read_bytes_from(layout.size, pos))
+
+
+    def read_bytes_from(self, size: int, pos: int) -> bytes:
+        """Renvoie (au plus) size bytes lus à partir de la pos-ième* position dans le fichier ( *voir def goto() ).
+        Ne change pas l’endroit pointé par le fichier après exécution."""
+        if self.journal is not None:
+            return self.journal.read(self, size, pos if pos >= 0 else pos + self.get_size())
+        return self.read_in_place(size, pos)
+
+
+    def read_in_place(self, size: int, pos: int) -> bytes:
+        """Comme read_bytes_from, mais sans les écritures gardées par le journal."""
+        if self.fd is None:
+            INITIAL_CURSOR = self.file.tell()
+            self.goto(pos)
+            data = self.file.read(size)
+            self.goto(INITIAL_CURSOR)
+        else:
+            self.file.flush()
+            if pos < 0:
+                pos += os.fstat(self.fd).st_size
+            data = os.pread(self.fd, size, pos)
+        if self.stats is not None:
+            self.stats.bytes_read += len(data)
+            self.stats.seeks += self.fd is not None # Sans pread, goto compte le déplacement
+        return data
+
+
+
+class MappedBinaryFile(BinaryFile):
+    """BinaryFile dont les lectures à une position sont faites dans une projection en mémoire (mmap) du fichier,
+       sans appel système par valeur lue. Les écritures passent toujours par le fichier et sont visibles dans la projection.
+       La projection est refaite dès qu'une lecture dépasse sa taille (le fichier a grandi) ou via remap()."""
+    INTEGER_FORMATS = {1: '<b', 2: '<h', 4: '<i', 8: '<q'}
+
+    def __init__(self, file: BinaryIO, journal: 'Journal | None' = None):
+        """Constructeur de MappedBinaryFile"""
+        super().__init__(file, journal)
+        self.map = None
+
+
+    def remap(self) -> None:
+        """Refait la projection du fichier, à appeler si le fichier a pu rétrécir depuis la dernière projection."""
+        self.unmap()
+        size_of_file = self.size_in_place() if self.fd is not None else 0
+        if size_of_file:
+            self.map = mmap.mmap(self.fd, size_of_file, access = mmap.ACCESS_READ)
+
+
+    def unmap(self) -> None:
+        """Supprime la projection du fichier (sans fermer ce dernier)."""
+        if self.map is not None:
+            self.map.close()
+            self.map = None
+
+
+    def mapped(self, end: int) -> mmap.mmap | None:
+        """Renvoie la projection du fichier si elle contient les bytes jusqu'à la position end (exclue), None sinon.
+           La projection n'est pas utilisée tant que le journal garde des écritures dans le fichier."""
+        if self.journal is not None and self.journal.covers(self):
+            return None
+        if self.map is None or end > len(self.map):
+            if self.fd is None or self.size_in_place() == (len(self.map) if self.map is not None else 0):
+                return None
+            self.remap()
+        return self.map if self.map is not None and 0 <= end <= len(self.map) else None
+
+
+    def read_integer_from(self, size: int, pos: int)-> int:
+        """Renvoie l’entier encodé sur size bytes à partir de la pos-ième*\
+            position dans le fichier( *voir def goto() ).
+        Ne change pas l’endroit pointé par le fichier après exécution."""
+        mapped_file = self.mapped(pos + size) if pos >= 0 and size in self.INTEGER_FORMATS else None
+        if mapped_file is None:
+            return super().read_integer_from(size, pos)
+        if self.stats is not None:
+            self.stats.bytes_read += size
+        return struct.unpack_from(self.INTEGER_FORMATS[size], mapped_file, pos)[0]
+
+
+    def read_string_from(self, pos: int)-> str:
+        """Renvoie la chaîne de caractères encodée à partir de la pos-ième*\
+            position dans le fichier ( *voir def goto() ).
+        Ne change pas l’endroit pointé par le fichier après exécution."""
+        mapped_file = self.mapped(pos + 2) if pos >= 0 else None
+        if mapped_file is None:
+            return super().read_string_from(pos)
+        string_length = struct.unpack_from('<h', mapped_file, pos)[0]
+        if self.stats is not None:
+            self.stats.bytes_read += 2
+        return self.read_bytes_from(string_length, pos + 2).decode()
+
+
+    def read_struct_from(self, layout: struct.Struct, pos: int) -> tuple:
+        """Renvoie les valeurs décodées selon layout à partir de la pos-ième* position dans le fichier ( *voir def goto() ).
+        Ne change pas l’endroit pointé par le fichier après exécution."""
+        mapped_file = self.mapped(pos + layout.size) if pos >= 0 else None
+        if mapped_file is None:
+            return super().read_struct_from(layout, pos)
+        if self.stats is not None:
+            self.stats.bytes_read += layout.size
+        return layout.unpack_from(mapped_file, pos)
+
+
+    def read_bytes_from(self, size: int, pos: int) -> bytes:
+        """Renvoie (au plus) size bytes lus à partir de la pos-ième* position dans le fichier ( *voir def goto() ).
+        Ne change pas l’endroit pointé par le fichier après exécution."""
+        mapped_file = self.mapped(pos + size) if pos >= 0 else None
+        if mapped_file is None:
+            return super().read_bytes_from(size, pos)
+        data = mapped_file[pos:pos + size]
+        if self.stats is not None:
+            self.stats.bytes_read += len(data)
+        return data
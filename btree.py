@@ -0,0 +1,364 @@
+"""Index triés (arbres B+) des tables ULDB.
+
+L'index trié du champ <champ> de la table <table> est stocké dans le fichier <db>/<table>.<champ>.btree, découpé en pages
+de PAGE_SIZE bytes lues et écrites une à une via BinaryFile. La page 0 est le header de l'arbre, les autres ses noeuds.
+Les clés sont des paires (valeur, position de l'entrée relative à l'entry buffer), toutes différentes donc, et les feuilles
+sont chaînées dans les deux sens pour parcourir les valeurs dans l'ordre croissant ou décroissant.
+Les chaînes sont comparées encodées (l'ordre des bytes UTF-8 est celui des caractères) et tronquées à MAX_KEY bytes.
+"""
+from binary import BinaryFile
+from bisect import bisect_left, bisect_right, insort
+from collections import OrderedDict
+from typing import Iterator, TYPE_CHECKING
+import struct
+
+if TYPE_CHECKING:
+    from wal import Journal
+
+BTREE_MAGIC = b'ULDT'
+HEADER = struct.Struct('<4sbii') # Magic, type des clés (1: entier, 2: chaîne), page de la racine, nombre de pages
+NODE_HEADER = struct.Struct('<bhii') # Type du noeud, nombre de clés, feuille précédente (premier enfant), feuille suivante
+LEAF, INTERNAL = 1, 2
+INTEGER_KEY = struct.Struct('<ii') # Valeur, position
+STRING_LENGTH, POSITION = struct.Struct('<h'), struct.Struct('<i')
+FIRST_POSITION, LAST_POSITION = -1, 2**31 - 1 # Positions qui précèdent et suivent toutes les autres, pour les bornes
+
+Key = tuple[int | bytes, int]
+
+
+class Node:
+    """Noeud décodé de l'arbre. Une feuille a des clés, un noeud interne a en plus un enfant de plus que de clés:
+       l'enfant i contient les clés comprises entre keys[i - 1] (incluse) et keys[i] (exclue)."""
+
+    def __init__(self, page: int, leaf: bool, keys: list[Key], children: list[int] | None = None, previous: int = -1,\
+                 following: int = -1):
+        """Constructeur de Node"""
+        self.page, self.leaf, self.keys, self.children = page, leaf, keys, children or []
+        self.previous, self.following = previous, following # Feuilles voisines (-1 s'il n'y en a pas)
+
+
+class BTreeIndex:
+    """Index trié d'un champ: sert les conditions d'égalité, les intervalles, les préfixes et les parcours dans l'ordre.
+       Il est modifié en place à chaque ajout ou retrait. Un retrait ne fusionne jamais de noeuds: une feuille peut
+       devenir vide et le reste jusqu'à ce que vacuum reconstruise l'index."""
+    PAGE_SIZE = 4096
+    MAX_KEY = 1024 # Taille maximale d'une chaîne dans une clé: une page contient toujours au moins 3 clés
+    FILL = 0.9 # Remplissage des pages par create, pour que les premiers ajouts ne les divisent pas
+    CACHE_PAGES = 256 # Nombre de noeuds décodés gardés en mémoire
+
+    def __init__(self, path: str, string_keys: bool, journal: 'Journal | None' = None):
+        """Constructeur de BTreeIndex, le fichier path n'est ouvert qu'au premier besoin.
+           Si journal est donné, les écritures dans le fichier passent par ce journal (cf. wal)."""
+        self.path, self.string_keys, self.journal = path, string_keys, journal
+        self.index_file: BinaryFile | None = None
+        self.root, self.page_count = -1, 0
+        self.nodes: OrderedDict[int, Node] = OrderedDict() # Du moins au plus récemment utilisé
+
+
+    @classmethod
+    def create(cls, path: str, string_keys: bool, items: list[tuple[int | str, int]], journal: 'Journal | None' = None)\
+               -> 'BTreeIndex':
+        """Crée le fichier d'index path contenant les paires (valeur, position) items et renvoie l'index.
+           Les feuilles sont remplies dans l'ordre, puis chaque niveau de noeuds internes à partir du précédent.
+           Le fichier est écrit directement, sans passer par le journal."""
+        index = cls(path, string_keys, journal)
+        keys = sorted((index._key(value), position) for value, position in items)
+        LIMIT = int(cls.PAGE_SIZE*cls.FILL)
+        level, page, pages = [], 1, []
+        current = Node(page, True, [])
+        for key in keys:
+            if current.keys and index._node_size(current) + index._key_size(key) > LIMIT:
+                level.append(current)
+                page += 1
+                current = Node(page, True, [])
+            current.keys.append(key)
+        level.append(current)
+        for i, leaf in enumerate(level):
+            leaf.previous = level[i - 1].page if i else -1
+            leaf.following = level[i + 1].page if i + 1 < len(level) else -1
+        pages.extend(level)
+        # Chaque niveau interne référence les noeuds du niveau inférieur par leur première clé
+        firsts = [(node.keys[0] if node.keys else None, node.page) for node in level] # Seule une feuille peut être vide
+        while len(firsts) > 1:
+            level = []
+            current = Node(page + 1, False, [], [firsts[0][1]])
+            page += 1
+            current_first = firsts[0][0]
+            upper = []
+            for key, child in firsts[1:]:
+                if index._node_size(current) + index._key_size(key) + 4 > LIMIT and len(current.children) > 1:
+                    level.append(current)
+                    upper.append((current_first, current.page))
+                    page += 1
+                    current, current_first = Node(page, False, [], [child]), key
+                else:
+                    current.keys.append(key)
+                    current.children.append(child)
+            level.append(current)
+            upper.append((current_first, current.page))
+            pages.extend(level)
+            firsts = upper
+        index.root, index.page_count = firsts[0][1], page + 1
+        with open(path, 'wb') as index_file:
+            index_file.write(index._encode_header())
+            for node in pages:
+                index_file.write(index._encode(node))
+        return index
+
+
+    def lookup(self, value: int | str) -> set[int]:
+        """Renvoie les positions des entrées dont le champ indexé vaut value (un surensemble si value est tronquée)."""
+        return {position for _, position in self.range(value, value)}
+
+
+    def add(self, value: int | str, position: int) -> None:
+        """Ajoute l'entrée à la position position pour la valeur value."""
+        key = (self._key(value), position)
+        path, node = self._descend(key)
+        insort(node.keys, key)
+        while self._node_size(node) > self.PAGE_SIZE:
+            node = self._split(node, path)
+        self._write(node)
+
+
+    def remove(self, value: int | str, position: int) -> None:
+        """Retire l'entrée à la position position pour la valeur value."""
+        key = (self._key(value), position)
+        _, node = self._descend(key)
+        i = bisect_left(node.keys, key)
+        if i < len(node.keys) and node.keys[i] == key:
+            del node.keys[i]
+            self._write(node)
+
+
+    def flush(self) -> None:
+        """Les pages sont écrites dès qu'elles changent: il n'y a rien à écrire."""
+
+
+    def close(self) -> None:
+        """Ferme le fichier s'il est ouvert et oublie les noeuds décodés."""
+        if self.index_file is not None:
+            self.index_file.file.close()
+            self.index_file = None
+        self.nodes.clear()
+
+
+    def range(self, low: int | str | None = None, high: int | str | None = None, include_low: bool = True,\
+              include_high: bool = True) -> Iterator[tuple[int | bytes, int]]:
+        """Renvoie dans l'ordre les (clé, position) des valeurs comprises entre low et high (None: pas de borne).
+           Les bornes d'une chaîne tronquée sont toujours incluses, pour ne perdre aucune entrée."""
+        low_key = None if low is None else self._key(low)
+        high_key = None if high is None else self._key(high)
+        include_low = include_low or self._truncated(low)
+        include_high = include_high or self._truncated(high)
+        if low_key is None:
+            node = self._edge_leaf(False)
+        else:
+            node = self._descend((low_key, FIRST_POSITION if include_low else LAST_POSITION))[1]
+        for key in self._walk(node, False):
+            if low_key is not None and (key[0] < low_key or (key[0] == low_key and not include_low)):
+                continue
+            if high_key is not None and (key[0] > high_key or (key[0] == high_key and not include_high)):
+                return
+            yield key
+
+
+    def prefix(self, prefix: str) -> Iterator[tuple[bytes, int]]:
+        """Renvoie dans l'ordre les (clé, position) des chaînes qui commencent par prefix."""
+        encoded_prefix = self._key(prefix)
+        for key in self._walk(self._descend((encoded_prefix, FIRST_POSITION))[1], False):
+            if key[0] < encoded_prefix:
+                continue
+            if not key[0].startswith(encoded_prefix):
+                return
+            yield key
+
+
+    def items(self, descending: bool = False) -> Iterator[tuple[int | bytes, int]]:
+        """Renvoie toutes les (clé, position) de l'index, dans l'ordre croissant ou décroissant."""
+        return self._walk(self._edge_leaf(descending), descending)
+
+
+    def _key(self, value: int | str) -> int | bytes:
+        """Renvoie la valeur value telle qu'elle est comparée et stockée dans l'arbre."""
+        return value.encode()[:self.MAX_KEY] if self.string_keys else value
+
+
+    def _truncated(self, value: int | str | None) -> bool:
+        """Renvoie True si value est une chaîne trop longue pour être entièrement dans une clé."""
+        return self.string_keys and value is not None and len(value.encode()) >= self.MAX_KEY
+
+
+    def _walk(self, node: Node, descending: bool) -> Iterator[Key]:
+        """Renvoie les clés à partir de la feuille node en suivant le chaînage des feuilles."""
+        while True:
+            yield from reversed(node.keys) if descending else node.keys
+            page = node.previous if descending else node.following
+            if page == -1:
+                return
+            node = self._read(page)
+
+
+    def _edge_leaf(self, last: bool) -> Node:
+        """Renvoie la première (ou la dernière) feuille de l'arbre."""
+        node = self._read(self._load())
+        while not node.leaf:
+            node = self._read(node.children[-1 if last else 0])
+        return node
+
+
+    def _descend(self, key: Key) -> tuple[list[tuple[Node, int]], Node]:
+        """Renvoie la feuille où se trouve (ou irait) key et le chemin pour y arriver: [(noeud interne, enfant suivi), ...]."""
+        path, node = [], self._read(self._load())
+        while not node.leaf:
+            i = bisect_right(node.keys, key)
+            path.append((node, i))
+            node = self._read(node.children[i])
+        return path, node
+
+
+    def _split(self, node: Node, path: list[tuple[Node, int]]) -> Node:
+        """Divise le noeud node (trop grand) en deux et ajoute la clé qui les sépare au parent (créé si node est la racine).
+           Renvoie le parent, qui peut à son tour être trop grand: c'est à l'appelant de l'écrire."""
+        # La coupure est faite au milieu des bytes plutôt qu'au milieu des clés: les deux moitiés tiennent dans une page
+        sizes, half, middle = [self._key_size(key) for key in node.keys], self._node_size(node) // 2, 0
+        while sum(sizes[:middle + 1]) < half and middle < len(node.keys) - 2:
+            middle += 1
+        middle = max(middle, 1)
+        right = Node(self._allocate(), node.leaf, [])
+        if node.leaf:
+            right.keys, node.keys = node.keys[middle:], node.keys[:middle]
+            right.previous, right.following, node.following = node.page, node.following, right.page
+            if right.following != -1:
+                following = self._read(right.following)
+                following.previous = right.page
+                self._write(following)
+            separator = right.keys[0]
+        else:
+            separator = node.keys[middle]
+            right.keys, right.children = node.keys[middle + 1:], node.children[middle + 1:]
+            node.keys, node.children = node.keys[:middle], node.children[:middle + 1]
+        self._write(node)
+        self._write(right)
+        if not path:
+            parent = Node(self._allocate(), False, [separator], [node.page, right.page])
+            self.root = parent.page
+            self._write(parent)
+            self._write_header()
+            return parent
+        parent, i = path.pop()
+        parent.keys.insert(i, separator)
+        parent.children.insert(i + 1, right.page)
+        return parent
+
+
+    def _key_size(self, key: Key) -> int:
+        """Renvoie la taille de la clé key encodée."""
+        return 2 + len(key[0]) + 4 if self.string_keys else INTEGER_KEY.size
+
+
+    def _node_size(self, node: Node) -> int:
+        """Renvoie la taille du noeud node encodé."""
+        return NODE_HEADER.size + sum(map(self._key_size, node.keys)) + (0 if node.leaf else 4*len(node.keys))
+
+
+    def _encode_key(self, key: Key) -> bytes:
+        """Encode la clé key."""
+        if self.string_keys:
+            return STRING_LENGTH.pack(len(key[0])) + key[0] + POSITION.pack(key[1])
+        return INTEGER_KEY.pack(*key)
+
+
+    def _encode(self, node: Node) -> bytes:
+        """Encode le noeud node sur une page."""
+        if node.leaf:
+            parts = [NODE_HEADER.pack(LEAF, len(node.keys), node.previous, node.following)]
+            parts.extend(map(self._encode_key, node.keys))
+        else:
+            parts = [NODE_HEADER.pack(INTERNAL, len(node.keys), node.children[0], -1)]
+            for key, child in zip(node.keys, node.children[1:]):
+                parts.append(self._encode_key(key) + POSITION.pack(child))
+        encoded_node = b''.join(parts)
+        return encoded_node + bytes(self.PAGE_SIZE - len(encoded_node))
+
+
+    def _decode(self, page: int, data: bytes) -> Node:
+        """Décode le noeud de la page page."""
+        node_type, count, previous, following = NODE_HEADER.unpack_from(data, 0)
+        node, cursor = Node(page, node_type == LEAF, []), NODE_HEADER.size
+        if node.leaf:
+            node.previous, node.following = previous, following
+        else:
+            node.children.append(previous)
+        for _ in range(count):
+            if self.string_keys:
+                length = STRING_LENGTH.unpack_from(data, cursor)[0]
+                key = (data[cursor + 2:cursor + 2 + length], POSITION.unpack_from(data, cursor + 2 + length)[0])
+                cursor += 2 + length + 4
+            else:
+                key = INTEGER_KEY.unpack_from(data, cursor)
+                cursor += INTEGER_KEY.size
+            node.keys.append(key)
+            if not node.leaf:
+                node.children.append(POSITION.unpack_from(data, cursor)[0])
+                cursor += 4
+        return node
+
+
+    def _encode_header(self) -> bytes:
+        """Encode le header de l'arbre sur une page."""
+        encoded_header = HEADER.pack(BTREE_MAGIC, 2 if self.string_keys else 1, self.root, self.page_count)
+        return encoded_header + bytes(self.PAGE_SIZE - len(encoded_header))
+
+
+    def _load(self) -> int:
+        """Lit le header de l'arbre si ce n'est pas encore fait et renvoie la page de la racine."""
+        if self.root == -1:
+            magic, _, self.root, self.page_count = HEADER.unpack(self._file().read_bytes_from(HEADER.size, 0))
+            if magic != BTREE_MAGIC:
+                raise ValueError(f"{self.path} is not an ULDB sorted index")
+        return self.root
+
+
+    def _read(self, page: int) -> Node:
+        """Renvoie le noeud de la page page, décodé une seule fois tant qu'il reste dans le cache."""
+        if page in self.nodes:
+            self.nodes.move_to_end(page)
+            return self.nodes[page]
+        node = self._decode(page, self._file().read_bytes_from(self.PAGE_SIZE, page*self.PAGE_SIZE))
+        self._cache(node)
+        return node
+
+
+    def _write(self, node: Node) -> None:
+        """Écrit le noeud node dans sa page (une écriture par page modifiée)."""
+        self._file().write_bytes_to(self._encode(node), node.page*self.PAGE_SIZE)
+        self._cache(node)
+
+
+    def _cache(self, node: Node) -> None:
+        """Garde le noeud node dans le cache, en oubliant le moins récemment utilisé si CACHE_PAGES est atteint."""
+        self.nodes[node.page] = node
+        self.nodes.move_to_end(node.page)
+        while len(self.nodes) > self.CACHE_PAGES:
+            self.nodes.popitem(last = False)
+
+
+    def _allocate(self) -> int:
+        """Renvoie le numéro d'une nouvelle page à la fin du fichier."""
+        self._load()
+        self.page_count += 1
+        self._write_header()
+        return self.page_count - 1
+
+
+    def _write_header(self) -> None:
+        """Écrit le header de l'arbre."""
+        self._file().write_bytes_to(self._encode_header(), 0)
+
+
+    def _file(self) -> BinaryFile:
+        """Renvoie le fichier de l'index, ouvert sans buffer."""
+        if self.index_file is None:
+            self.index_file = BinaryFile(open(self.path, 'rb+', buffering = 0), self.journal)
+        return self.index_file
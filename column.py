@@ -0,0 +1,145 @@
+"""Colonnes des tables au format COLUMNAR (cf. database.TableFormat).
+
+Chaque champ <champ> d'une table <table> au format COLUMNAR est aussi stocké dans le fichier <db>/<table>.<champ>.col:
+un tableau d'entiers de 4 bytes little-endian où la valeur de l'entrée d'id i est à la position 4*(i - 1). Pour un champ
+STRING, c'est la position de la chaîne dans le heap <db>/<table>.strings, qui sert de bloc de données à toutes les colonnes.
+Les entrées supprimées sont marquées dans le bitmap <db>/<table>.deleted: le bit (i - 1) % 8 (de poids faible) du byte
+(i - 1) // 8 vaut 1 si l'entrée d'id i n'existe plus. Un parcours qui ne porte que sur quelques champs ne lit donc que
+leurs colonnes, séquentiellement et par paquets, au lieu de suivre la liste chaînée des entrées et de lire tous leurs slots.
+"""
+from binary import BinaryFile
+from typing import Iterable, TYPE_CHECKING
+import os
+import struct
+
+if TYPE_CHECKING:
+    from wal import Journal
+
+VALUE = struct.Struct('<i')
+
+
+class Column:
+    """Colonne d'un champ: sa valeur (ou le pointeur de sa chaîne) pour chaque id, 0 pour un id supprimé."""
+
+    REBUILD_CHUNK = 1 << 16 # Nombre de bytes écrits à la fois par rebuild
+
+    def __init__(self, path: str, journal: 'Journal | None' = None):
+        """Constructeur de Column, le fichier path n'est ouvert qu'au premier besoin.
+           Si journal est donné, les écritures dans le fichier passent par ce journal (cf. wal)."""
+        self.path, self.journal = path, journal
+        self.column_file: BinaryFile | None = None
+
+
+    def exists(self, last_id: int) -> bool:
+        """Renvoie True si le fichier existe et contient une valeur pour chacun des last_id premiers id."""
+        return os.path.exists(self.path) and self._file().get_size() >= 4*last_id
+
+
+    def rebuild(self, values: Iterable[tuple[int, int]], last_id: int) -> None:
+        """Réécrit tout le fichier à partir des paires (id, valeur) values des entrées existantes, par id croissant.
+           Elles sont écrites par paquets de REBUILD_CHUNK bytes: la table n'a pas à tenir en mémoire."""
+        if not os.path.exists(self.path):
+            self.close()
+            open(self.path, 'wb').close()
+        column_file, chunk, written, next_id = self._file(), bytearray(), 0, 1
+        for entry_id, value in values:
+            chunk += bytes(4*(entry_id - next_id)) + VALUE.pack(value)
+            next_id = entry_id + 1
+            if len(chunk) >= self.REBUILD_CHUNK:
+                written += column_file.write_bytes_to(bytes(chunk), written)
+                chunk.clear()
+        chunk += bytes(4*(last_id + 1 - next_id))
+        written += column_file.write_bytes_to(bytes(chunk), written)
+        column_file.truncate(written)
+
+
+    def read(self, first_id: int, count: int) -> tuple[int, ...]:
+        """Renvoie en une lecture les valeurs des entrées d'id first_id, first_id + 1, ..., first_id + count - 1."""
+        data = self._file().read_bytes_from(4*count, 4*(first_id - 1))
+        return struct.unpack(f'<{count}i', data.ljust(4*count, b'\0'))
+
+
+    def write(self, first_id: int, values: list[int]) -> None:
+        """Enregistre en une écriture les valeurs values des entrées d'id first_id, first_id + 1, ..."""
+        self._file().write_bytes_to(struct.pack(f'<{len(values)}i', *values), 4*(first_id - 1))
+
+
+    def set(self, entry_id: int, value: int) -> None:
+        """Enregistre la valeur de l'entrée d'id entry_id."""
+        self._file().write_integer_to(value, 4, 4*(entry_id - 1))
+
+
+    def close(self) -> None:
+        """Ferme le fichier s'il est ouvert."""
+        if self.column_file is not None:
+            self.column_file.file.close()
+            self.column_file = None
+
+
+    def _file(self) -> BinaryFile:
+        """Renvoie le fichier de la colonne, ouvert sans buffer."""
+        if self.column_file is None:
+            self.column_file = BinaryFile(open(self.path, 'rb+', buffering = 0), self.journal)
+        return self.column_file
+
+
+class DeletionBitmap:
+    """Bitmap des entrées supprimées d'une table au format COLUMNAR. Les bits au-delà de la fin du fichier valent 0."""
+
+    def __init__(self, path: str, journal: 'Journal | None' = None):
+        """Constructeur de DeletionBitmap, le fichier path n'est ouvert qu'au premier besoin.
+           Si journal est donné, les écritures dans le fichier passent par ce journal (cf. wal)."""
+        self.path, self.journal = path, journal
+        self.bitmap_file: BinaryFile | None = None
+
+
+    def exists(self) -> bool:
+        """Renvoie True si le fichier existe."""
+        return os.path.exists(self.path)
+
+
+    def rebuild(self, live_ids: Iterable[int], last_id: int) -> None:
+        """Réécrit tout le fichier: tous les id jusqu'à last_id sont supprimés sauf ceux de live_ids."""
+        bitmap = bytearray(b'\xff'*((last_id + 7) // 8))
+        for entry_id in live_ids:
+            bitmap[(entry_id - 1) >> 3] &= ~(1 << ((entry_id - 1) & 7))
+        if last_id % 8:
+            bitmap[-1] &= (1 << (last_id % 8)) - 1 # Les id à venir ne sont pas supprimés
+        if not os.path.exists(self.path):
+            self.close()
+            open(self.path, 'wb').close()
+        self._file().write_bytes_to(bytes(bitmap), 0)
+        self._file().truncate(len(bitmap))
+
+
+    def read(self, first_id: int, count: int) -> bytes:
+        """Renvoie les bytes du bitmap des entrées d'id first_id, ..., first_id + count - 1, first_id - 1 étant
+           un multiple de 8."""
+        SIZE = (count + 7) // 8
+        return self._file().read_bytes_from(SIZE, (first_id - 1) >> 3).ljust(SIZE, b'\0')
+
+
+    def mark(self, entry_ids: Iterable[int]) -> None:
+        """Marque les entrées d'id entry_ids comme supprimées, en une lecture et une écriture."""
+        entry_ids = sorted(entry_ids)
+        if not entry_ids:
+            return
+        FIRST, LAST = (entry_ids[0] - 1) >> 3, (entry_ids[-1] - 1) >> 3
+        bitmap = bytearray(self._file().read_bytes_from(LAST + 1 - FIRST, FIRST).ljust(LAST + 1 - FIRST, b'\0'))
+        for entry_id in entry_ids:
+            bitmap[((entry_id - 1) >> 3) - FIRST] |= 1 << ((entry_id - 1) & 7)
+        self._file().write_bytes_to(bytes(bitmap), FIRST)
+
+
+    def close(self) -> None:
+        """Ferme le fichier s'il est ouvert."""
+        if self.bitmap_file is not None:
+            self.bitmap_file.file.close()
+            self.bitmap_file = None
+
+
+    def _file(self) -> BinaryFile:
+        """Renvoie le fichier du bitmap, ouvert sans buffer."""
+        if self.bitmap_file is None:
+            self.bitmap_file = BinaryFile(open(self.path, 'rb+', buffering = 0), self.journal)
+        return self.bitmap_file
@@ -1,232 +1,1803 @@
-from binary import BinaryFile
-from enum import Enum
-from math import log2, ceil
-import os
-
-class FieldType(Enum):
-    INTEGER, STRING = 1, 2
-
-
-class Database:
-    """Dans cette classe, toutes les méthodes renvoient ValueError si l'opération liée est impossible"""
-    TableSignature = list[tuple[str, FieldType]]
-    Field = str | int
-    Entry = dict[str, Field]
-    
-    def __init__(self, name: str):
-        self.name = name
-        if not os.path.exists(self.name):
-            os.mkdir(self.name)
-
-
-    def create_table(self, table_name: str, *fields: TableSignature) -> None:
-        """Crée une nouvelle table de nom table_name et de signature fields."""
-
-        if os.path.exists(f"{self.name}/{table_name}.table"):
-            raise ValueError(f'{table_name}.table already stands in this directory')
-        with open(f"{self.name}/{table_name}.table", "wb+") as tb:
-            table_file = BinaryFile(tb)
-            INITIAL_STR_BUFFER_SIZE = 16
-            # SIGNATURE
-            tb.write('ULDB'.encode())
-            table_file.write_integer(len(fields), 4)
-            for one_field, a_field_type in fields:
-                table_file.write_integer(a_field_type.value, FieldType.INTEGER.value)
-                table_file.write_string(one_field)
-            OFFSET_STRING_BUFFER = tb.tell() + 12
-            OFFSET_ENTRY_BUFFER = OFFSET_STRING_BUFFER + 16
-            for i in range(2):
-                table_file.write_integer(OFFSET_STRING_BUFFER, 4) # Offset + Première place dans le string buffer
-            table_file.write_integer(OFFSET_ENTRY_BUFFER, 4)
-            # STRING BUFFER INITIALISED
-            table_file.write_integer(0, INITIAL_STR_BUFFER_SIZE)
-            # ENTRY BUFFER 
-            table_file.write_integer(0, 8) # Le dernier ID utilisé + nombre total d'éntrées dans la table
-            for i in range(3):
-                table_file.write_integer(-1, 4) # 3 pointeurs de l'entry buffer
-            table_file.write_integer(0, 4) #début liste chaînée
-            for i in range(len(fields)):
-                table_file.write_integer(0, 4)
-            for i in range(2):   
-                table_file.write_integer(-1, 4) #deux derniers pointeurs d'élément de la liste chaînée
-
-
-    def list_tables(self) -> list[str]:
-        """Renvoie une liste avec le nom de toutes les tables existant dans cette DB"""
-        list_of_names = []
-        for pseudo_table in os.listdir(self.name):
-            if pseudo_table.endswith(".table"):
-                list_of_names.append(pseudo_table.rsplit(".table")[0])
-        return list_of_names
-    
-     
-    def delete_table(self, table_name: str) -> None:
-        """Supprime la table de nom table_name.""" 
-        try:
-            os.remove(f"{self.name}/{table_name}.table")
-        except FileNotFoundError:
-            raise ValueError(f"{table_name}.table does not stand in this path.")
-        
-
-    def get_table_signature(self, table_name: str) -> TableSignature:
-        """Renvoie la signature de la table de type TableSignature"""
-        try:
-            with open(f"{self.name}/{table_name}.table", "rb+") as tb:
-                table_file, listtb_signature = BinaryFile(tb), []
-                table_file.goto(4)
-                NUMBER_OF_FIELDS = table_file.read_integer(4)
-                for i in range(NUMBER_OF_FIELDS):
-                    index_field_type = table_file.read_integer(1)
-                    field_type_name = list(FieldType)[index_field_type - 1].name
-                    temp_field_type, temp_name = eval(f'FieldType.{field_type_name}'), table_file.read_string()
-                    listtb_signature.append((temp_name, temp_field_type))
-                    print('BRUH', temp_name)
-                return listtb_signature
-            
-        except:
-            raise ValueError(f"{table_name}.table does not stand in this directory.")
-        
-    
-    def add_entry(self, table_name: str, entry: Entry) -> None:
-        """ajoute l’entrée entry à la table de nom table_name."""
-        with open(f"{self.name}/{table_name}.table", "wb+") as tb:
-            table_file = BinaryFile(tb)
-            START_ENTRY_BUFFER = self.get_offset_entry_buffer(table_name)
-            PREVIOUS_ID_ENTRY = table_file.read_integer_from(4, START_ENTRY_BUFFER)
-            PREVIOUS_AMOUNT_ENTRIES = table_file.read_integer_from(4, START_ENTRY_BUFFER + 4)
-            FIRST_ENTRY_POINTER = table_file.read_integer_from(4, START_ENTRY_BUFFER + 4*2)
-            LAST_ENTRY_POINTER = table_file.read_integer_from(4, START_ENTRY_BUFFER + 4*3)
-            CURRENT_ID_ENTRY = table_file.read_integer_from(4, START_ENTRY_BUFFER + 4*5)
-            OFFSET_NEW_ENTRY = 4*(len(entry) + 8)
-            
-            table_file.write_integer_to(PREVIOUS_ID_ENTRY + 1, 4, START_ENTRY_BUFFER)
-            table_file.write_integer_to(PREVIOUS_AMOUNT_ENTRIES + 1, 4, START_ENTRY_BUFFER + 4 )
-            if not PREVIOUS_ID_ENTRY:
-                FIRST_ENTRY_POINTER = LAST_ENTRY_POINTER = START_ENTRY_BUFFER + 5*4
-                table_file.write_integer_to(FIRST_ENTRY_POINTER, 4, START_ENTRY_BUFFER + 4*2)
-                table_file.write_integer_to(LAST_ENTRY_POINTER, 4, START_ENTRY_BUFFER + 4*3)
-            else:
-                table_file.write_integer_to(LAST_ENTRY_POINTER + OFFSET_NEW_ENTRY, 4, START_ENTRY_BUFFER + 4*3)
-            
-            table_file.write_integer_to(CURRENT_ID_ENTRY + 1, 4, START_ENTRY_BUFFER + 4*5)
-            CURSOR_AS_OF_NOW = START_ENTRY_BUFFER + 4*6 
-            table_file.goto(CURSOR_AS_OF_NOW)
-
-            for entry_name in entry.keys():
-                entry_value, exponent, size_of_string_buffer = entry.get(entry_name), 0, 1
-                extra_bytes_str_buffer = 2**exponent - size_of_string_buffer
-                if isinstance(entry_value, str):
-                    size_of_string_buffer = self.available_space_string_buffer(table_name, entry_value, True)
-                    if not self.available_space_string_buffer(table_name, entry_value):
-                        table_file.goto(CURSOR_AS_OF_NOW + size_of_string_buffer)
-                        remaining_content_of_file = tb.read()
-                        table_file.goto(CURSOR_AS_OF_NOW + size_of_string_buffer)
-                        exponent = ceil(log2(1 + 2 + len(entry_value) + size_of_string_buffer))
-                        table_file.write_integer(0, 2**exponent - size_of_string_buffer)
-                        extra_bytes_str_buffer += 2**exponent - size_of_string_buffer
-                        #Au cas où TODO Attention, probleme que les autres on eu est peut etre un 0 en plus/ moins
-                        tb.write(remaining_content_of_file)
-                    #REMODIFICATION DES DONNEES DU HEADER + DES POINTEURS TODO
-                    START_ENTRY_BUFFER = table_file.write_integer_to(START_ENTRY_BUFFER + extra_bytes_str_buffer, 4,\
-                                                                      self.get_offset_entry_buffer(table_name, extra_bytes_str_buffer))
-                    self.get_offset_entry_buffer(table_name)
-                    table_file.write_integer_to(START_ENTRY_BUFFER)
-                    
-                    FIRST_ENTRY_POINTER = table_file.read_integer_from(4, START_ENTRY_BUFFER + 4*2 + 2**exponent - size_of_string_buffer)
-                    offset_first_place_str_buffer = self.get_string_buffer(table_name, True) + 4
-                    # TODO Si le petit index est vers l'espace devant champs
-                    first_place_str_buffer = table_file.read_integer_from(4, offset_first_place_str_buffer)
-                    table_file.write_string( " " + entry_value )
-                    table_file.write_integer_to(first_place_str_buffer + len(entry_value) + 1, 4, first_place_str_buffer )
-                else:
-                    table_file.write_integer(entry.get(entry_name), 4)
-            
-            table_file.write_integer_to(LAST_ENTRY_POINTER, 4, -8)
-            table_file.write_integer_to(-1, 4, -4) 
-            
-            NEW_LAST_ENTRY_POINTER = LAST_ENTRY_POINTER + 4*(3 + len(self.get_table_signature(table_name)))
-            table_file.write_integer_to(NEW_LAST_ENTRY_POINTER, 4, LAST_ENTRY_POINTER) 
-            # Modifier le pointeur vers l'élément suivant, du précedent élément
-            
-                
-
-    def get_complete_table(self, table_name: str) -> list[Entry]:
-        """Renvoie toutes les entrées de la table de nom table_name dans une liste."""
-        pass
-
-
-    def get_entry(self, table_name: str, field_name: str, field_value: Field) -> Entry | None :
-        """Renvoie une entrée (quelconque) de la table de nom table_name dont le champ field_name contient\
-        la valeur field_value si une telle entrée existe, et qui renvoie None sinon."""
-        pass
-
-
-    def get_entries(self, table_name: str, field_name: str, field_value: Field) -> list[Entry]:
-        """Renvoie toutes les entrées de la table de nom table_name dont le champ field_name contient la valeur field_name."""
-        pass
-
-
-    def select_entry(self, table_name: str, fields: tuple[str], field_name: str, field_value: Field) -> Field | tuple[Field]:
-        """Effectue une sélection des champs demandés sur une entrée de la table de nom table_name dont le champ field_name contient\
-        la valeur field_value et renvoie ces champs uniquement. Si un unique champ est demandé, la fonction ne doit pas
-        renvoyer un tuple de taille 1, mais bien uniquement la valeur du champ demandé.
-        Sinon, le tuple renvoyé doit contenir les valeurs des champs dans le même ordre que celui demandé par le paramètre fields."""
-        pass
-
-
-    def select_entries(self, table: str, fields: tuple[str], field_name: str, field_value: Field) -> list[Field | tuple[Field]]:
-        """Similaire à select_entry cependant renvoie les champs demandés de
-           toutes les entrées de la table de nom table_name satisfaisant la condition."""
-        pass
-
-
-    def get_table_size(self, table_name: str) -> int:
-        """Renvoie le nombre d’entrées dans la table de nom table_name"""
-        with open(f'{self.name}/{table_name}.table', 'rb+') as tb:
-            table_file = BinaryFile(tb)
-            pass
-
-    
-    def get_offset_entry_buffer(self, table_name: str, modif: int = None) -> int:
-        """Renvoie le décalage entre le début de la table table_name et l'entry_buffer. Pratique pour le localiser
-           dans la table table_name. modif donne le nombre de bytes ajoutés dans le fichier, par un agrandissement du string buffer."""
-        with open(f'{self.name}/{table_name}.table', 'rb+') as tb:
-            table_file = BinaryFile(tb)
-            offset = table_file.read_integer_from(4, 4*4 + self.get_number_of_bytes_table_signature(table_name))
-            return offset - 20 if not modif else offset - 20 + modif
-        
-    
-    def get_string_buffer(self, table_name: str, get_pos: bool = False) -> bytes | int:
-        """Renvoie le string_buffer. Si get_pos est donné à True, renvoie l'offset du string_buffer"""
-        with open(f'{self.name}/{table_name}.table', 'rb+') as tb:
-            table_file = BinaryFile(tb)
-            position_offset_str_buffer = table_file.read_integer_from(4, 8 + self.get_number_of_bytes_table_signature(table_name))
-            steps = self.get_offset_entry_buffer(table_name) - table_file.read_integer_from(4, position_offset_str_buffer)
-            table_file.goto(position_offset_str_buffer)
-            string_buffer = tb.read(steps)
-            return string_buffer if not get_pos else position_offset_str_buffer 
-
-    
-    def get_number_of_bytes_table_signature(self, table_name: str) -> int:
-        """Renvoie le nombre de bytes dans la signature de la table dans le header"""
-        length_table_signature = 0
-        for field_name, field_type in self.get_table_signature(table_name):
-            length_table_signature += 1 + len(field_name) + 2
-        return length_table_signature
-
-
-    def available_space_string_buffer(self, table_name: str, entry_value: str, give_size: bool = False) -> bool | int:
-        """Renvoie True s'il y a de la place pour entry_value dans le string_buffer, False sinon. 
-            Si give_size est donné à True, renvoie la taille du string_buffer."""
-        available_space, i = 0, -1
-        string_buffer_to_iterate = self.get_string_buffer(table_name)
-        while abs(i) <= len(string_buffer_to_iterate):
-            while string_buffer_to_iterate[i] == b'\x00':
-                available_space += 1
-                i -= 1
-            else:
-                available_space = 0
-                i += 1
-        return len(entry_value) + 2 == available_space - 1 if not give_size and isinstance(entry_value, str)\
-               else len(string_buffer_to_iterate)
-    
\ No newline at end of file
+from binary import BinaryFile, MappedBinaryFile
+from btree import BTreeIndex
+from column import Column, DeletionBitmap
+from index import HashIndex, IdMap
+from lock import TableLock
+from predicate import Comparison, Predicate
+from stats import Stats, instrumented
+from wal import Journal
+from zone import ZONE_SIZE, ZoneMap, zone_count
+from enum import Enum
+from typing import Callable, Iterable, Iterator
+from contextlib import ExitStack, contextmanager, nullcontext
+from collections import OrderedDict
+from itertools import dropwhile, islice
+from operator import add, itemgetter
+from time import perf_counter
+import heapq
+import os
+import struct
+
+class FieldType(Enum):
+    INTEGER, STRING = 1, 2
+
+
+class TableFormat(Enum):
+    """Version du format d'une table, stockée dans le byte de poids fort du nombre de champs du header.
+       ULDB: les chaînes sont dans le string buffer du fichier de la table (format de l'énoncé).
+       HEAP: les chaînes sont dans le fichier <table>.strings, les pointeurs des entrées sont des positions
+       dans ce fichier. Le string buffer de la table reste vide: une insertion ne décale donc jamais l'entry buffer.
+       COLUMNAR: comme HEAP, mais chaque champ est aussi stocké dans sa colonne, avec un bitmap des entrées supprimées
+       (cf. column). Les parcours lisent seulement les colonnes des champs dont ils ont besoin."""
+    ULDB, HEAP, COLUMNAR = 0, 1, 2
+
+
+class IndexType(Enum):
+    """Type d'un index secondaire.
+       HASH: index d'égalité, stocké dans le fichier <table>.<champ>.idx (cf. index.HashIndex).
+       BTREE: index trié, stocké dans le fichier <table>.<champ>.btree (cf. btree.BTreeIndex). Il sert aussi les intervalles,
+       les préfixes et les parcours dans l'ordre du champ."""
+    HASH, BTREE = 1, 2
+
+
+class JournalMode(Enum):
+    """Utilisation du journal (write-ahead log, cf. wal) par les écritures d'une DB.
+       OFF: les écritures sont faites en place, sans journal (un crash peut laisser une table incohérente). Le fichier
+       du journal n'est alors créé et verrouillé que par une transaction.
+       SYNC: chaque opération est ajoutée au journal, synchronisée sur le disque (fsync) puis appliquée aux fichiers.
+       GROUP: chaque opération est ajoutée au journal et appliquée aux fichiers sans fsync: les autres Database la voient
+       aussitôt. Le journal n'est synchronisé que toutes les GROUP_COMMIT opérations ou par Database.sync(), et reste
+       jusque-là verrouillé (les écritures des autres Database attendent). Un arrêt du processus ne perd aucune opération,
+       un arrêt du système peut perdre les dernières, voire en garder une partie des écritures."""
+    OFF, SYNC, GROUP = 0, 1, 2
+
+
+STRING_LENGTH = struct.Struct('<h') # Longueur d'une chaîne encodée
+INDEX_EXTENSIONS = {IndexType.HASH: 'idx', IndexType.BTREE: 'btree'}
+RANGE_OPERATORS = ('<', '<=', '>', '>=', '^=', 'between') # Opérateurs servis par un index trié
+AGGREGATES = {'COUNT': add, 'SUM': add, 'MIN': min, 'MAX': max} # Fonction qui ajoute une valeur à un agrégat
+
+
+class TableHeader:
+    """Header d'une table déjà décodé: signature, pointeurs du header et mini-header de l'entry buffer.
+       Database le garde en cache tant que la génération du verrou de la table n'a pas changé (cf. stamp et lock)."""
+
+    def __init__(self, table_file: BinaryFile):
+        """Décode le header de la table ouverte dans table_file."""
+        if table_file.read_integer_from(4, 0).to_bytes(4, 'little', signed = True) != b'ULDB':
+            raise ValueError("this file is not an ULDB table")
+        if table_file.stats is not None:
+            table_file.stats.headers_parsed += 1
+        self.signature, cursor = [], 8
+        FIELDS_COUNT = table_file.read_integer_from(4, 4)
+        self.format = TableFormat(FIELDS_COUNT >> 24)
+        for i in range(FIELDS_COUNT & 0xFFFFFF):
+            field_type = FieldType(table_file.read_integer_from(1, cursor))
+            field_name = table_file.read_string_from(cursor + 1)
+            self.signature.append((field_name, field_type))
+            cursor += 1 + 2 + len(field_name.encode())
+        self.pointers_pos = cursor # Position des 3 pointeurs du header
+        self.string_buffer = table_file.read_integer_from(4, cursor)
+        self.string_free = table_file.read_integer_from(4, cursor + 4)
+        self.entry_buffer = table_file.read_integer_from(4, cursor + 8)
+        self.last_id = table_file.read_integer_from(4, self.entry_buffer)
+        self.size = table_file.read_integer_from(4, self.entry_buffer + 4)
+        self.first = table_file.read_integer_from(4, self.entry_buffer + 4*2)
+        self.last = table_file.read_integer_from(4, self.entry_buffer + 4*3)
+        self.first_deleted = table_file.read_integer_from(4, self.entry_buffer + 4*4)
+        # Une entrée: id, un slot de 4 bytes par champ, pointeurs précédent et suivant
+        self.entry_size = 4*(len(self.signature) + 3)
+        self.entry_struct = struct.Struct(f'<{len(self.signature) + 3}i')
+        self.slots = {'id': 0} | {name: i + 1 for i, (name, _) in enumerate(self.signature)}
+        self.types = {'id': FieldType.INTEGER} | dict(self.signature)
+        self.indexes: dict[str, HashIndex | BTreeIndex] = {}
+        self.id_map: IdMap | None = None
+        self.columns: dict[str, Column] = {} # Colonne de chaque champ (format COLUMNAR)
+        self.deleted: DeletionBitmap | None = None # Bitmap des entrées supprimées (format COLUMNAR)
+        self.zones: ZoneMap | None = None # Résumés des zones d'id (cf. zone)
+        self.strings: BinaryFile = table_file # Fichier contenant les chaînes: la table elle-même ou son heap
+        # Places libres du string buffer (ou du heap) par classe de taille (size.bit_length()): [(position, taille), ...]
+        # Elles ne sont pas stockées dans la table: la liste est reconstruite au premier besoin à partir des chaînes vivantes
+        self.free_strings: dict[int, list[tuple[int, int]]] | None = None
+        self.fragmented = False # Des places libres ont été ajoutées depuis la reconstruction: des voisines sont peut-être séparées
+        self.table_name: str | None = None # Donné par Database
+        self.stamp: int | None = None # Génération du verrou de la table quand le header a été lu
+        self.generation = 0
+
+
+    def save(self, table_file: BinaryFile) -> None:
+        """Réécrit les pointeurs du header et le mini-header de l'entry buffer dans table_file."""
+        table_file.write_integer_to(self.string_buffer, 4, self.pointers_pos)
+        table_file.write_integer_to(self.string_free, 4, self.pointers_pos + 4)
+        table_file.write_integer_to(self.entry_buffer, 4, self.pointers_pos + 8)
+        for i, value in enumerate((self.last_id, self.size, self.first, self.last, self.first_deleted)):
+            table_file.write_integer_to(value, 4, self.entry_buffer + 4*i)
+        self.generation += 1
+
+
+class Database:
+    """Dans cette classe, toutes les méthodes renvoient ValueError si l'opération liée est impossible"""
+    TableSignature = list[tuple[str, FieldType]]
+    Field = str | int
+    Entry = dict[str, Field]
+    MAX_OPEN_FILES = 32 # Nombre maximal de tables gardées ouvertes en même temps
+    BULK_STRINGS = 64 # À partir de ce nombre de chaînes à décoder, le string buffer est lu d'un bloc
+    table_format = TableFormat.ULDB # Format par défaut des tables créées par create_table
+    auto_vacuum = False # Si vrai, une suppression réencode la table quand ses entrées occupent au plus VACUUM_RATIO des places
+    VACUUM_RATIO = 0.5 # ... de l'entry buffer et qu'au moins VACUUM_MIN_RELICS places sont des reliques (cf. delete_where)
+    VACUUM_MIN_RELICS = 2
+    VACUUM_CHUNK = 1024 # Nombre d'entrées recopiées à la fois par vacuum
+    SCAN_CHUNK = 256 # Nombre d'entrées décodées à la fois par les méthodes iter_*
+    COLUMN_CHUNK = 4096 # Nombre d'id lus à la fois dans les colonnes d'une table COLUMNAR (multiple de 8)
+    INDEX_RANGE_RATIO = 0.25 # Au-delà de cette part de la table, les entrées d'un intervalle sont trouvées en la parcourant
+    ZONE_SCAN_RATIO = 0.5 # Au-delà de cette part des id, les zones non écartées sont lues en suivant la liste des entrées
+    _journal_mode = JournalMode.OFF # Utilisation du journal par les écritures des nouvelles Database (cf. journal_mode)
+    GROUP_COMMIT = 64 # Nombre d'opérations synchronisées ensemble en mode JournalMode.GROUP
+    LOCK_TIMEOUT = 10.0 # Secondes d'attente maximale du verrou d'une table pris par une autre Database
+    
+    def __init__(self, name: str):
+        self.name = name
+        self._headers: dict[str, TableHeader] = {}
+        self._handles: OrderedDict[str, MappedBinaryFile] = OrderedDict() # Du moins au plus récemment utilisé
+        if not os.path.exists(self.name):
+            os.mkdir(self.name)
+        self._locks: dict[str, TableLock] = {}
+        self._held: set[str] = set() # Tables verrouillées en exclusivité jusqu'à ce que l'opération soit appliquée
+        self._in_transaction = self._transaction_failed = False
+        self._stats: Stats | None = None # Statistiques des opérations, si elles sont collectées (cf. collect_stats)
+        # Les opérations complètes journalisées avant un crash sont appliquées avant toute lecture
+        self._journal = Journal(self.name)
+        self._recover()
+
+
+    def __enter__(self) -> 'Database':
+        return self
+
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+    def __del__(self) -> None:
+        if hasattr(self, '_journal'):
+            self.close()
+
+
+    def close(self) -> None:
+        """Annule la transaction en cours, applique le journal aux fichiers et ferme tous les fichiers de tables gardés
+           ouverts par cette DB."""
+        if self._in_transaction:
+            self.rollback()
+        if not self._journal.depth:
+            self.sync()
+        self._close_handles()
+        for lock in self._locks.values():
+            lock.close()
+        self._locks.clear()
+        self._journal.close()
+
+
+    @property
+    def journal_mode(self) -> JournalMode:
+        """Utilisation du journal par les écritures de cette DB (cf. JournalMode)."""
+        return self._journal_mode
+
+
+    @journal_mode.setter
+    def journal_mode(self, journal_mode: JournalMode) -> None:
+        """Change l'utilisation du journal: les opérations en attente sont synchronisées et les fichiers gardés ouverts
+           sont fermés, pour être rouverts attachés (ou non) au journal. Refusé pendant une transaction."""
+        if self._in_transaction:
+            raise ValueError("the journal mode can not be changed during a transaction")
+        self.sync()
+        self._close_handles()
+        self._journal_mode = journal_mode
+
+
+    @instrumented
+    def sync(self) -> None:
+        """Rend durables les opérations pas encore synchronisées (cf. JournalMode.GROUP): le journal est synchronisé sur
+           le disque, appliqué aux fichiers (eux aussi synchronisés) puis vidé."""
+        self._journal.checkpoint()
+        self._release_held()
+
+
+    def begin(self) -> None:
+        """Commence une transaction: les écritures suivantes restent en mémoire (cf. wal) jusqu'à commit(), qui les ajoute
+           au journal en une seule opération, ou rollback(), qui les annule. Si une écriture échoue, toute la transaction
+           est annulée et les écritures suivantes sont refusées jusqu'à la fin de celle-ci.
+           Les changements de schéma et vacuum sont refusés pendant une transaction."""
+        if self._in_transaction:
+            raise ValueError("a transaction is already open")
+        if self.journal_mode is JournalMode.OFF:
+            self._close_handles() # Les fichiers sont rouverts attachés au journal
+        self._journal.begin()
+        self._in_transaction = True
+
+
+    @instrumented
+    def commit(self) -> None:
+        """Termine la transaction en cours en gardant ses écritures."""
+        if not self._in_transaction:
+            raise ValueError("no transaction is open")
+        if self._transaction_failed:
+            self.rollback()
+            raise ValueError("the transaction failed and has been rolled back")
+        self._in_transaction = False
+        self._journal.end()
+        self._group_commit()
+        if self.journal_mode is JournalMode.OFF:
+            self._close_handles() # Les fichiers sont rouverts sans journal
+    
+
+    @instrumented
+    def rollback(self) -> None:
+        """Termine la transaction en cours en annulant ses écritures."""
+        if not self._in_transaction:
+            raise ValueError("no transaction is open")
+        self._in_transaction = self._transaction_failed = False
+        self._journal.end(abort = True)
+        self._close_handles() # Les headers et index en mémoire contiennent les écritures annulées
+        self.sync()
+
+
+    @contextmanager
+    def transaction(self) -> Iterator['Database']:
+        """Fait du bloc une transaction (cf. begin), validée à la fin du bloc ou annulée s'il lance une exception."""
+        self.begin()
+        try:
+            yield self
+        except BaseException:
+            if self._in_transaction:
+                self.rollback()
+            raise
+        self.commit()
+
+
+    def collect_stats(self, enabled: bool = True) -> None:
+        """Commence (en remettant tout à 0) ou arrête de collecter les statistiques des opérations de cette DB (cf. stats)."""
+        self._stats = Stats() if enabled else None
+
+
+    @contextmanager
+    def profiling(self) -> Iterator[Stats]:
+        """Collecte les statistiques des opérations du bloc dans un Stats à part, renvoyé, sans toucher à celles
+           de collect_stats."""
+        previous, self._stats = self._stats, Stats()
+        try:
+            yield self._stats
+        finally:
+            self._stats = previous
+
+
+    def stats(self) -> dict[str, dict[str, int | float]]:
+        """Renvoie, pour chaque opération (méthode publique) exécutée depuis collect_stats(), son nombre d'appels (calls),
+           son temps total en secondes (seconds), les fichiers ouverts (opens), les bytes lus (bytes_read) et écrits
+           (bytes_written), les déplacements dans les fichiers (seeks), les headers décodés (headers_parsed), les
+           agrandissements du string buffer (string_buffer_resizes), les entrées parcourues (entries_visited) et le temps
+           passé à décoder des champs (decode_seconds).
+           Lance ValueError si les statistiques ne sont pas collectées."""
+        if self._stats is None:
+            raise ValueError("the statistics are not collected")
+        return {operation: dict(totals) for operation, totals in self._stats.operations.items()}
+
+
+    @instrumented
+    def create_table(self, table_name: str, *fields: TableSignature, table_format: TableFormat | None = None) -> None:
+        """Crée une nouvelle table de nom table_name et de signature fields, au format table_format
+           (self.table_format par défaut)."""
+        TABLE_FORMAT = table_format if table_format is not None else self.table_format
+        self._prepare_schema_change()
+        with self._locked(table_name, exclusive = True) as lock:
+            if os.path.exists(f"{self.name}/{table_name}.table"):
+                raise ValueError(f'{table_name}.table already stands in this directory')
+            with open(f"{self.name}/{table_name}.table", "wb+") as tb:
+                table_file = BinaryFile(tb)
+                INITIAL_STR_BUFFER_SIZE = 16 if TABLE_FORMAT is TableFormat.ULDB else 0
+                # SIGNATURE
+                tb.write('ULDB'.encode())
+                table_file.write_integer(len(fields) | TABLE_FORMAT.value << 24, 4)
+                for one_field, a_field_type in fields:
+                    table_file.write_integer(a_field_type.value, FieldType.INTEGER.value)
+                    table_file.write_string(one_field)
+                OFFSET_STRING_BUFFER = tb.tell() + 12 if TABLE_FORMAT is TableFormat.ULDB else 0 # Début du heap
+                OFFSET_ENTRY_BUFFER = tb.tell() + 12 + INITIAL_STR_BUFFER_SIZE
+                for i in range(2):
+                    table_file.write_integer(OFFSET_STRING_BUFFER, 4) # Offset + Première place dans le string buffer
+                table_file.write_integer(OFFSET_ENTRY_BUFFER, 4)
+                # STRING BUFFER INITIALISED
+                if INITIAL_STR_BUFFER_SIZE:
+                    table_file.write_integer(0, INITIAL_STR_BUFFER_SIZE)
+                # ENTRY BUFFER 
+                table_file.write_integer(0, 8) # Le dernier ID utilisé + nombre total d'éntrées dans la table
+                for i in range(3):
+                    table_file.write_integer(-1, 4) # 3 pointeurs de l'entry buffer
+            if TABLE_FORMAT is not TableFormat.ULDB:
+                open(self._heap_path(table_name), "wb").close()
+            if TABLE_FORMAT is TableFormat.COLUMNAR:
+                for sidecar_path in [self._column_path(table_name, field_name) for field_name, _ in fields]\
+                                    + [self._deleted_path(table_name)]:
+                    open(sidecar_path, "wb").close()
+            lock.schema += 1
+
+
+    @instrumented
+    def list_tables(self) -> list[str]:
+        """Renvoie une liste avec le nom de toutes les tables existant dans cette DB"""
+        list_of_names = []
+        for pseudo_table in os.listdir(self.name):
+            if pseudo_table.endswith(".table"):
+                list_of_names.append(pseudo_table.rsplit(".table")[0])
+        return list_of_names
+    
+     
+    @instrumented
+    def delete_table(self, table_name: str) -> None:
+        """Supprime la table de nom table_name.""" 
+        self._prepare_schema_change()
+        if not os.path.exists(f"{self.name}/{table_name}.table"):
+            raise ValueError(f"{table_name}.table does not stand in this path.")
+        with self._locked(table_name, exclusive = True) as lock:
+            self._close_handle(table_name)
+            self._headers.pop(table_name, None)
+            try:
+                sidecar_paths = self._sidecar_paths(table_name)
+                os.remove(f"{self.name}/{table_name}.table")
+            except FileNotFoundError:
+                raise ValueError(f"{table_name}.table does not stand in this path.")
+            for field_name, index_type in self._indexed_fields(table_name).items():
+                os.remove(self._index_path(table_name, field_name, index_type))
+            # Ainsi que les nouveaux fichiers d'un vacuum interrompu avant d'avoir été validé
+            for sidecar_path in sidecar_paths + [f"{self.name}/{table_name}.table.tmp", self._heap_path(table_name) + ".tmp"]:
+                if os.path.exists(sidecar_path):
+                    os.remove(sidecar_path)
+            lock.schema += 1
+        
+
+    @instrumented
+    def get_table_signature(self, table_name: str) -> TableSignature:
+        """Renvoie la signature de la table de type TableSignature"""
+        with self._open_table(table_name) as (table_file, header):
+            return list(header.signature)
+        
+    
+    @instrumented
+    def add_entry(self, table_name: str, entry: Entry) -> None:
+        """ajoute l’entrée entry à la table de nom table_name."""
+        self.add_entries(table_name, [entry])
+
+
+    @instrumented
+    def add_entries(self, table_name: str, entries: Iterable[Entry]) -> None:
+        """Ajoute toutes les entrées entries à la table de nom table_name. Elles sont toutes vérifiées avant d'écrire quoi que ce
+           soit, le string buffer n'est agrandi qu'une fois et le header n'est réécrit qu'une fois."""
+        with self._operation(), self._open_table(table_name, exclusive = True) as (table_file, header):
+            entries = [self._check_entry(header, entry) for entry in entries]
+            if not entries:
+                return
+            strings = [value for values in entries for value in values if isinstance(value, str)]
+            string_positions = iter(self._write_strings(table_file, header, strings))
+
+            # Les reliques (entrées supprimées) sont réutilisées d'abord, les autres entrées sont ajoutées à la fin du fichier
+            reused = []
+            while header.first_deleted != -1 and len(reused) < len(entries):
+                reused.append(header.first_deleted)
+                header.first_deleted = table_file.read_integer_from(4, header.first_deleted + header.entry_size - 4)
+            OFFSET_NEW_ENTRIES, FIRST_ID = table_file.get_size(), header.last_id + 1
+            offsets = reused + [OFFSET_NEW_ENTRIES + i*header.entry_size for i in range(len(entries) - len(reused))]
+            encoded_entries, column_values = [], [[] for _ in header.columns]
+            for i, values in enumerate(entries):
+                slots = [FIRST_ID + i] + [next(string_positions) if isinstance(value, str) else value for value in values]
+                for column, slot in zip(column_values, slots[1:]):
+                    column.append(slot)
+                slots += [offsets[i - 1] if i else header.last, offsets[i + 1] if i + 1 < len(offsets) else -1] # Précédent, suivant
+                encoded_entries.append(header.entry_struct.pack(*slots))
+            for column, values in zip(header.columns.values(), column_values):
+                column.write(FIRST_ID, values)
+            header.zones.add(FIRST_ID, [[value.encode() if isinstance(value, str) else value for value in values] for values in entries])
+            for offset, encoded_entry in zip(reused, encoded_entries):
+                table_file.write_bytes_to(encoded_entry, offset)
+            if len(entries) > len(reused):
+                table_file.write_bytes_to(b''.join(encoded_entries[len(reused):]), OFFSET_NEW_ENTRIES)
+
+            if header.last == -1:
+                header.first = offsets[0]
+            else:
+                table_file.write_integer_to(offsets[0], 4, header.last + header.entry_size - 4)
+            header.last, header.last_id = offsets[-1], FIRST_ID + len(entries) - 1
+            header.size += len(entries)
+            header.id_map.set_range(FIRST_ID, [offset - header.entry_buffer for offset in offsets])
+            for field_name, index in header.indexes.items():
+                SLOT = [name for name, _ in header.signature].index(field_name)
+                for offset, values in zip(offsets, entries):
+                    index.add(values[SLOT], offset - header.entry_buffer)
+            self._save_header(table_name, table_file, header)
+
+
+    @instrumented
+    def get_complete_table(self, table_name: str) -> list[Entry]:
+        """Renvoie toutes les entrées de la table de nom table_name dans une liste."""
+        with self._open_table(table_name): # Toute la table est lue sous le même verrou (cf. iter_table)
+            return list(self.iter_table(table_name))
+
+
+    @instrumented
+    def get_entry(self, table_name: str, field_name: str, field_value: Field) -> Entry | None :
+        """Renvoie une entrée (quelconque) de la table de nom table_name dont le champ field_name contient\
+        la valeur field_value si une telle entrée existe, et qui renvoie None sinon."""
+        with self._open_table(table_name) as (table_file, header):
+            for _, row in self._find(table_file, header, field_name, field_value):
+                return self._entries(table_file, header, [row])[0]
+        return None
+
+
+    @instrumented
+    def get_entries(self, table_name: str, field_name: str, field_value: Field) -> list[Entry]:
+        """Renvoie toutes les entrées de la table de nom table_name dont le champ field_name contient la valeur field_name."""
+        with self._open_table(table_name):
+            return list(self.iter_entries(table_name, field_name, field_value))
+
+
+    @instrumented
+    def select_entry(self, table_name: str, fields: tuple[str], field_name: str, field_value: Field) -> Field | tuple[Field]:
+        """Effectue une sélection des champs demandés sur une entrée de la table de nom table_name dont le champ field_name contient\
+        la valeur field_value et renvoie ces champs uniquement. Si un unique champ est demandé, la fonction ne doit pas
+        renvoyer un tuple de taille 1, mais bien uniquement la valeur du champ demandé.
+        Sinon, le tuple renvoyé doit contenir les valeurs des champs dans le même ordre que celui demandé par le paramètre fields."""
+        with self._open_table(table_name) as (table_file, header):
+            for _, row in self._find(table_file, header, field_name, field_value):
+                return self._select(table_file, header, [row], fields)[0]
+        return None
+
+
+    @instrumented
+    def select_entries(self, table: str, fields: tuple[str], field_name: str, field_value: Field) -> list[Field | tuple[Field]]:
+        """Similaire à select_entry cependant renvoie les champs demandés de
+           toutes les entrées de la table de nom table_name satisfaisant la condition."""
+        with self._open_table(table):
+            return list(self.iter_select(table, fields, field_name, field_value))
+
+
+    @instrumented
+    def iter_table(self, table_name: str) -> Iterator[Entry]:
+        """Comme get_complete_table, mais les entrées sont renvoyées une à une pendant le parcours de la table,
+           décodées par paquets de SCAN_CHUNK: la mémoire utilisée ne dépend pas de la taille de la table.
+           La table n'est verrouillée que pendant la lecture d'un paquet (cf. _iter_chunks): entre deux paquets, elle peut
+           être modifiée, par cette Database ou une autre, et le parcours reprend alors après la dernière entrée renvoyée.
+           Un parcours abandonné ne bloque donc pas les écritures."""
+        def scan(tables: list[tuple[BinaryFile, TableHeader]], after: int) -> tuple[Iterator, Callable[[list], list]]:
+            (table_file, header), = tables
+            rows = dropwhile(lambda offset_row: offset_row[1][0] <= after, self._rows(table_file, header))
+            return rows, lambda chunk: self._entries(table_file, header, [row for _, row in chunk])
+        yield from self._iter_chunks((table_name,), scan, resumable = True)
+
+
+    @instrumented
+    def iter_entries(self, table_name: str, field_name: str, field_value: Field) -> Iterator[Entry]:
+        """Comme get_entries, mais les entrées sont renvoyées une à une (cf. iter_table)."""
+        return self.iter_where(table_name, Comparison(field_name, '=', field_value))
+
+
+    @instrumented
+    def iter_select(self, table_name: str, fields: tuple[str], field_name: str, field_value: Field) -> Iterator[Field | tuple[Field]]:
+        """Comme select_entries, mais les sélections sont renvoyées une à une (cf. iter_table).
+           Seuls les champs demandés sont décodés."""
+        return self.iter_select_where(table_name, fields, Comparison(field_name, '=', field_value))
+
+
+    @instrumented
+    def iter_where(self, table_name: str, predicate: Predicate, order_by: str | None = None, descending: bool = False,\
+                   limit: int | None = None) -> Iterator[Entry]:
+        """Renvoie une à une les entrées de la table de nom table_name qui satisfont le prédicat predicate (cf. predicate).
+           Toutes les conditions sont évaluées en un seul parcours de la table, ou seulement sur les entrées données
+           par les index quand ils le permettent.
+           Si order_by est donné, les entrées sont renvoyées dans l'ordre de ce champ (décroissant si descending),
+           sans tri si le champ a un index trié. Au plus limit entrées sont renvoyées si limit est donné.
+           Comme pour iter_table, la table n'est verrouillée que pendant la lecture d'un paquet. Si elle est modifiée
+           entre deux paquets, un parcours dans l'ordre des id reprend après la dernière entrée renvoyée, un parcours
+           dans l'ordre de order_by lance ValueError."""
+        def scan(tables: list[tuple[BinaryFile, TableHeader]], after: int) -> tuple[Iterator, Callable[[list], list]]:
+            (table_file, header), = tables
+            rows = self._ordered_match(table_file, header, self._after(predicate, after), order_by, descending, limit)
+            return rows, lambda chunk: self._entries(table_file, header, [row for _, row in chunk])
+        yield from self._iter_chunks((table_name,), scan, order_by is None, limit)
+
+
+    @instrumented
+    def iter_select_where(self, table_name: str, fields: tuple[str], predicate: Predicate, order_by: str | None = None,\
+                          descending: bool = False, limit: int | None = None) -> Iterator[Field | tuple[Field]]:
+        """Renvoie une à une les sélections des champs fields des entrées qui satisfont le prédicat predicate (cf. iter_where).
+           Dans une table COLUMNAR parcourue sans ordre, les champs sont lus et décodés directement depuis leurs colonnes."""
+        def scan(tables: list[tuple[BinaryFile, TableHeader]], after: int) -> tuple[Iterator, Callable[[list], list]]:
+            (table_file, header), = tables
+            self._check_fields(header, fields)
+            narrowed = self._after(predicate, after)
+            if order_by is None and self._scans_columns(header, narrowed):
+                rows, row_slots = ((0, row) for row in self._column_rows(header, fields, narrowed)), self._column_slots(fields)
+            else:
+                rows, row_slots = self._ordered_match(table_file, header, narrowed, order_by, descending, limit), None
+            return rows, lambda chunk: self._select(table_file, header, [row for _, row in chunk], fields, row_slots)
+        yield from self._iter_chunks((table_name,), scan, order_by is None, limit)
+
+
+    @instrumented
+    def aggregate(self, table_name: str, aggregates: tuple[tuple[str, str], ...], predicate: Predicate | None = None,\
+                  group_by: tuple[str, ...] = ()) -> list[tuple[Field | None, ...]]:
+        """Calcule les agrégats aggregates, des couples (fonction, champ) où la fonction est COUNT, SUM, MIN ou MAX
+           (le champ * compte les entrées), sur les entrées de la table table_name qui satisfont predicate (toutes si None),
+           groupées par les valeurs des champs group_by. Renvoie un tuple (valeurs de group_by..., agrégats...) par groupe,
+           dans l'ordre de la première entrée de chaque groupe. Sans group_by, il y a un seul tuple, où MIN et MAX valent None
+           si aucune entrée ne compte. Les entrées sont lues en un seul parcours sans être décodées: seule la table
+           des groupes est gardée en mémoire. COUNT(*) sur toute la table est lu dans le header."""
+        with self._open_table(table_name) as (table_file, header):
+            self._check_fields(header, group_by)
+            for function, field_name in aggregates:
+                if function not in AGGREGATES:
+                    raise ValueError(f"{function} is not an aggregate function")
+                if field_name == '*' and function != 'COUNT':
+                    raise ValueError(f"{function} needs a field")
+                if field_name != '*':
+                    self._check_fields(header, (field_name,))
+                if function == 'SUM' and header.types[field_name] is FieldType.STRING:
+                    raise ValueError(f"{field_name} must be of type INTEGER to be summed")
+            if predicate is None and not group_by and all(function == 'COUNT' for function, _ in aggregates):
+                return [(header.size,)*len(aggregates)]
+
+            # Les chaînes sont groupées et comparées encodées, elles ne sont décodées qu'une fois par groupe
+            # Dans une table COLUMNAR parcourue, seules les colonnes des champs utilisés sont lues
+            columns = tuple(dict.fromkeys(group_by + tuple(field_name for _, field_name in aggregates if field_name != '*')))\
+                      if predicate is None or self._scans_columns(header, predicate) else None
+            row_slots = self._column_slots(columns) if columns is not None and self._reads_columns(header) else None
+            value_of = lambda field_name: self._raw_value(header, field_name, row_slots)
+            values = [(lambda row: 1) if function == 'COUNT' else value_of(field_name) for function, field_name in aggregates]
+            combines = [AGGREGATES[function] for function, _ in aggregates]
+            if len(group_by) == 1:
+                group_key = value_of(group_by[0])
+            else:
+                key_values = [value_of(field_name) for field_name in group_by]
+                group_key = lambda row: tuple(value(row) for value in key_values)
+            groups: dict[int | bytes | tuple, list] = {}
+            if row_slots is not None:
+                rows = ((0, row) for row in self._column_rows(header, columns, predicate))
+            else:
+                rows = self._rows(table_file, header) if predicate is None else self._match(table_file, header, predicate)
+            for _, row in rows:
+                key = group_key(row)
+                state = groups.get(key)
+                if state is None:
+                    groups[key] = [value(row) for value in values]
+                else:
+                    for i, combine in enumerate(combines):
+                        state[i] = combine(state[i], values[i](row))
+            if not group_by and not groups:
+                groups[()] = [None if function in ('MIN', 'MAX') else 0 for function, _ in aggregates]
+
+            decode = lambda value: value.decode() if isinstance(value, bytes) else value
+            return [tuple(map(decode, ((key,) if len(group_by) == 1 else key))) + tuple(map(decode, state))\
+                    for key, state in groups.items()]
+
+
+    @instrumented
+    def access_path(self, table_name: str, predicate: Predicate) -> str:
+        """Renvoie 'index' si les entrées qui satisfont le prédicat predicate sont trouvées par les index
+           (dont l'index des id), 'scan' s'il faut parcourir toute la table."""
+        with self._open_table(table_name) as (table_file, header):
+            predicate.check(self._python_types(header))
+            return 'scan' if self._needs_scan(header, predicate) else 'index'
+
+
+    @instrumented
+    def estimate_rows(self, table_name: str, predicate: Predicate | None = None) -> int:
+        """Renvoie le nombre d'entrées parcourues pour trouver celles de la table table_name qui satisfont le prédicat
+           predicate: celles données par les index (seuls ceux-ci sont lus) s'ils le permettent, sinon au plus celles
+           des zones que leurs résumés n'écartent pas (cf. _zone_scan), toutes si predicate est None."""
+        with self._open_table(table_name) as (table_file, header):
+            if predicate is None:
+                return header.size
+            predicate.check(self._python_types(header))
+            candidates = predicate.candidates(lambda field_name, operator, value:\
+                                              self._lookup(table_file, header, field_name, operator, value))
+            if candidates is not None:
+                return len(candidates)
+            id_ranges = self._zone_ranges(header, predicate)
+            if id_ranges is None or not self._reads_columns(header)\
+               and sum(count for _, count in id_ranges) > self.ZONE_SCAN_RATIO*header.last_id:
+                return header.size
+            return min(header.size, sum(count for _, count in id_ranges))
+
+
+    @instrumented
+    def join(self, left_table: str, right_table: str, on: str | tuple[str, str],\
+             fields: tuple[tuple[str, ...], tuple[str, ...]] | None = None) -> Iterator[tuple]:
+        """Renvoie une à une les paires (entrée de left_table, entrée de right_table) dont les champs on = (champ de gauche,
+           champ de droite) ont la même valeur (on peut aussi être le nom d'un champ des deux tables). Si fields =
+           (champs de gauche, champs de droite) est donné, renvoie plutôt les valeurs de ces champs à la suite
+           (la valeur seule s'il n'y a qu'un champ), décodées par paquets de SCAN_CHUNK paires.
+           Si le champ de jointure d'une des tables est indexé (ou est id), l'autre table est parcourue et chacune de ses
+           entrées est cherchée dans l'index. Sinon une table de hachage est construite sur le champ de la plus petite table,
+           puis la plus grande est parcourue une fois: le temps est linéaire et la mémoire bornée par la plus petite table.
+           Les tables ne sont verrouillées que pendant la lecture d'un paquet (cf. _iter_chunks): si l'une d'elles
+           est modifiée entre deux paquets, ValueError est lancée."""
+        left_field, right_field = (on, on) if isinstance(on, str) else on
+
+        def scan(tables: list[tuple[BinaryFile, TableHeader]], after: int) -> tuple[Iterator, Callable[[list], list]]:
+            (left_file, left_header), (right_file, right_header) = tables
+            self._check_fields(left_header, (left_field,) + (fields[0] if fields else ()))
+            self._check_fields(right_header, (right_field,) + (fields[1] if fields else ()))
+            if left_header.types[left_field] is not right_header.types[right_field]:
+                raise ValueError(f"{left_field} and {right_field} must have the same type to be joined")
+            sides = ((left_file, left_header, left_field), (right_file, right_header, right_field))
+
+            def decode_side(side: int, rows: list[tuple[int, ...]]) -> list:
+                """Renvoie les entrées ou les champs demandés (en tuples) des entrées rows d'un côté de la jointure."""
+                table_file, header, _ = sides[side]
+                if fields is None:
+                    return self._entries(table_file, header, rows)
+                if len(fields[side]) == 1:
+                    return [(value,) for value in self._select(table_file, header, rows, fields[side])]
+                return self._select(table_file, header, rows, fields[side]) if fields[side] else [()]*len(rows)
+
+            def decode(chunk: list[tuple[tuple[int, ...], tuple[int, ...]]]) -> list:
+                """Renvoie les paires ou les valeurs demandées d'un paquet de paires d'entrées."""
+                lefts, rights = decode_side(0, [left for left, _ in chunk]), decode_side(1, [right for _, right in chunk])
+                if fields is None:
+                    return list(zip(lefts, rights))
+                if len(fields[0]) + len(fields[1]) == 1:
+                    return [(left + right)[0] for left, right in zip(lefts, rights)]
+                return [left + right for left, right in zip(lefts, rights)]
+            return self._join_rows(*sides), decode
+        yield from self._iter_chunks((left_table, right_table), scan, resumable = False)
+
+
+    @instrumented
+    def get_table_size(self, table_name: str) -> int:
+        """Renvoie le nombre d’entrées dans la table de nom table_name"""
+        with self._open_table(table_name) as (table_file, header):
+            return header.size
+
+
+    @instrumented
+    def update_entries(self, table_str: str, cond_name: str, cond_value: Field, update_name: str, update_value: Field) -> bool:
+        """Remplace le champ update_name par la valeur update_value pour toutes les entrées de la table de nom\
+           table_str dont le champ cond_name contient la valeur cond_value. Renvoie True si au moins une entrée a été modifiée."""
+        return self.update_where(table_str, Comparison(cond_name, '=', cond_value), update_name, update_value)
+
+
+    @instrumented
+    def update_where(self, table_str: str, predicate: Predicate, update_name: str, update_value: Field) -> bool:
+        """Remplace le champ update_name par la valeur update_value pour toutes les entrées de la table de nom table_str
+           qui satisfont le prédicat predicate. Renvoie True si au moins une entrée a été modifiée."""
+        with self._operation(), self._open_table(table_str, exclusive = True) as (table_file, header):
+            if update_name == 'id':
+                raise ValueError("the id of an entry can not be updated")
+            self._check_value(header, update_name, update_value)
+            rows = list(self._match(table_file, header, predicate))
+            offsets = [offset for offset, _ in rows]
+            SLOT = 4*header.slots[update_name]
+            if update_name in header.indexes:
+                index = header.indexes[update_name]
+                for (offset, _), old_value in zip(rows, self._select(table_file, header, [row for _, row in rows], (update_name,))):
+                    index.remove(old_value, offset - header.entry_buffer)
+                    index.add(update_value, offset - header.entry_buffer)
+            if rows:
+                header.zones.update((row[0] for _, row in rows), update_name,\
+                                    update_value.encode() if isinstance(update_value, str) else update_value)
+            column = header.columns.get(update_name)
+            if header.types[update_name] is FieldType.INTEGER:
+                for offset in offsets:
+                    table_file.write_integer_to(update_value, 4, offset + SLOT)
+                if column is not None:
+                    for _, row in rows:
+                        column.set(row[0], update_value)
+            else:
+                # Une chaîne plus courte réutilise la place de l'ancienne (le reste est libéré), les autres sont écrites
+                # dans une place libre ou à la fin du string buffer et l'ancienne est libérée
+                LENGTH = len(update_value.encode())
+                self._free_strings(table_file, header)
+                old_strings = {offset: (pointer, header.strings.read_integer_from(2, pointer))\
+                               for offset, pointer in ((offset, row[header.slots[update_name]]) for offset, row in rows)}
+                too_long = [offset for offset in offsets if old_strings[offset][1] < LENGTH]
+                for offset in offsets:
+                    pointer, old_length = old_strings[offset]
+                    if old_length >= LENGTH:
+                        header.strings.write_string_to(update_value, pointer)
+                        self._release_string_space(header, pointer + 2 + LENGTH, old_length - LENGTH)
+                OLD_ENTRY_BUFFER = header.entry_buffer
+                new_pointers = self._write_strings(table_file, header, [update_value]*len(too_long))
+                delta = header.entry_buffer - OLD_ENTRY_BUFFER
+                for offset, new_pointer in zip(too_long, new_pointers):
+                    table_file.write_integer_to(new_pointer, 4, offset + delta + SLOT)
+                    self._release_string_space(header, old_strings[offset][0], 2 + old_strings[offset][1])
+                if column is not None:
+                    ids = {offset: row[0] for offset, row in rows}
+                    for offset, new_pointer in zip(too_long, new_pointers):
+                        column.set(ids[offset], new_pointer)
+            self._save_header(table_str, table_file, header)
+            return bool(offsets)
+
+
+    @instrumented
+    def delete_entries(self, table_name: str, field_name: str, field_value: Field) -> bool:
+        """Supprime de la table de nom table_name toutes les entrées dont le champ field_name contient la valeur field_value.\
+           Renvoie True si au moins une entrée a été supprimée."""
+        return self.delete_where(table_name, Comparison(field_name, '=', field_value))
+
+
+    @instrumented
+    def delete_where(self, table_name: str, predicate: Predicate) -> bool:
+        """Supprime de la table de nom table_name toutes les entrées qui satisfont le prédicat predicate.
+           Renvoie True si au moins une entrée a été supprimée.
+           Si auto_vacuum est vrai, la table est ensuite réencodée (cf. vacuum) quand ses entrées n'occupent plus que
+           VACUUM_RATIO des places de l'entry buffer, s'il y a au moins VACUUM_MIN_RELICS reliques. Comme vacuum ne laisse
+           aucune relique, il faut alors supprimer au moins la moitié des entrées (au ratio par défaut) avant le suivant:
+           des ajouts et suppressions alternés, qui réutilisent les reliques, ne réencodent pas la table à chaque fois."""
+        with self._operation(), self._open_table(table_name, exclusive = True) as (table_file, header):
+            rows = list(self._match(table_file, header, predicate))
+            offsets = [offset for offset, _ in rows]
+            if not rows:
+                return False
+            self._free_strings(table_file, header)
+            string_slots = [header.slots[name] for name, field_type in header.signature if field_type is FieldType.STRING]
+            for _, row in rows:
+                for slot in string_slots:
+                    self._release_string_space(header, row[slot], 2 + header.strings.read_integer_from(2, row[slot]))
+            for indexed_field, index in header.indexes.items():
+                for (offset, _), value in zip(rows, self._select(table_file, header, [row for _, row in rows], (indexed_field,))):
+                    index.remove(value, offset - header.entry_buffer)
+            for _, row in rows:
+                header.id_map.set(row[0], -1)
+            header.zones.mark_stale(row[0] for _, row in rows)
+            if header.deleted is not None:
+                header.deleted.mark(row[0] for _, row in rows)
+            for offset in offsets:
+                previous_entry = table_file.read_integer_from(4, offset + header.entry_size - 8)
+                next_entry = table_file.read_integer_from(4, offset + header.entry_size - 4)
+                if previous_entry == -1:
+                    header.first = next_entry
+                else:
+                    table_file.write_integer_to(next_entry, 4, previous_entry + header.entry_size - 4)
+                if next_entry == -1:
+                    header.last = previous_entry
+                else:
+                    table_file.write_integer_to(previous_entry, 4, next_entry + header.entry_size - 8)
+                # L'entrée devient une relique, chaînée par son pointeur suivant à la liste des entrées supprimées
+                table_file.write_bytes_to(header.entry_struct.pack(0, *[0]*len(header.signature), -1, header.first_deleted), offset)
+                header.first_deleted = offset
+                header.size -= 1
+            self._save_header(table_name, table_file, header)
+            SLOTS = (table_file.get_size() - header.entry_buffer - 20) // header.entry_size
+            compact = self.auto_vacuum and header.size <= self.VACUUM_RATIO*SLOTS and SLOTS - header.size >= self.VACUUM_MIN_RELICS
+        # Dans une opération englobante, la table ne peut pas être remplacée avant que celle-ci soit terminée. Un parcours
+        # en cours reprend après sa dernière entrée (cf. _iter_chunks): les positions des entrées peuvent changer
+        if compact and not self._journal.depth:
+            self.vacuum(table_name)
+        return True
+
+
+    @instrumented
+    def create_index(self, table_name: str, field_name: str, index_type: IndexType = IndexType.HASH) -> None:
+        """Crée un index de type index_type sur le champ field_name de la table table_name: les recherches d'égalité sur
+           ce champ (et, pour un index trié, les intervalles, préfixes et tris) ne parcourent alors plus toute la table."""
+        self._prepare_schema_change() # L'index est écrit directement: il ne doit contenir que des entrées déjà appliquées
+        with self._open_table(table_name, exclusive = True) as (table_file, header):
+            if field_name not in header.types:
+                raise ValueError(f"{field_name} is not a field of this table")
+            if field_name in header.indexes or field_name == 'id':
+                raise ValueError(f"{field_name} is already indexed")
+            self._build_index(table_name, table_file, header, field_name, index_type)
+            self._locks[table_name].schema += 1
+
+
+    @instrumented
+    def list_indexes(self, table_name: str) -> list[str]:
+        """Renvoie les champs indexés de la table table_name."""
+        with self._open_table(table_name) as (table_file, header):
+            return list(header.indexes)
+
+
+    @instrumented
+    def schema_version(self, table_name: str) -> int:
+        """Renvoie la version du schéma (signature et index) de la table table_name, qui change à chaque create_table,
+           delete_table, create_index et drop_index sur cette table, faits par n'importe quelle Database."""
+        with self._locked(table_name) as lock:
+            return lock.schema
+
+
+    @instrumented
+    def drop_index(self, table_name: str, field_name: str) -> None:
+        """Supprime l'index du champ field_name de la table table_name."""
+        self._prepare_schema_change()
+        with self._open_table(table_name, exclusive = True) as (table_file, header):
+            if field_name not in header.indexes:
+                raise ValueError(f"{field_name} is not indexed")
+            index = header.indexes.pop(field_name)
+            index.close()
+            os.remove(self._index_path(table_name, field_name, self._index_type(index)))
+            self._locks[table_name].schema += 1
+
+
+    @instrumented
+    def vacuum(self, table_name: str) -> int:
+        """Réencode la table de nom table_name sans reliques ni chaînes mortes: le string buffer a la plus petite taille
+           possible et les entrées se suivent dans l'ordre des id (qui sont gardés). La table (et son heap) est écrite dans
+           de nouveaux fichiers, en deux passages qui ne gardent que VACUUM_CHUNK entrées en mémoire, puis un marqueur valide
+           leur remplacement (cf. _finish_vacuum): un crash laisse l'ancienne table ou la nouvelle, jamais un mélange.
+           Les index et les résumés périmés des zones sont reconstruits. Renvoie le nombre de bytes récupérés."""
+        path, heap_path = f"{self.name}/{table_name}.table", self._heap_path(table_name)
+        self._prepare_schema_change() # Les fichiers sont remplacés: le journal ne doit plus rien contenir pour eux
+        if not os.path.exists(path):
+            raise ValueError(f"{table_name}.table does not stand in this directory.")
+        with self._locked(table_name, exclusive = True): # Jusqu'au remplacement des fichiers et à la reconstruction des index
+            with self._open_table(table_name) as (table_file, header):
+                HEAP = header.format is not TableFormat.ULDB # Les chaînes sont dans le heap
+                string_slots = [header.slots[name] for name, field_type in header.signature if field_type is FieldType.STRING]
+                OLD_SIZE = table_file.get_size() + (header.strings.get_size() if HEAP else 0)
+                # Premier passage: place prise par les chaînes vivantes
+                STRINGS_SIZE = sum(2 + header.strings.read_integer_from(2, row[slot])\
+                                   for _, row in self._rows(table_file, header) for slot in string_slots)
+                size_of_string_buffer = 0 if HEAP else 16 # La taille du string buffer reste une puissance de 2
+                while size_of_string_buffer and size_of_string_buffer < STRINGS_SIZE:
+                    size_of_string_buffer *= 2
+                STRING_BUFFER = 0 if HEAP else header.pointers_pos + 12
+                ENTRY_BUFFER = header.pointers_pos + 12 + size_of_string_buffer
+                FIRST = ENTRY_BUFFER + 20
+                # Second passage: les chaînes et les entrées sont recopiées par paquets
+                with open(path + ".tmp", "wb+") as tb, (open(heap_path + ".tmp", "wb+") if HEAP else nullcontext()) as heap:
+                    new_file = BinaryFile(tb)
+                    new_strings = BinaryFile(heap) if HEAP else new_file
+                    new_file.write_bytes_to(table_file.read_bytes_from(header.pointers_pos, 0) + bytes(12 + size_of_string_buffer), 0)
+                    string_pos, entry_pos, rows = STRING_BUFFER, FIRST, self._rows(table_file, header)
+                    while chunk := list(islice(rows, self.VACUUM_CHUNK)):
+                        encoded_strings, encoded_entries = [], []
+                        for _, row in chunk:
+                            slots = list(row)
+                            for slot in string_slots:
+                                encoded_strings.append(header.strings.read_bytes_from(2 + header.strings.read_integer_from(2, row[slot]),\
+                                                                                      row[slot]))
+                                slots[slot], string_pos = string_pos, string_pos + len(encoded_strings[-1])
+                            slots[-2:] = entry_pos - header.entry_size if entry_pos > FIRST else -1, entry_pos + header.entry_size
+                            encoded_entries.append(header.entry_struct.pack(*slots))
+                            entry_pos += header.entry_size
+                        new_strings.write_bytes_to(b''.join(encoded_strings), string_pos - sum(map(len, encoded_strings)))
+                        new_file.write_bytes_to(b''.join(encoded_entries), entry_pos - len(encoded_entries)*header.entry_size)
+                    LAST = entry_pos - header.entry_size if entry_pos > FIRST else -1
+                    if LAST != -1:
+                        new_file.write_integer_to(-1, 4, LAST + header.entry_size - 4)
+                    for i, value in enumerate((STRING_BUFFER, string_pos, ENTRY_BUFFER)):
+                        new_file.write_integer_to(value, 4, header.pointers_pos + 4*i)
+                    for i, value in enumerate((header.last_id, header.size, FIRST if LAST != -1 else -1, LAST, -1)):
+                        new_file.write_integer_to(value, 4, ENTRY_BUFFER + 4*i)
+                    for new in (tb, heap) if HEAP else (tb,):
+                        new.flush()
+                        os.fsync(new.fileno())
+                    NEW_SIZE = new_file.get_size() + (new_strings.get_size() if HEAP else 0)
+                # Les résumés des zones ne dépendent pas des positions: ils ne sont reconstruits que s'ils sont périmés
+                kept = set() if header.zones.stale() else {self._zones_path(table_name)}
+            self._sync_directory() # Les nouveaux fichiers existent avant le marqueur qui valide leur remplacement
+            with open(self._vacuum_path(table_name), "wb") as marker:
+                marker.write(b'1' if kept else b'0')
+                marker.flush()
+                os.fsync(marker.fileno())
+            self._sync_directory()
+            self._finish_vacuum(table_name)
+            return OLD_SIZE - NEW_SIZE
+
+
+    def _finish_vacuum(self, table_name: str) -> None:
+        """Termine vacuum sur la table table_name, verrouillée en exclusivité, d'après son marqueur: les nouveaux fichiers
+           remplacent les anciens, les fichiers annexes qui dépendent des positions des entrées et des chaînes sont supprimés
+           (l'index des id, les colonnes et les résumés des zones s'ils sont périmés, reconstruits à la réouverture) et
+           les index reconstruits, puis le marqueur est supprimé. Chaque étape peut être refaite: après un crash,
+           la première Database qui verrouille la table termine le remplacement (cf. _locked)."""
+        path, heap_path, marker_path = f"{self.name}/{table_name}.table", self._heap_path(table_name), self._vacuum_path(table_name)
+        self._close_handle(table_name)
+        self._headers.pop(table_name, None)
+        with open(marker_path, "rb") as marker:
+            kept = {heap_path} | ({self._zones_path(table_name)} if marker.read() == b'1' else set())
+        for new_path in (heap_path, path):
+            if os.path.exists(new_path + ".tmp"):
+                os.replace(new_path + ".tmp", new_path)
+        for sidecar_path in self._sidecar_paths(table_name):
+            if sidecar_path not in kept and os.path.exists(sidecar_path):
+                os.remove(sidecar_path)
+        self._sync_directory()
+        with self._open_table(table_name) as (table_file, header):
+            for field_name, index_type in self._indexed_fields(table_name).items():
+                self._build_index(table_name, table_file, header, field_name, index_type)
+        os.remove(marker_path)
+        self._sync_directory()
+
+
+    def _sync_directory(self) -> None:
+        """Synchronise le dossier de la DB sur le disque: les créations, renommages et suppressions de fichiers faits
+           jusque-là sont durables (sans effet là où un dossier ne peut pas être ouvert, sous Windows)."""
+        if not hasattr(os, 'O_DIRECTORY'):
+            return
+        fd = os.open(self.name, os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+
+    @contextmanager
+    def _open_table(self, table_name: str, exclusive: bool = False) -> Iterator[tuple[BinaryFile, TableHeader]]:
+        """Fournit le BinaryFile de la table table_name (gardé ouvert entre les appels) ainsi que son header, la table
+           étant verrouillée pendant le bloc: en partage, ou en exclusivité pour y écrire (cf. _locked).
+           Le header n'est relu que si la table a été modifiée depuis sa mise en cache, c'est-à-dire si la génération
+           de son verrou a changé."""
+        if table_name not in self._locks and not os.path.exists(f"{self.name}/{table_name}.table"):
+            raise ValueError(f"{table_name}.table does not stand in this directory.")
+        with self._locked(table_name, exclusive) as lock:
+            table_file, header = self._handles.get(table_name), self._headers.get(table_name)
+            if table_file is None or header is None or header.stamp != lock.generation:
+                try:
+                    INODE = os.stat(f"{self.name}/{table_name}.table").st_ino
+                except FileNotFoundError:
+                    raise ValueError(f"{table_name}.table does not stand in this directory.")
+                if table_file is None or os.fstat(table_file.file.fileno()).st_ino != INODE:
+                    # La table a été supprimée puis recréée: le fichier ouvert n'est plus le bon
+                    self._close_handle(table_name)
+                    table_file = self._open_handle(table_name)
+                else:
+                    table_file.remap() # Le fichier a pu rétrécir: la projection dépasserait sa fin
+                if header is not None:
+                    self._close_sidecars(header)
+                header = self._headers[table_name] = TableHeader(table_file)
+                header.table_name, header.stamp = table_name, lock.generation
+                if header.format is not TableFormat.ULDB:
+                    try:
+                        header.strings = MappedBinaryFile(open(self._heap_path(table_name), "rb+", buffering = 0),\
+                                                          self._file_journal())
+                    except FileNotFoundError:
+                        raise ValueError(f"the string heap of {table_name} is missing")
+                for field_name, index_type in self._indexed_fields(table_name).items():
+                    if field_name in header.types:
+                        index_class = HashIndex if index_type is IndexType.HASH else BTreeIndex
+                        header.indexes[field_name] = index_class(self._index_path(table_name, field_name, index_type),\
+                                                                 header.types[field_name] is FieldType.STRING, self._file_journal())
+            self._open_summaries(table_name, table_file, header, lock.exclusive)
+            self._handles.move_to_end(table_name)
+            yield table_file, header
+
+
+    def _open_summaries(self, table_name: str, table_file: BinaryFile, header: TableHeader, build: bool) -> None:
+        """Ouvre l'index des id, les résumés des zones et les colonnes (format COLUMNAR) de la table table_name qui ne le
+           sont pas encore. Ceux dont le fichier manque ou est trop court sont reconstruits à partir des entrées si build
+           est vrai, c'est-à-dire sous le verrou exclusif avec lequel le header a été lu. Sinon ils restent à None: une lecture
+           n'écrit jamais, elle s'en passe (cf. _reads_columns) et la prochaine écriture les reconstruira."""
+        if header.id_map is None:
+            header.id_map = IdMap(self._id_map_path(table_name), self._file_journal())
+            if not header.id_map.exists(header.last_id):
+                if build:
+                    self._rebuild_id_map(table_name, table_file, header)
+                else:
+                    header.id_map.close()
+                    header.id_map = None
+        if header.zones is None:
+            header.zones = ZoneMap(self._zones_path(table_name), [(field_name, field_type is FieldType.STRING)\
+                                                                  for field_name, field_type in header.signature],\
+                                   self._file_journal())
+            if not header.zones.exists(header.last_id):
+                if build:
+                    self._rebuild_zones(table_name, table_file, header)
+                else:
+                    header.zones.close()
+                    header.zones = None
+        if header.format is TableFormat.COLUMNAR and header.deleted is None:
+            header.columns = {field_name: Column(self._column_path(table_name, field_name), self._file_journal())\
+                              for field_name, _ in header.signature}
+            header.deleted = DeletionBitmap(self._deleted_path(table_name), self._file_journal())
+            if not header.deleted.exists() or not all(column.exists(header.last_id) for column in header.columns.values()):
+                if build:
+                    self._rebuild_columns(table_name, table_file, header)
+                else:
+                    for sidecar in list(header.columns.values()) + [header.deleted]:
+                        sidecar.close()
+                    header.columns, header.deleted = {}, None
+
+
+    def _open_handle(self, table_name: str) -> MappedBinaryFile:
+        """Ouvre le fichier de la table table_name et le garde dans le pool des fichiers ouverts,
+           en fermant le moins récemment utilisé si MAX_OPEN_FILES est atteint."""
+        while len(self._handles) >= max(self.MAX_OPEN_FILES, 1):
+            self._close_handle(next(iter(self._handles)))
+        # Sans buffer: les écritures se font directement aux positions demandées, les lectures dans la projection mémoire
+        table_file = MappedBinaryFile(open(f"{self.name}/{table_name}.table", "rb+", buffering = 0), self._file_journal())
+        self._handles[table_name] = table_file
+        return table_file
+
+
+    @contextmanager
+    def _operation(self) -> Iterator[None]:
+        """Fait des écritures du bloc une seule opération du journal, écrite entièrement ou pas du tout
+           (cf. Journal.operation), ou l'ajoute à la transaction en cours. Si le bloc lance une exception, les fichiers et
+           index gardés ouverts sont fermés: leur contenu en mémoire peut contenir des écritures annulées."""
+        if self._transaction_failed:
+            raise ValueError("the transaction failed: it must be rolled back")
+        try:
+            with self._journal.operation():
+                yield
+        except BaseException:
+            if self._in_transaction and self._journal.depth == 1:
+                self._journal.abort() # Toute la transaction est annulée
+                self._transaction_failed = True
+                self._close_handles()
+            elif not self._journal.depth and self._file_journal() is not None:
+                self._close_handles()
+                self.sync() # Rend les verrous des tables, les opérations précédentes du groupe sont gardées
+            raise
+        if not self._journal.depth:
+            self._group_commit()
+
+
+    def _group_commit(self) -> None:
+        """Synchronise le journal après une opération, sauf en mode JournalMode.GROUP où seul le fsync est fait par groupes
+           de GROUP_COMMIT opérations: l'opération est appliquée aux fichiers et ses tables sont rendues aussitôt."""
+        if self.journal_mode is not JournalMode.GROUP or self._journal.pending >= self.GROUP_COMMIT:
+            self.sync()
+        else:
+            self._journal.apply()
+            self._release_held()
+
+
+    def _release_held(self) -> None:
+        """Rend les tables gardées verrouillées jusqu'à ce que les écritures de l'opération soient dans leurs fichiers
+           (cf. _locked)."""
+        for table_name in self._held:
+            self._release(table_name)
+        self._held.clear()
+
+
+    def _prepare_schema_change(self) -> None:
+        """Applique le journal aux fichiers avant un changement de schéma ou vacuum, qui créent, remplacent ou suppriment
+           des fichiers. Comme rollback() ne pourrait pas les annuler, ils sont refusés pendant une transaction."""
+        if self._in_transaction:
+            raise ValueError("the schema can not be changed during a transaction")
+        self.sync()
+
+
+    def _file_journal(self) -> Journal | None:
+        """Renvoie le journal à attacher aux fichiers ouverts, None si les écritures sont faites en place."""
+        return None if self.journal_mode is JournalMode.OFF and not self._in_transaction else self._journal
+
+
+    @contextmanager
+    def _locked(self, table_name: str, exclusive: bool = False) -> Iterator[TableLock]:
+        """Verrouille la table table_name pendant le bloc, en exclusivité si exclusive est vrai (cf. lock.TableLock).
+           Quand ses écritures passent par le journal, un verrou exclusif n'est rendu qu'une fois l'opération appliquée
+           aux fichiers (cf. _group_commit): jusque-là, les autres Database ne verraient pas la table à jour."""
+        lock = self._locks.get(table_name)
+        if lock is None:
+            lock = self._locks[table_name] = TableLock(f"{self.name}/{table_name}.lock", table_name)
+        RECOVER = not lock.count
+        lock.acquire(exclusive, self.LOCK_TIMEOUT)
+        try:
+            if RECOVER and (self._journal.orphaned() or os.path.exists(self._vacuum_path(table_name))):
+                self._recover_table(table_name, exclusive)
+            yield lock
+        finally:
+            if exclusive and self._file_journal() is not None and (self._journal.depth or self._journal.pages)\
+               and table_name not in self._held:
+                self._held.add(table_name)
+            else:
+                self._release(table_name)
+
+
+    def _release(self, table_name: str) -> None:
+        """Rend le dernier verrou pris sur la table table_name. Si sa génération change, le header en cache reste valide:
+           il contient les écritures de cette Database."""
+        lock = self._locks[table_name]
+        GENERATION = lock.generation
+        lock.release()
+        header = self._headers.get(table_name)
+        if header is not None and header.stamp == GENERATION:
+            header.stamp = lock.generation
+
+
+    def _recover(self) -> None:
+        """Rejoue le journal laissé par une Database arrêtée au milieu d'écritures (cf. Journal.replay). Les tables
+           modifiées changent de génération: leurs headers en cache, ici et dans les autres Database, sont relus.
+           Une table que cette Database lit encore ne peut pas être verrouillée en exclusivité: seul son header en cache
+           est périmé."""
+        for table_name in {file_name.split('.')[0] for file_name in self._journal.replay()}:
+            lock, header = self._locks.get(table_name), self._headers.get(table_name)
+            if lock is not None and lock.count and not lock.exclusive:
+                if header is not None:
+                    header.stamp = None
+                continue
+            self._close_handle(table_name)
+            with self._locked(table_name, exclusive = True):
+                pass
+
+
+    def _recover_table(self, table_name: str, exclusive: bool) -> None:
+        """Termine, avant la lecture de la table table_name qui vient d'être verrouillée, les écritures qu'une Database
+           arrêtée a laissées: le journal (cf. _recover) et vacuum (cf. _finish_vacuum). Elles demandent un verrou exclusif:
+           un verrou partagé est rendu puis repris après, sans conversion, puisque rien n'a encore été lu."""
+        lock = self._locks[table_name]
+        if not exclusive:
+            lock.release()
+            lock.acquire(True, self.LOCK_TIMEOUT)
+        try:
+            self._recover()
+            if os.path.exists(self._vacuum_path(table_name)):
+                self._finish_vacuum(table_name)
+        finally:
+            if not exclusive:
+                self._release(table_name)
+                lock.acquire(False, self.LOCK_TIMEOUT)
+
+
+    def _close_handles(self) -> None:
+        """Ferme les fichiers de toutes les tables et oublie leurs headers."""
+        while self._handles:
+            self._close_handle(next(iter(self._handles)))
+        self._headers.clear()
+
+
+    def _close_handle(self, table_name: str) -> None:
+        """Ferme le fichier de la table table_name s'il est ouvert, ainsi que son verrou s'il n'est pas pris."""
+        table_file, header = self._handles.pop(table_name, None), self._headers.get(table_name)
+        lock = self._locks.get(table_name)
+        if lock is not None and not lock.count:
+            self._locks.pop(table_name).close()
+        if header is not None:
+            self._close_sidecars(header)
+        if table_file is not None:
+            table_file.unmap()
+            table_file.file.close()
+
+
+    def _close_sidecars(self, header: TableHeader) -> None:
+        """Ferme les fichiers annexes gardés ouverts par header (index, colonnes, résumés des zones et heap des chaînes)."""
+        if header.id_map is not None:
+            header.id_map.close()
+        for sidecar in list(header.indexes.values()) + list(header.columns.values()):
+            sidecar.close()
+        for sidecar in (header.deleted, header.zones):
+            if sidecar is not None:
+                sidecar.close()
+        if header.format is not TableFormat.ULDB and isinstance(header.strings, MappedBinaryFile):
+            header.strings.unmap()
+            header.strings.file.close()
+            header.strings = None
+
+
+    def _index_path(self, table_name: str, field_name: str, index_type: IndexType) -> str:
+        """Renvoie le chemin du fichier de l'index de type index_type du champ field_name de la table table_name."""
+        return f"{self.name}/{table_name}.{field_name}.{INDEX_EXTENSIONS[index_type]}"
+
+
+    def _index_type(self, index: HashIndex | BTreeIndex) -> IndexType:
+        """Renvoie le type de l'index index."""
+        return IndexType.BTREE if isinstance(index, BTreeIndex) else IndexType.HASH
+
+
+    def _id_map_path(self, table_name: str) -> str:
+        """Renvoie le chemin du fichier de l'index des id de la table table_name."""
+        return f"{self.name}/{table_name}.ids"
+
+
+    def _heap_path(self, table_name: str) -> str:
+        """Renvoie le chemin du fichier contenant les chaînes de la table table_name (formats HEAP et COLUMNAR)."""
+        return f"{self.name}/{table_name}.strings"
+
+
+    def _column_path(self, table_name: str, field_name: str) -> str:
+        """Renvoie le chemin du fichier de la colonne du champ field_name de la table table_name (format COLUMNAR)."""
+        return f"{self.name}/{table_name}.{field_name}.col"
+
+
+    def _deleted_path(self, table_name: str) -> str:
+        """Renvoie le chemin du bitmap des entrées supprimées de la table table_name (format COLUMNAR)."""
+        return f"{self.name}/{table_name}.deleted"
+
+
+    def _vacuum_path(self, table_name: str) -> str:
+        """Renvoie le chemin du marqueur qui valide le remplacement des fichiers de la table table_name par vacuum."""
+        return f"{self.name}/{table_name}.vacuum"
+
+
+    def _zones_path(self, table_name: str) -> str:
+        """Renvoie le chemin du fichier des résumés des zones de la table table_name (cf. zone)."""
+        return f"{self.name}/{table_name}.zones"
+
+
+    def _sidecar_paths(self, table_name: str) -> list[str]:
+        """Renvoie les chemins des fichiers annexes (hors index secondaires) que la table table_name peut avoir."""
+        with open(f"{self.name}/{table_name}.table", "rb") as tb:
+            header = TableHeader(BinaryFile(tb)) if os.fstat(tb.fileno()).st_size else None
+        columns = [self._column_path(table_name, field_name) for field_name, _ in header.signature] if header else []
+        return [self._id_map_path(table_name), self._heap_path(table_name), self._deleted_path(table_name),\
+                self._zones_path(table_name)] + columns
+
+
+    def _indexed_fields(self, table_name: str) -> dict[str, IndexType]:
+        """Renvoie les champs de la table table_name qui ont un fichier d'index, avec le type de cet index."""
+        indexed_fields = {}
+        for file_name in os.listdir(self.name):
+            for index_type, extension in INDEX_EXTENSIONS.items():
+                if file_name.startswith(f"{table_name}.") and file_name.endswith(f".{extension}"):
+                    indexed_fields[file_name[len(table_name) + 1:-len(extension) - 1]] = index_type
+        return indexed_fields
+
+
+    def _build_index(self, table_name: str, table_file: BinaryFile, header: TableHeader, field_name: str,\
+                     index_type: IndexType) -> None:
+        """(Re)crée le fichier de l'index de type index_type du champ field_name à partir de toutes les entrées de la table."""
+        rows = list(self._rows(table_file, header))
+        values = self._select(table_file, header, [row for _, row in rows], (field_name,))
+        if field_name in header.indexes:
+            header.indexes[field_name].close()
+        index_class = HashIndex if index_type is IndexType.HASH else BTreeIndex
+        header.indexes[field_name] = index_class.create(self._index_path(table_name, field_name, index_type),\
+                                                        header.types[field_name] is FieldType.STRING,\
+                                                        [(value, offset - header.entry_buffer) for (offset, _), value in zip(rows, values)],\
+                                                        self._file_journal())
+
+
+    def _save_header(self, table_name: str, table_file: BinaryFile, header: TableHeader) -> None:
+        """Écrit header dans la table et les enregistrements en attente de ses index."""
+        header.save(table_file)
+        for index in header.indexes.values():
+            index.flush()
+
+
+    def _check_value(self, header: TableHeader, field_name: str, field_value: Field) -> None:
+        """Lance une ValueError si field_name n'est pas un champ de la table ou si field_value n'est pas du bon type."""
+        if field_name not in header.types:
+            raise ValueError(f"{field_name} is not a field of this table")
+        expected_type = int if header.types[field_name] is FieldType.INTEGER else str
+        if not isinstance(field_value, expected_type):
+            raise ValueError(f"{field_name} must be of type {header.types[field_name].name}")
+
+
+    def _check_entry(self, header: TableHeader, entry: Entry) -> list[Field]:
+        """Vérifie qu'entry respecte la signature de la table et renvoie ses valeurs dans l'ordre de la signature."""
+        if set(entry) != {field_name for field_name, _ in header.signature}:
+            raise ValueError("the fields of the entry do not match the signature of the table")
+        for field_name, field_value in entry.items():
+            self._check_value(header, field_name, field_value)
+        return [entry[field_name] for field_name, _ in header.signature]
+
+
+    def _reserve_string_space(self, table_file: BinaryFile, header: TableHeader, needed: int) -> int:
+        """S'assure qu'il reste needed bytes libres dans le string buffer, en doublant sa taille autant que nécessaire.
+           L'entry buffer est alors décalé d'autant: renvoie ce décalage (0 si le buffer n'a pas été agrandi).
+           Le heap d'une table au format HEAP ou COLUMNAR n'a pas de taille fixe: rien n'est jamais décalé."""
+        if header.format is not TableFormat.ULDB or header.entry_buffer - header.string_free >= needed:
+            return 0
+        size_of_string_buffer = header.entry_buffer - header.string_buffer
+        new_size = size_of_string_buffer
+        while new_size < header.string_free - header.string_buffer + needed:
+            new_size *= 2
+        delta = new_size - size_of_string_buffer
+        if self._stats is not None:
+            self._stats.string_buffer_resizes += 1
+
+        # Tout ce qui suit le string buffer est décalé de delta: les pointeurs de l'entry buffer aussi
+        remaining_content_of_file = bytearray(table_file.read_bytes_from(table_file.get_size() - header.entry_buffer,\
+                                                                         header.entry_buffer))
+        for pos in range(20 + header.entry_size - 8, len(remaining_content_of_file), header.entry_size):
+            for pointer_pos in (pos, pos + 4):
+                pointer = int.from_bytes(remaining_content_of_file[pointer_pos:pointer_pos + 4], 'little', signed = True)
+                if pointer != -1:
+                    remaining_content_of_file[pointer_pos:pointer_pos + 4] = (pointer + delta).to_bytes(4, 'little', signed = True)
+        table_file.write_bytes_to(bytes(delta) + remaining_content_of_file, header.entry_buffer)
+
+        header.entry_buffer += delta
+        header.first, header.last, header.first_deleted = (pointer + delta if pointer != -1 else -1\
+                                                           for pointer in (header.first, header.last, header.first_deleted))
+        return delta
+
+
+    def _write_strings(self, table_file: BinaryFile, header: TableHeader, strings: list[str]) -> list[int]:
+        """Écrit les chaînes strings dans les places libres du string buffer (ou du heap) puis, pour celles qui n'y tiennent
+           pas, en une fois à sa première place disponible, en l'agrandissant si nécessaire (cf. _reserve_string_space).
+           Renvoie la position de chacune d'entre elles."""
+        records = [STRING_LENGTH.pack(len(encoded_string)) + encoded_string for encoded_string in (s.encode() for s in strings)]
+        if header.free_strings is None and header.format is TableFormat.ULDB\
+           and header.entry_buffer - header.string_free < sum(map(len, records)):
+            self._free_strings(table_file, header) # Avant d'agrandir le string buffer, ses trous sont cherchés
+        positions = [self._take_string_space(header, len(record)) for record in records]
+        if header.fragmented and None in positions:
+            # Les places libres voisines ne sont réunies qu'en reconstruisant la liste, ce qui n'est fait que si elles
+            # suffiraient (en place totale) pour les chaînes restantes
+            FREE_SPACE = sum(size for blocks in header.free_strings.values() for _, size in blocks)
+            if FREE_SPACE >= sum(len(record) for record, position in zip(records, positions) if position is None):
+                header.free_strings = None
+                self._free_strings(table_file, header)
+                positions = [self._take_string_space(header, len(record)) for record in records]
+        appended = [record for record, position in zip(records, positions) if position is None]
+        self._reserve_string_space(table_file, header, sum(map(len, appended)))
+        pos = header.string_free
+        for i, record in enumerate(records):
+            if positions[i] is None:
+                positions[i], pos = pos, pos + len(record)
+            else:
+                header.strings.write_bytes_to(record, positions[i])
+        if appended:
+            header.strings.write_bytes_to(b''.join(appended), header.string_free)
+        header.string_free = pos
+        return positions
+
+
+    def _free_strings(self, table_file: BinaryFile, header: TableHeader) -> dict[int, list[tuple[int, int]]]:
+        """Renvoie les places libres du string buffer (ou du heap) par classe de taille. Si elles ne sont pas encore connues,
+           elles sont retrouvées en une fois: ce sont les trous entre les chaînes encore pointées par une entrée."""
+        if header.free_strings is None:
+            header.free_strings = {}
+            string_slots = [header.slots[name] for name, field_type in header.signature if field_type is FieldType.STRING]
+            pointers = sorted({row[slot] for _, row in self._rows(table_file, header) for slot in string_slots})
+            cursor = header.string_buffer
+            for pointer in pointers:
+                self._release_string_space(header, cursor, pointer - cursor)
+                cursor = max(cursor, pointer + 2 + header.strings.read_integer_from(2, pointer))
+            self._release_string_space(header, cursor, header.string_free - cursor)
+            header.fragmented = False
+        return header.free_strings
+
+
+    def _release_string_space(self, header: TableHeader, pos: int, size: int) -> None:
+        """Ajoute la place de size bytes à la position pos aux places libres, si elles sont connues.
+           Une place de moins de 2 bytes ne peut contenir aucune chaîne et est ignorée."""
+        if header.free_strings is not None and size >= 2:
+            header.free_strings.setdefault(size.bit_length(), []).append((pos, size))
+            header.fragmented = True
+
+
+    def _take_string_space(self, header: TableHeader, size: int) -> int | None:
+        """Retire des places libres une place d'au moins size bytes et renvoie sa position (None s'il n'y en a pas).
+           Seule la dernière place de la classe de size est essayée, les classes supérieures conviennent toujours:
+           le choix se fait donc en temps constant. Le reste de la place retourne dans les places libres."""
+        if not header.free_strings:
+            return None
+        blocks = header.free_strings.get(size.bit_length())
+        if not blocks or blocks[-1][1] < size:
+            blocks = next((header.free_strings[size_class] for size_class in range(size.bit_length() + 1, 33)\
+                           if header.free_strings.get(size_class)), None)
+            if blocks is None:
+                return None
+        pos, block_size = blocks.pop()
+        self._release_string_space(header, pos + size, block_size - size)
+        return pos
+
+
+    def _rows(self, table_file: BinaryFile, header: TableHeader) -> Iterator[tuple[int, tuple[int, ...]]]:
+        """Parcourt la liste chaînée des entrées et renvoie la position de chacune d'entre elles avec ses slots décodés
+           en une fois: (id, valeur ou pointeur de chaque champ, précédent, suivant)."""
+        offset, unpack_entry, stats = header.first, header.entry_struct.unpack_from, self._stats
+        mapped_file = table_file.mapped(table_file.get_size()) if isinstance(table_file, MappedBinaryFile) else None
+        while offset != -1:
+            row = unpack_entry(mapped_file, offset) if mapped_file is not None\
+                  else table_file.read_struct_from(header.entry_struct, offset)
+            if stats is not None:
+                stats.entries_visited += 1
+                stats.bytes_read += header.entry_size if mapped_file is not None else 0
+            yield offset, row
+            offset = row[-1]
+
+
+    def _find(self, table_file: BinaryFile, header: TableHeader, field_name: str, field_value: Field)\
+              -> Iterator[tuple[int, tuple[int, ...]]]:
+        """Renvoie la position et les slots de chaque entrée dont le champ field_name contient la valeur field_value."""
+        return self._match(table_file, header, Comparison(field_name, '=', field_value))
+
+
+    def _match(self, table_file: BinaryFile, header: TableHeader, predicate: Predicate) -> Iterator[tuple[int, tuple[int, ...]]]:
+        """Renvoie la position et les slots de chaque entrée qui satisfait le prédicat predicate, dans l'ordre des id.
+           Si les index donnent des entrées candidates, seules celles-ci sont lues, sinon la table est parcourue une fois,
+           sans les zones que leurs résumés écartent (cf. _zone_scan)."""
+        test, candidates = self._prepare(table_file, header, predicate)
+        if candidates is None and self._reads_columns(header):
+            yield from self._column_match(table_file, header, predicate)
+            return
+        if candidates is None:
+            for offset_row in self._zone_scan(table_file, header, predicate):
+                if test(offset_row[1]):
+                    yield offset_row
+            return
+        rows = self._candidate_rows(table_file, header, candidates)
+        rows.sort(key = lambda offset_row: offset_row[1][0])
+        yield from ((offset, row) for offset, row in rows if test(row))
+
+
+    def _ordered_match(self, table_file: BinaryFile, header: TableHeader, predicate: Predicate, order_by: str | None,\
+                       descending: bool, limit: int | None) -> Iterator[tuple[int, tuple[int, ...]]]:
+        """Comme _match, mais dans l'ordre du champ order_by (s'il est donné) et en s'arrêtant après limit entrées.
+           Sans candidats, un index trié sur order_by est parcouru dans l'ordre, sinon les entrées sont triées
+           (seules les limit premières sont gardées en mémoire)."""
+        if limit is not None and limit < 0:
+            raise ValueError("the limit must be a positive integer")
+        if order_by is None:
+            return islice(self._match(table_file, header, predicate), limit)
+        self._check_fields(header, (order_by,))
+        test, candidates = self._prepare(table_file, header, predicate)
+        index, SLOT = header.indexes.get(order_by), header.slots[order_by]
+        if candidates is None and isinstance(index, BTreeIndex):
+            rows = self._index_order(table_file, header, index, order_by, descending)
+            return islice((offset_row for offset_row in rows if test(offset_row[1])), limit)
+        if candidates is not None:
+            rows = self._candidate_rows(table_file, header, candidates)
+        elif self._reads_columns(header):
+            rows = self._column_match(table_file, header, predicate)
+        else:
+            rows = self._zone_scan(table_file, header, predicate)
+        matching = (offset_row for offset_row in rows if test(offset_row[1]))
+        if header.types[order_by] is FieldType.STRING:
+            read_string = self._string_reader(header)
+            key = lambda offset_row: read_string(offset_row[1][SLOT])
+        else:
+            key = lambda offset_row: offset_row[1][SLOT]
+        if limit is None:
+            return iter(sorted(matching, key = key, reverse = descending))
+        return iter((heapq.nlargest if descending else heapq.nsmallest)(limit, matching, key = key))
+
+
+    def _index_order(self, table_file: BinaryFile, header: TableHeader, index: BTreeIndex, order_by: str, descending: bool)\
+                     -> Iterator[tuple[int, tuple[int, ...]]]:
+        """Renvoie la position et les slots de toutes les entrées dans l'ordre de l'index trié index du champ order_by.
+           Les chaînes tronquées dans l'index (cf. BTreeIndex.MAX_KEY) qui ont la même clé sont triées entre elles."""
+        read_string, SLOT, run, run_key = self._string_reader(header), header.slots[order_by], [], None
+        for key, position in index.items(descending):
+            if run and key != run_key:
+                yield from sorted(run, key = lambda offset_row: read_string(offset_row[1][SLOT]), reverse = descending)
+                run.clear()
+            offset = header.entry_buffer + position
+            offset_row = (offset, table_file.read_struct_from(header.entry_struct, offset))
+            if self._stats is not None:
+                self._stats.entries_visited += 1
+            if isinstance(key, bytes) and len(key) == index.MAX_KEY:
+                run.append(offset_row)
+                run_key = key
+            else:
+                yield offset_row
+        yield from sorted(run, key = lambda offset_row: read_string(offset_row[1][SLOT]), reverse = descending)
+
+
+    def _join_rows(self, left: tuple[BinaryFile, TableHeader, str], right: tuple[BinaryFile, TableHeader, str])\
+                   -> Iterator[tuple[tuple[int, ...], tuple[int, ...]]]:
+        """Renvoie les paires de slots (gauche, droite) des entrées de la jointure de left et right, des triplets
+           (fichier, header, champ de jointure), dans l'ordre de la table parcourue (cf. join)."""
+        small, large = (left, right) if left[1].size <= right[1].size else (right, left)
+        # Avec un index sur le champ de jointure, de préférence celui de la plus grande table, l'autre est parcourue
+        indexed = large if self._can_lookup(large[1], large[2], '=') else small if self._can_lookup(small[1], small[2], '=') else None
+        scanned = small if indexed is large else large
+        scanned_file, scanned_header, scanned_field = scanned
+        pair = (lambda scanned_row, other_row: (scanned_row, other_row)) if scanned is left\
+               else (lambda scanned_row, other_row: (other_row, scanned_row))
+        scanned_key = self._raw_value(scanned_header, scanned_field)
+        if indexed is not None:
+            indexed_file, indexed_header, indexed_field = indexed
+            indexed_key = self._raw_value(indexed_header, indexed_field)
+            STRING = scanned_header.types[scanned_field] is FieldType.STRING
+            for _, row in self._rows(scanned_file, scanned_header):
+                key = scanned_key(row)
+                positions = self._lookup(indexed_file, indexed_header, indexed_field, '=', key.decode() if STRING else key)
+                candidates = sorted(self._candidate_rows(indexed_file, indexed_header, positions), key = lambda offset_row: offset_row[1][0])
+                for _, other_row in candidates:
+                    # Un index trié peut donner des candidats en trop (chaînes tronquées)
+                    if indexed_key(other_row) == key:
+                        yield pair(row, other_row)
+            return
+        build_file, build_header, build_field = small
+        build_key, table = self._raw_value(build_header, build_field), {}
+        for _, row in self._rows(build_file, build_header):
+            table.setdefault(build_key(row), []).append(row)
+        for _, row in self._rows(scanned_file, scanned_header):
+            for other_row in table.get(scanned_key(row), ()):
+                yield pair(row, other_row)
+
+
+    def _raw_value(self, header: TableHeader, field_name: str, row_slots: dict[str, int] | None = None)\
+                   -> Callable[[tuple[int, ...]], int | bytes]:
+        """Renvoie la fonction qui donne la valeur du champ field_name à partir des slots d'une entrée (ou des valeurs
+           lues dans les colonnes, placées selon row_slots s'il est donné), sans décoder les chaînes (qui se comparent encodées)."""
+        SLOT = (row_slots or header.slots)[field_name]
+        if header.types[field_name] is FieldType.STRING:
+            read_string = self._string_reader(header)
+            return lambda row: read_string(row[SLOT])
+        return itemgetter(SLOT)
+
+
+    def _prepare(self, table_file: BinaryFile, header: TableHeader, predicate: Predicate) -> tuple[Callable, set[int] | None]:
+        """Vérifie le prédicat predicate et renvoie sa fonction de test ainsi que les positions des entrées candidates
+           (None s'il faut parcourir toute la table)."""
+        types = self._python_types(header)
+        predicate.check(types)
+        test = predicate.compile(header.slots, types, self._string_reader(header))
+        candidates = predicate.candidates(lambda field_name, operator, value:\
+                                          self._lookup(table_file, header, field_name, operator, value))
+        return test, candidates
+
+
+    def _candidate_rows(self, table_file: BinaryFile, header: TableHeader, candidates: set[int]) -> list[tuple[int, tuple[int, ...]]]:
+        """Renvoie la position et les slots des entrées aux positions candidates (relatives à l'entry buffer)."""
+        if self._stats is not None:
+            self._stats.entries_visited += len(candidates)
+        return [(header.entry_buffer + position, table_file.read_struct_from(header.entry_struct, header.entry_buffer + position))\
+                for position in candidates]
+
+
+    def _column_rows(self, header: TableHeader, fields: tuple[str, ...], predicate: Predicate | None = None,\
+                     positions: bool = False) -> Iterator[tuple[int, ...]]:
+        """Table COLUMNAR: renvoie (id, valeur ou pointeur de chaque champ de fields) pour chaque entrée qui satisfait
+           predicate (toutes s'il est None), dans l'ordre des id, suivi de la position de l'entrée (relative à l'entry
+           buffer) si positions est vrai. Seules les colonnes de fields et des champs de predicate sont lues (ainsi que
+           l'index des id pour les positions), par paquets de COLUMN_CHUNK id, sans les zones que leurs résumés écartent."""
+        others = tuple(sorted(predicate.fields() - set(fields) - {'id'})) if predicate is not None else ()
+        read_columns = [(lambda first_id, count: range(first_id, first_id + count)) if field_name == 'id'\
+                        else header.columns[field_name].read for field_name in fields + others]
+        read_columns += [header.id_map.read] if positions else []
+        test = None
+        if predicate is not None:
+            types = self._python_types(header)
+            predicate.check(types)
+            test = predicate.compile(self._column_slots(fields + others), types, self._string_reader(header))
+        WIDTH, stats = 1 + len(fields), self._stats
+        id_ranges = self._zone_ranges(header, predicate) if predicate is not None else None
+        if id_ranges is None: # Aucune zone n'est écartée (une liste vide les écarte toutes)
+            id_ranges = [(1, header.last_id)]
+        chunks = ((first_id, min(self.COLUMN_CHUNK, range_first + range_count - first_id)) for range_first, range_count in id_ranges\
+                  for first_id in range(range_first, range_first + range_count, self.COLUMN_CHUNK))
+        for first_id, COUNT in chunks:
+            deleted = header.deleted.read(first_id, COUNT)
+            chunk = zip(range(first_id, first_id + COUNT), *(read_column(first_id, COUNT) for read_column in read_columns))
+            if stats is not None:
+                stats.entries_visited += COUNT
+            if any(deleted):
+                chunk = (row for row in chunk if not deleted[(row[0] - first_id) >> 3] >> ((row[0] - first_id) & 7) & 1)
+            if test is not None:
+                chunk = filter(test, chunk)
+            if positions:
+                yield from (row[:WIDTH] + row[-1:] for row in chunk)
+            else:
+                yield from (row[:WIDTH] for row in chunk) if others else chunk
+
+
+    def _column_match(self, table_file: BinaryFile, header: TableHeader, predicate: Predicate)\
+                      -> Iterator[tuple[int, tuple[int, ...]]]:
+        """Table COLUMNAR: comme _match sans index, mais le prédicat est testé sur les colonnes de ses champs:
+           seules les entrées qui le satisfont sont lues dans la table."""
+        rows = self._column_rows(header, (), predicate, positions = True)
+        while chunk := list(islice(rows, self.SCAN_CHUNK)):
+            yield from self._candidate_rows(table_file, header, [position for _, position in chunk])
+
+
+    def _zone_scan(self, table_file: BinaryFile, header: TableHeader, predicate: Predicate)\
+                   -> Iterator[tuple[int, tuple[int, ...]]]:
+        """Renvoie la position et les slots des entrées à parcourir pour trouver celles qui satisfont predicate sans index,
+           dans l'ordre des id: celles des zones que leurs résumés n'écartent pas, lues à partir de l'index des id, si elles
+           ont au plus ZONE_SCAN_RATIO des id, sinon toutes, en suivant la liste des entrées."""
+        id_ranges = self._zone_ranges(header, predicate)
+        if id_ranges is None or header.id_map is None or sum(count for _, count in id_ranges) > self.ZONE_SCAN_RATIO*header.last_id:
+            yield from self._rows(table_file, header)
+            return
+        for range_first, range_count in id_ranges:
+            for first_id in range(range_first, range_first + range_count, ZONE_SIZE):
+                positions = header.id_map.read(first_id, min(ZONE_SIZE, range_first + range_count - first_id))
+                yield from self._candidate_rows(table_file, header, [position for position in positions if position != -1])
+
+
+    def _zone_ranges(self, header: TableHeader, predicate: Predicate) -> list[tuple[int, int]] | None:
+        """Renvoie les intervalles (premier id, nombre d'id) des zones qui peuvent contenir des entrées qui satisfont
+           predicate d'après leurs résumés (cf. zone), dans l'ordre des id, None si aucune zone n'est écartée."""
+        if header.zones is None:
+            return None
+        zones, ZONES = predicate.candidates(header.zones.candidates), zone_count(header.last_id)
+        if zones is None:
+            return None
+        zones = sorted(zone for zone in zones if zone < ZONES) # Le fichier peut résumer des id annulés après last_id
+        if len(zones) == ZONES:
+            return None
+        id_ranges: list[tuple[int, int]] = []
+        for zone in zones:
+            first_id = zone*ZONE_SIZE + 1
+            count = min(ZONE_SIZE, header.last_id + 1 - first_id)
+            if id_ranges and sum(id_ranges[-1]) == first_id:
+                id_ranges[-1] = (id_ranges[-1][0], id_ranges[-1][1] + count)
+            else:
+                id_ranges.append((first_id, count))
+        return id_ranges
+
+
+    def _column_slots(self, fields: tuple[str, ...]) -> dict[str, int]:
+        """Renvoie la place de chaque champ dans les valeurs (id, champs de fields...) lues dans les colonnes."""
+        return {'id': 0} | {field_name: i + 1 for i, field_name in enumerate(fields)}
+
+
+    def _scans_columns(self, header: TableHeader, predicate: Predicate) -> bool:
+        """Renvoie True si les entrées qui satisfont predicate sont cherchées dans les colonnes de la table:
+           elles peuvent y être lues (cf. _reads_columns) et aucun index ne donne de candidates."""
+        return self._reads_columns(header) and self._needs_scan(header, predicate)
+
+
+    def _reads_columns(self, header: TableHeader) -> bool:
+        """Renvoie True si les entrées de la table peuvent être lues dans ses colonnes: elle est au format COLUMNAR et
+           ses colonnes, comme l'index des id, sont ouvertes (cf. _open_summaries)."""
+        return header.deleted is not None and header.id_map is not None
+
+
+    def _needs_scan(self, header: TableHeader, predicate: Predicate) -> bool:
+        """Renvoie True s'il faut parcourir toute la table pour trouver les entrées qui satisfont predicate, sans
+           interroger les index."""
+        servable = lambda field_name, operator, value: set() if self._can_lookup(header, field_name, operator) else None
+        return predicate.candidates(servable) is None
+
+
+    def _can_lookup(self, header: TableHeader, field_name: str, operator: str) -> bool:
+        """Renvoie True si un index donne les entrées telles que field_name operator value."""
+        if operator == '=':
+            return field_name == 'id' and header.id_map is not None or field_name in header.indexes
+        return operator in RANGE_OPERATORS and isinstance(header.indexes.get(field_name), BTreeIndex)
+
+
+    def _lookup(self, table_file: BinaryFile, header: TableHeader, field_name: str, operator: str, value: Field) -> set[int] | None:
+        """Renvoie les positions (relatives à l'entry buffer) des entrées telles que field_name operator value d'après
+           l'index des id ou l'index du champ, None si aucun index ne peut répondre.
+           value est un couple (minimum, maximum) pour l'opérateur between. Un intervalle qui contient plus de
+           INDEX_RANGE_RATIO des entrées n'est pas lu dans l'index: toute la table est parcourue."""
+        if not self._can_lookup(header, field_name, operator):
+            return None
+        if field_name != 'id' and operator == '=':
+            return set(header.indexes[field_name].lookup(value))
+        if field_name != 'id':
+            index = header.indexes[field_name]
+            if operator == '^=':
+                keys = index.prefix(value)
+            else:
+                keys = index.range(*{'<': (None, value, True, False), '<=': (None, value), '>': (value, None, False),\
+                                     '>=': (value, None), 'between': value}[operator])
+            MAX_POSITIONS, positions = int(self.INDEX_RANGE_RATIO*header.size), set()
+            for _, position in keys:
+                positions.add(position)
+                if len(positions) > MAX_POSITIONS:
+                    return None
+            return positions
+        position = header.id_map.lookup(value)
+        if position is None:
+            return set()
+        if header.entry_buffer + position + header.entry_size <= table_file.get_size()\
+           and table_file.read_integer_from(4, header.entry_buffer + position) == value:
+            return {position}
+        # L'index des id est périmé (table modifiée sans lui): il est reconstruit par une écriture, une lecture parcourt la table
+        if not self._locks[header.table_name].exclusive:
+            return None
+        self._rebuild_id_map(header.table_name, table_file, header)
+        position = header.id_map.lookup(value)
+        return set() if position is None else {position}
+
+
+    def _rebuild_id_map(self, table_name: str, table_file: BinaryFile, header: TableHeader) -> None:
+        """Reconstruit l'index des id de la table table_name à partir de ses entrées. C'est une écriture, une opération
+           du journal: la table doit être verrouillée en exclusivité depuis la lecture de header (cf. _open_summaries)."""
+        with self._operation():
+            header.id_map.rebuild(((row[0], offset - header.entry_buffer) for offset, row in self._rows(table_file, header)),\
+                                  header.last_id)
+
+
+
+    def _rebuild_zones(self, table_name: str, table_file: BinaryFile, header: TableHeader) -> None:
+        """Reconstruit les résumés des zones de la table table_name à partir de ses entrées (cf. _rebuild_id_map)."""
+        with self._operation():
+            read_string, STRINGS = self._string_reader(header), [field_type is FieldType.STRING for _, field_type in header.signature]
+            header.zones.rebuild(((row[0], [read_string(slot) if STRING else slot for STRING, slot in zip(STRINGS, row[1:])])\
+                                  for _, row in self._rows(table_file, header)), header.last_id)
+
+
+    def _rebuild_columns(self, table_name: str, table_file: BinaryFile, header: TableHeader) -> None:
+        """Reconstruit les colonnes et le bitmap des entrées supprimées de la table table_name (format COLUMNAR)
+           à partir de ses entrées, un parcours par fichier (cf. _rebuild_id_map)."""
+        with self._operation():
+            for field_name, column in header.columns.items():
+                SLOT = header.slots[field_name]
+                column.rebuild(((row[0], row[SLOT]) for _, row in self._rows(table_file, header)), header.last_id)
+            header.deleted.rebuild((row[0] for _, row in self._rows(table_file, header)), header.last_id)
+
+
+    def _python_types(self, header: TableHeader) -> dict[str, type]:
+        """Renvoie le type Python (int ou str) de chaque champ de la table, id compris."""
+        return {field_name: int if field_type is FieldType.INTEGER else str for field_name, field_type in header.types.items()}
+
+
+    def _string_reader(self, header: TableHeader) -> Callable[[int], bytes]:
+        """Renvoie la fonction qui lit (sans la décoder) la chaîne pointée par un slot, directement dans la projection
+           du string buffer (ou du heap) quand elle existe."""
+        # Projection de tout le fichier: un parcours qui la demande ensuite (cf. _rows) ne la refait donc pas
+        mapped_file = header.strings.mapped(header.strings.get_size()) if isinstance(header.strings, MappedBinaryFile) else None
+        if mapped_file is None:
+            return lambda pointer: header.strings.read_bytes_from(header.strings.read_integer_from(2, pointer), pointer + 2)
+        unpack_length = STRING_LENGTH.unpack_from
+        return lambda pointer: mapped_file[pointer + 2:pointer + 2 + unpack_length(mapped_file, pointer)[0]]
+
+
+    def _strings(self, table_file: BinaryFile, header: TableHeader, pointers: set[int]) -> dict[int, str]:
+        """Renvoie les chaînes pointées par pointers. Quand il y en a beaucoup, la partie du string buffer (de la première
+           à la dernière) qui les contient est lue en une fois et elles y sont toutes décodées en un seul passage."""
+        if len(pointers) < self.BULK_STRINGS or min(pointers) < header.string_buffer or max(pointers) >= header.string_free:
+            return {pointer: header.strings.read_string_from(pointer) for pointer in pointers}
+        START, LAST = min(pointers), max(pointers)
+        string_buffer, strings = header.strings.read_bytes_from(LAST + 2 - START, START), {}
+        string_buffer += header.strings.read_bytes_from(STRING_LENGTH.unpack_from(string_buffer, LAST - START)[0], LAST + 2)
+        unpack_length = STRING_LENGTH.unpack_from
+        for pointer in pointers:
+            pos = pointer - START + 2
+            strings[pointer] = string_buffer[pos:pos + unpack_length(string_buffer, pos - 2)[0]].decode()
+        return strings
+
+
+    def _check_fields(self, header: TableHeader, fields: tuple[str]) -> None:
+        """Lance une ValueError si un des champs fields n'est pas un champ de la table."""
+        for field_name in fields:
+            if field_name not in header.slots:
+                raise ValueError(f"{field_name} is not a field of this table")
+
+
+    def _select(self, table_file: BinaryFile, header: TableHeader, rows: list[tuple[int, ...]], fields: tuple[str],\
+                row_slots: dict[str, int] | None = None) -> list[Field | tuple[Field]]:
+        """Renvoie les champs fields de chacune des entrées rows (la valeur seule s'il n'y a qu'un champ). Les rows sont
+           les slots des entrées, ou les valeurs lues dans les colonnes si row_slots donne leurs places (cf. _column_slots)."""
+        self._check_fields(header, fields)
+        stats = self._stats
+        start = perf_counter() if stats is not None else 0.0
+        slots = [(row_slots or header.slots)[field_name] for field_name in fields]
+        string_slots = [i for i, field_name in enumerate(fields) if header.types[field_name] is FieldType.STRING]
+        strings = self._strings(table_file, header, {row[slots[i]] for row in rows for i in string_slots})
+        if len(fields) == 1:
+            selection = [strings[row[slots[0]]] for row in rows] if string_slots else [row[slots[0]] for row in rows]
+        else:
+            project, selection = itemgetter(*slots), []
+            for row in rows:
+                values = list(project(row))
+                for i in string_slots:
+                    values[i] = strings[values[i]]
+                selection.append(tuple(values))
+        if stats is not None:
+            stats.decode_seconds += perf_counter() - start
+        return selection
+
+
+    def _entries(self, table_file: BinaryFile, header: TableHeader, rows: list[tuple[int, ...]]) -> list[Entry]:
+        """Renvoie les entrées (id compris) correspondant à rows."""
+        fields = tuple(field_name for field_name, _ in header.signature) + ('id',)
+        return [dict(zip(fields, values)) for values in self._select(table_file, header, rows, fields)]
+
+
+    def _iter_chunks(self, table_names: tuple[str, ...], scan: Callable[[list[tuple[BinaryFile, TableHeader]], int],\
+                     tuple[Iterator, Callable[[list], list]]], resumable: bool, limit: int | None = None) -> Iterator:
+        """Renvoie une à une les valeurs d'un parcours des tables table_names, au plus limit si limit est donné.
+           scan(tables, after), tables étant le BinaryFile et le header de chaque table, renvoie les entrées (position,
+           slots) du parcours qui suivent l'id after (0 au début) et la fonction qui décode une liste de ces entrées.
+           Les tables ne sont verrouillées en partage que pendant la lecture et le décodage d'un paquet de SCAN_CHUNK
+           entrées: entre deux paquets, même si le parcours est abandonné, les autres Database peuvent y écrire et cette
+           Database aussi, sans conversion de son verrou. Si une table a changé depuis le paquet précédent (sa génération
+           ou son header en cache), le parcours reprend avec scan après l'id de la dernière entrée renvoyée s'il est
+           resumable (dans l'ordre des id), sinon ValueError est lancée."""
+        if limit is not None and limit < 0:
+            raise ValueError("the limit must be a positive integer")
+        rows, after, state, remaining = None, 0, None, limit
+        while remaining is None or remaining > 0:
+            with ExitStack() as stack:
+                tables = [stack.enter_context(self._open_table(table_name)) for table_name in table_names]
+                current = [(table_file, header, self._locks[table_name].generation)\
+                           for (table_file, header), table_name in zip(tables, table_names)]
+                if rows is None or any(old[0] is not new[0] or old[1] is not new[1] or old[2] != new[2]\
+                                       for old, new in zip(state, current)):
+                    if rows is not None and not resumable:
+                        raise ValueError(f"{' or '.join(table_names)} was modified during an iteration that can not resume")
+                    rows, decode = scan(tables, after)
+                state = current
+                chunk = list(islice(rows, self.SCAN_CHUNK if remaining is None else min(self.SCAN_CHUNK, remaining)))
+                values = decode(chunk)
+            if not chunk:
+                return
+            yield from values
+            after = chunk[-1][1][0]
+            if remaining is not None:
+                remaining -= len(chunk)
+
+
+    def _after(self, predicate: Predicate, after: int) -> Predicate:
+        """Renvoie le prédicat des entrées qui satisfont predicate et dont l'id suit after (cf. _iter_chunks)."""
+        return predicate & Comparison('id', '>', after) if after else predicate
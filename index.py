@@ -0,0 +1,227 @@
+"""Index secondaires des tables ULDB.
+
+L'index du champ <champ> de la table <table> est stocké à côté de celle-ci dans le fichier <db>/<table>.<champ>.idx,
+l'index des id dans le fichier <db>/<table>.ids
+"""
+from binary import BinaryFile
+from typing import Iterable, TYPE_CHECKING
+import os
+import struct
+
+if TYPE_CHECKING:
+    from wal import Journal
+
+INDEX_MAGIC = b'ULDX'
+RECORD = struct.Struct('<bi') # +1 (ajout) ou -1 (retrait), position de l'entrée relative au début de l'entry buffer
+INTEGER_KEY, STRING_LENGTH = struct.Struct('<i'), struct.Struct('<h')
+POSITION = struct.Struct('<i')
+MISSING = POSITION.pack(-1) # Position d'un id supprimé dans l'index des id
+
+
+class HashIndex:
+    """Index d'égalité d'un champ: associe à chaque valeur les positions des entrées qui la contiennent.
+       Les positions sont relatives au début de l'entry buffer, elles ne changent donc pas quand le string buffer grandit.
+       Le fichier est un journal d'ajouts et de retraits: il est rejoué au premier accès puis gardé en mémoire."""
+    COMPACT_AFTER = 1024 # Nombre de retraits tolérés dans le journal avant de le réécrire
+
+    def __init__(self, path: str, string_keys: bool, journal: 'Journal | None' = None):
+        """Constructeur de HashIndex, le fichier path n'est ouvert qu'au premier besoin.
+           Si journal est donné, les écritures dans le fichier passent par ce journal (cf. wal)."""
+        self.path, self.string_keys, self.journal = path, string_keys, journal
+        self.positions: dict[int | str, set[int]] | None = None
+        self.pending: list[bytes] = [] # Enregistrements pas encore écrits dans le fichier
+        self.removals = 0
+        self.index_file: BinaryFile | None = None
+
+
+    @classmethod
+    def create(cls, path: str, string_keys: bool, items: list[tuple[int | str, int]], journal: 'Journal | None' = None)\
+               -> 'HashIndex':
+        """Crée le fichier d'index path contenant les paires (valeur, position) items et renvoie l'index.
+           Le fichier est écrit directement, sans passer par le journal."""
+        index = cls(path, string_keys, journal)
+        index.positions = {}
+        for value, position in items:
+            index.add(value, position)
+        with open(path, 'wb') as index_file:
+            index_file.write(index._content())
+        index.pending.clear()
+        return index
+
+
+    def lookup(self, value: int | str) -> set[int]:
+        """Renvoie les positions des entrées dont le champ indexé vaut value."""
+        return self.load().get(value, set())
+
+
+    def add(self, value: int | str, position: int) -> None:
+        """Ajoute l'entrée à la position position pour la valeur value."""
+        if self.positions is not None:
+            self.positions.setdefault(value, set()).add(position)
+        self.pending.append(self._record(1, value, position))
+
+
+    def remove(self, value: int | str, position: int) -> None:
+        """Retire l'entrée à la position position pour la valeur value."""
+        if self.positions is not None:
+            positions = self.positions.get(value, set())
+            positions.discard(position)
+            if not positions:
+                self.positions.pop(value, None)
+        self.pending.append(self._record(-1, value, position))
+        self.removals += 1
+
+
+    def flush(self) -> None:
+        """Écrit les enregistrements en attente à la fin du fichier, en une fois.
+           Le journal est réécrit s'il contient trop de retraits."""
+        if self.removals > self.COMPACT_AFTER and self.positions is not None:
+            self.rewrite()
+        elif self.pending:
+            index_file = self._file()
+            index_file.write_bytes_to(b''.join(self.pending), index_file.get_size())
+            self.pending.clear()
+
+
+    def close(self) -> None:
+        """Ferme le fichier s'il est ouvert."""
+        if self.index_file is not None:
+            self.index_file.file.close()
+            self.index_file = None
+
+
+    def rewrite(self) -> None:
+        """Réécrit tout le fichier d'index à partir du contenu en mémoire, sans les retraits."""
+        content = self._content()
+        self._file().write_bytes_to(content, 0)
+        self._file().truncate(len(content))
+        self.pending.clear()
+        self.removals = 0
+
+
+    def load(self) -> dict[int | str, set[int]]:
+        """Rejoue le fichier d'index si ce n'est pas encore fait et renvoie le contenu de l'index."""
+        if self.positions is not None:
+            return self.positions
+        index_file = self._file()
+        content = index_file.read_bytes_from(index_file.get_size(), 0)
+        if content[:4] != INDEX_MAGIC:
+            raise ValueError(f"{self.path} is not an ULDB index")
+        self.positions, cursor = {}, 5
+        while cursor < len(content):
+            operation, position = RECORD.unpack_from(content, cursor)
+            cursor += RECORD.size
+            if self.string_keys:
+                string_length = STRING_LENGTH.unpack_from(content, cursor)[0]
+                value = content[cursor + 2:cursor + 2 + string_length].decode()
+                cursor += 2 + string_length
+            else:
+                value = INTEGER_KEY.unpack_from(content, cursor)[0]
+                cursor += 4
+            if operation > 0:
+                self.positions.setdefault(value, set()).add(position)
+            else:
+                self.removals += 1
+                positions = self.positions.get(value, set())
+                positions.discard(position)
+                if not positions:
+                    self.positions.pop(value, None)
+        return self.positions
+
+
+    def _content(self) -> bytes:
+        """Encode tout le fichier d'index à partir du contenu en mémoire: le magic, le type des clés et un ajout par paire."""
+        records = [self._record(1, value, position) for value, positions in self.positions.items() for position in positions]
+        return INDEX_MAGIC + bytes([2 if self.string_keys else 1]) + b''.join(records)
+
+
+    def _file(self) -> BinaryFile:
+        """Renvoie le fichier de l'index, ouvert sans buffer."""
+        if self.index_file is None:
+            self.index_file = BinaryFile(open(self.path, 'rb+', buffering = 0), self.journal)
+        return self.index_file
+
+
+    def _record(self, operation: int, value: int | str, position: int) -> bytes:
+        """Encode un enregistrement du journal de l'index."""
+        if self.string_keys:
+            encoded_value = value.encode()
+            return RECORD.pack(operation, position) + STRING_LENGTH.pack(len(encoded_value)) + encoded_value
+        return RECORD.pack(operation, position) + INTEGER_KEY.pack(value)
+
+
+class IdMap:
+    """Index primaire dense: la position (relative au début de l'entry buffer) de l'entrée d'id i est stockée
+       sur 4 bytes à la position 4*(i - 1) du fichier, -1 si cette entrée a été supprimée.
+       Une recherche, un ajout ou une suppression par id ne coûte donc qu'une lecture ou écriture de 4 bytes."""
+
+    REBUILD_CHUNK = 1 << 16 # Nombre de bytes écrits à la fois par rebuild
+
+    def __init__(self, path: str, journal: 'Journal | None' = None):
+        """Constructeur de IdMap, le fichier path n'est ouvert qu'au premier besoin.
+           Si journal est donné, les écritures dans le fichier passent par ce journal (cf. wal)."""
+        self.path, self.journal = path, journal
+        self.map_file: BinaryFile | None = None
+
+
+    def exists(self, last_id: int) -> bool:
+        """Renvoie True si le fichier existe et contient une position pour chacun des last_id premiers id."""
+        return os.path.exists(self.path) and self._file().get_size() >= 4*last_id
+
+
+    def rebuild(self, positions: Iterable[tuple[int, int]], last_id: int) -> None:
+        """Réécrit tout le fichier à partir des paires (id, position) positions des entrées existantes, par id croissant.
+           Elles sont écrites par paquets de REBUILD_CHUNK bytes: la table n'a pas à tenir en mémoire."""
+        if not os.path.exists(self.path):
+            self.close()
+            open(self.path, 'wb').close()
+        map_file, chunk, written, next_id = self._file(), bytearray(), 0, 1
+        for entry_id, position in positions:
+            chunk += MISSING*(entry_id - next_id) + POSITION.pack(position)
+            next_id = entry_id + 1
+            if len(chunk) >= self.REBUILD_CHUNK:
+                written += map_file.write_bytes_to(bytes(chunk), written)
+                chunk.clear()
+        chunk += MISSING*(last_id + 1 - next_id)
+        written += map_file.write_bytes_to(bytes(chunk), written)
+        map_file.truncate(written)
+
+
+    def lookup(self, entry_id: int) -> int | None:
+        """Renvoie la position de l'entrée d'id entry_id, None si elle n'existe pas."""
+        if entry_id < 1:
+            return None
+        encoded_position = self._file().read_bytes_from(4, 4*(entry_id - 1))
+        position = POSITION.unpack(encoded_position)[0] if len(encoded_position) == 4 else -1
+        return None if position == -1 else position
+
+
+    def read(self, first_id: int, count: int) -> tuple[int, ...]:
+        """Renvoie en une lecture les positions (-1 pour un id supprimé) des entrées d'id first_id, ...,
+           first_id + count - 1."""
+        data = self._file().read_bytes_from(4*count, 4*(first_id - 1))
+        return struct.unpack(f'<{count}i', data + MISSING*(count - len(data)//4))
+
+
+    def set(self, entry_id: int, position: int) -> None:
+        """Enregistre la position de l'entrée d'id entry_id (-1 si elle est supprimée)."""
+        self._file().write_integer_to(position, 4, 4*(entry_id - 1))
+
+
+    def set_range(self, first_id: int, positions: list[int]) -> None:
+        """Enregistre en une écriture les positions positions des entrées d'id first_id, first_id + 1, ..."""
+        self._file().write_bytes_to(b''.join(POSITION.pack(position) for position in positions), 4*(first_id - 1))
+
+
+    def close(self) -> None:
+        """Ferme le fichier s'il est ouvert."""
+        if self.map_file is not None:
+            self.map_file.file.close()
+            self.map_file = None
+
+
+    def _file(self) -> BinaryFile:
+        """Renvoie le fichier de l'index, ouvert sans buffer."""
+        if self.map_file is None:
+            self.map_file = BinaryFile(open(self.path, 'rb+', buffering = 0), self.journal)
+        return self.map_file
@@ -0,0 +1,101 @@
+"""Verrous des tables ULDB, partagés entre processus.
+
+Le verrou de la table <table> est le fichier <db>/<table>.lock, verrouillé avec flock (cf. fcntl): en partage pour une
+lecture, en exclusivité pour une écriture. Il contient aussi le numéro de génération de la table, incrémenté à la fin
+de chaque verrou exclusif: tant qu'il n'a pas changé, la table non plus et son header peut rester en cache. Il est suivi
+de la version du schéma de la table (signature et index), qui ne change qu'avec celui-ci (cf. TableLock.schema).
+Le fichier n'est jamais supprimé, même avec la table: d'autres processus peuvent l'avoir ouvert.
+Sans fcntl (Windows), les verrous ne font rien mais le numéro de génération est tenu à jour.
+"""
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+import os
+import struct
+import time
+
+GENERATION = struct.Struct('<qq') # Génération, version du schéma
+POLL_INTERVAL = 0.002 # Secondes entre deux essais de verrouillage
+
+
+def lock(fd: int, exclusive: bool, timeout: float, description: str) -> None:
+    """Verrouille le fichier ouvert fd, en exclusivité ou en partage, en attendant au plus timeout secondes
+       qu'un autre processus (ou une autre Database) le rende. Lance TimeoutError sinon."""
+    if fcntl is None:
+        return
+    OPERATION = (fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH) | fcntl.LOCK_NB
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            fcntl.flock(fd, OPERATION)
+            return
+        except BlockingIOError:
+            if time.monotonic() >= deadline:
+                raise TimeoutError(f"{description} is still locked by another Database after {timeout} s")
+            time.sleep(POLL_INTERVAL)
+
+
+def unlock(fd: int) -> None:
+    """Rend le verrou du fichier ouvert fd."""
+    if fcntl is not None:
+        fcntl.flock(fd, fcntl.LOCK_UN)
+
+
+class TableLock:
+    """Verrou d'une table, réentrant: un verrou demandé pendant un autre de la même Database ne fait que le compter.
+       Un verrou exclusif demandé pendant un verrou partagé est refusé (ValueError): flock ne convertit pas un verrou
+       de façon atomique, un autre processus pourrait écrire entre les deux et un essai qui échoue perd le verrou partagé.
+       Le numéro de génération est lu à chaque verrouillage et incrémenté quand un verrou exclusif est rendu."""
+
+    def __init__(self, path: str, table_name: str):
+        """Constructeur de TableLock, le fichier path n'est ouvert qu'au premier verrouillage."""
+        self.path, self.table_name = path, table_name
+        self.fd: int | None = None
+        self.count = 0 # Nombre de verrous pris et pas encore rendus
+        self.exclusive = False
+        self.generation = 0
+        self.schema = 0 # Version du schéma, à incrémenter pendant un verrou exclusif quand il change
+
+
+    def acquire(self, exclusive: bool, timeout: float) -> None:
+        """Verrouille la table, en exclusivité si exclusive est vrai (cf. lock)."""
+        if self.count and (self.exclusive or not exclusive):
+            self.count += 1
+            return
+        if self.count:
+            raise ValueError(f"the table {self.table_name} is being read: it can not be written before the end of the reading")
+        if self.fd is None:
+            self.fd = os.open(self.path, os.O_RDWR | os.O_CREAT)
+        lock(self.fd, exclusive, timeout, f"the table {self.table_name}")
+        encoded_generation = os.pread(self.fd, GENERATION.size, 0) if hasattr(os, 'pread') else self._read_generation()
+        # Un fichier écrit avant la version du schéma ne contient que la génération
+        self.generation, self.schema = GENERATION.unpack(encoded_generation.ljust(GENERATION.size, b'\0'))
+        self.count += 1
+        self.exclusive = exclusive
+
+
+    def release(self) -> None:
+        """Rend le dernier verrou pris. Le fichier est déverrouillé quand ils l'ont tous été."""
+        self.count -= 1
+        if self.count:
+            return
+        if self.exclusive:
+            self.generation += 1
+            os.lseek(self.fd, 0, os.SEEK_SET)
+            os.write(self.fd, GENERATION.pack(self.generation, self.schema))
+            self.exclusive = False
+        unlock(self.fd)
+
+
+    def close(self) -> None:
+        """Ferme le fichier du verrou, qui ne doit plus être pris."""
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+
+    def _read_generation(self) -> bytes:
+        """Lit le numéro de génération et la version du schéma encodés, sans pread."""
+        os.lseek(self.fd, 0, os.SEEK_SET)
+        return os.read(self.fd, GENERATION.size)
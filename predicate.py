@@ -0,0 +1,295 @@
+"""Prédicats sur les entrées d'une table ULDB.
+
+Un prédicat est compilé en une seule fonction de test appliquée aux slots décodés de chaque entrée (cf. compile):
+il est donc évalué en un seul parcours de la table, quel que soit le nombre de conditions. Quand les index le permettent,
+il donne aussi les entrées candidates (cf. candidates) et seules celles-ci sont lues.
+Les chaînes sont comparées encodées: l'ordre des bytes UTF-8 est celui des caractères.
+"""
+from abc import ABC, abstractmethod
+from typing import Callable
+import operator
+
+OPERATORS = {
+    '=': operator.eq,
+    '!=': operator.ne,
+    '<': operator.lt,
+    '<=': operator.le,
+    '>': operator.gt,
+    '>=': operator.ge,
+    '^=': bytes.startswith, # Préfixe, uniquement pour les champs STRING
+}
+
+Row = tuple[int, ...]
+Lookup = Callable[[str, str, int | str | tuple], set[int] | None]
+
+
+class Predicate(ABC):
+    """Condition sur les champs d'une entrée. Les prédicats se combinent avec &, | et ~.
+       Une sous-classe doit définir fields, check et compile pour être instanciée."""
+
+    @abstractmethod
+    def fields(self) -> set[str]:
+        """Renvoie les champs utilisés par le prédicat."""
+
+
+    @abstractmethod
+    def check(self, types: dict[str, type]) -> None:
+        """Lance une ValueError si le prédicat utilise un champ absent de types (champ -> int ou str)
+           ou une valeur qui n'est pas du type de son champ."""
+
+
+    @abstractmethod
+    def compile(self, slots: dict[str, int], types: dict[str, type], read_string: Callable[[int], bytes])\
+                -> Callable[[Row], bool]:
+        """Renvoie la fonction qui teste le prédicat sur les slots d'une entrée. slots donne la position de chaque champ
+           dans les slots, read_string renvoie la chaîne encodée pointée par un slot."""
+
+
+    def candidates(self, lookup: Lookup) -> set[int] | None:
+        """Renvoie les positions des entrées qui peuvent satisfaire le prédicat (un surensemble), None s'il faut parcourir
+           toute la table. lookup(field, operator, value) donne les positions des entrées telles que
+           field operator value d'après un index, None si aucun index ne peut répondre. L'opérateur between
+           a pour valeur le couple (minimum, maximum)."""
+        return None
+
+
+    def __and__(self, other: 'Predicate') -> 'Predicate':
+        return And(self, other)
+
+
+    def __or__(self, other: 'Predicate') -> 'Predicate':
+        return Or(self, other)
+
+
+    def __invert__(self) -> 'Predicate':
+        return Not(self)
+
+
+class Comparison(Predicate):
+    """field operator value, operator étant une clé de OPERATORS."""
+
+    def __init__(self, field: str, operator: str, value: int | str):
+        """Constructeur de Comparison"""
+        if operator not in OPERATORS:
+            raise ValueError(f"{operator} is not a comparison operator")
+        self.field, self.operator, self.value = field, operator, value
+
+
+    def __repr__(self) -> str:
+        return f"{self.field}{self.operator}{self.value!r}"
+
+
+    def fields(self) -> set[str]:
+        return {self.field}
+
+
+    def check(self, types: dict[str, type]) -> None:
+        check_value(types, self.field, self.value)
+        if self.operator == '^=' and types[self.field] is not str:
+            raise ValueError(f"{self.field} must be of type STRING to be matched by prefix")
+
+
+    def compile(self, slots: dict[str, int], types: dict[str, type], read_string: Callable[[int], bytes])\
+                -> Callable[[Row], bool]:
+        SLOT, compare = slots[self.field], OPERATORS[self.operator]
+        VALUE = self.value if types[self.field] is int else self.value.encode()
+        # L'égalité, de loin la plus fréquente, évite l'appel à la fonction de comparaison
+        if types[self.field] is int:
+            return (lambda row: row[SLOT] == VALUE) if self.operator == '=' else (lambda row: compare(row[SLOT], VALUE))
+        return (lambda row: read_string(row[SLOT]) == VALUE) if self.operator == '=' else\
+               (lambda row: compare(read_string(row[SLOT]), VALUE))
+
+
+    def candidates(self, lookup: Lookup) -> set[int] | None:
+        return lookup(self.field, self.operator, self.value)
+
+
+class Between(Predicate):
+    """La valeur de field est comprise entre low et high (inclus)."""
+
+    def __init__(self, field: str, low: int | str, high: int | str):
+        """Constructeur de Between"""
+        self.field, self.low, self.high = field, low, high
+
+
+    def __repr__(self) -> str:
+        return f"{self.field} BETWEEN {self.low!r} AND {self.high!r}"
+
+
+    def fields(self) -> set[str]:
+        return {self.field}
+
+
+    def check(self, types: dict[str, type]) -> None:
+        check_value(types, self.field, self.low)
+        check_value(types, self.field, self.high)
+
+
+    def compile(self, slots: dict[str, int], types: dict[str, type], read_string: Callable[[int], bytes])\
+                -> Callable[[Row], bool]:
+        SLOT = slots[self.field]
+        if types[self.field] is int:
+            LOW, HIGH = self.low, self.high
+            return lambda row: LOW <= row[SLOT] <= HIGH
+        ENCODED_LOW, ENCODED_HIGH = self.low.encode(), self.high.encode()
+        return lambda row: ENCODED_LOW <= read_string(row[SLOT]) <= ENCODED_HIGH
+
+
+    def candidates(self, lookup: Lookup) -> set[int] | None:
+        return lookup(self.field, 'between', (self.low, self.high))
+
+
+class In(Predicate):
+    """La valeur de field est une des valeurs values."""
+
+    def __init__(self, field: str, values: list[int | str] | tuple[int | str, ...]):
+        """Constructeur de In"""
+        self.field, self.values = field, tuple(values)
+
+
+    def __repr__(self) -> str:
+        return f"{self.field} IN {self.values!r}"
+
+
+    def fields(self) -> set[str]:
+        return {self.field}
+
+
+    def check(self, types: dict[str, type]) -> None:
+        if self.field not in types:
+            raise ValueError(f"{self.field} is not a field of this table")
+        for value in self.values:
+            check_value(types, self.field, value)
+
+
+    def compile(self, slots: dict[str, int], types: dict[str, type], read_string: Callable[[int], bytes])\
+                -> Callable[[Row], bool]:
+        SLOT = slots[self.field]
+        if types[self.field] is int:
+            VALUES = frozenset(self.values)
+            return lambda row: row[SLOT] in VALUES
+        ENCODED_VALUES = frozenset(value.encode() for value in self.values)
+        return lambda row: read_string(row[SLOT]) in ENCODED_VALUES
+
+
+    def candidates(self, lookup: Lookup) -> set[int] | None:
+        positions = set()
+        for value in self.values:
+            value_positions = lookup(self.field, '=', value)
+            if value_positions is None:
+                return None
+            positions |= value_positions
+        return positions
+
+
+class And(Predicate):
+    """Tous les prédicats predicates sont satisfaits."""
+
+    def __init__(self, *predicates: Predicate):
+        """Constructeur de And"""
+        self.predicates = predicates
+
+
+    def __repr__(self) -> str:
+        return '(' + ' AND '.join(map(repr, self.predicates)) + ')'
+
+
+    def fields(self) -> set[str]:
+        return set().union(*(predicate.fields() for predicate in self.predicates))
+
+
+    def check(self, types: dict[str, type]) -> None:
+        for predicate in self.predicates:
+            predicate.check(types)
+
+
+    def compile(self, slots: dict[str, int], types: dict[str, type], read_string: Callable[[int], bytes])\
+                -> Callable[[Row], bool]:
+        tests = [predicate.compile(slots, types, read_string) for predicate in self.predicates]
+        if len(tests) == 2:
+            first, second = tests
+            return lambda row: first(row) and second(row)
+        return lambda row: all(test(row) for test in tests)
+
+
+    def candidates(self, lookup: Lookup) -> set[int] | None:
+        # Les candidats d'un seul opérande suffisent, ceux des autres ne font que réduire l'ensemble
+        sets = [positions for positions in (predicate.candidates(lookup) for predicate in self.predicates) if positions is not None]
+        if not sets:
+            return None
+        sets.sort(key = len)
+        return sets[0].intersection(*sets[1:])
+
+
+class Or(Predicate):
+    """Au moins un des prédicats predicates est satisfait."""
+
+    def __init__(self, *predicates: Predicate):
+        """Constructeur de Or"""
+        self.predicates = predicates
+
+
+    def __repr__(self) -> str:
+        return '(' + ' OR '.join(map(repr, self.predicates)) + ')'
+
+
+    def fields(self) -> set[str]:
+        return set().union(*(predicate.fields() for predicate in self.predicates))
+
+
+    def check(self, types: dict[str, type]) -> None:
+        for predicate in self.predicates:
+            predicate.check(types)
+
+
+    def compile(self, slots: dict[str, int], types: dict[str, type], read_string: Callable[[int], bytes])\
+                -> Callable[[Row], bool]:
+        tests = [predicate.compile(slots, types, read_string) for predicate in self.predicates]
+        if len(tests) == 2:
+            first, second = tests
+            return lambda row: first(row) or second(row)
+        return lambda row: any(test(row) for test in tests)
+
+
+    def candidates(self, lookup: Lookup) -> set[int] | None:
+        positions = set()
+        for predicate in self.predicates:
+            predicate_positions = predicate.candidates(lookup)
+            if predicate_positions is None:
+                return None
+            positions |= predicate_positions
+        return positions
+
+
+class Not(Predicate):
+    """Le prédicat predicate n'est pas satisfait."""
+
+    def __init__(self, predicate: Predicate):
+        """Constructeur de Not"""
+        self.predicate = predicate
+
+
+    def __repr__(self) -> str:
+        return f"NOT {self.predicate!r}"
+
+
+    def fields(self) -> set[str]:
+        return self.predicate.fields()
+
+
+    def check(self, types: dict[str, type]) -> None:
+        self.predicate.check(types)
+
+
+    def compile(self, slots: dict[str, int], types: dict[str, type], read_string: Callable[[int], bytes])\
+                -> Callable[[Row], bool]:
+        test = self.predicate.compile(slots, types, read_string)
+        return lambda row: not test(row)
+
+
+def check_value(types: dict[str, type], field: str, value: int | str) -> None:
+    """Lance une ValueError si field n'est pas un champ de types ou si value n'est pas du bon type."""
+    if field not in types:
+        raise ValueError(f"{field} is not a field of this table")
+    if not isinstance(value, types[field]):
+        raise ValueError(f"{field} must be of type {'INTEGER' if types[field] is int else 'STRING'}")
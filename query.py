@@ -0,0 +1,624 @@
+"""Analyse et planification des instructions du langage ULDB.
+
+Une instruction est découpée en lexèmes (tokenize), analysée en arbre syntaxique (parse) puis compilée en un Plan
+exécutable sur une Database (plan). Les valeurs littérales ne font pas partie de l'arbre: elles y sont remplacées
+par des paramètres, si bien que toutes les instructions de même forme ont le même arbre et le même plan.
+"""
+from database import AGGREGATES, Database, FieldType, IndexType, TableFormat
+from predicate import And, Between, Comparison, In, Not, Or, Predicate
+from typing import Callable, Iterable, NamedTuple
+from operator import itemgetter
+import re
+
+# Un lexème: chaîne entre guillemets doubles, entier, nom ou symbole. Tout autre caractère est une erreur.
+TOKEN = re.compile(r'\s*(?:(?P<string>"[^"]*")|(?P<integer>[-+]?\d+)(?![^\s,()=<>!^])|(?P<name>[^\s,()="<>!^]+)'
+                   r'|(?P<symbol>[,()]|!=|<=|>=|\^=|[=<>])|(?P<error>\S))')
+COMPARISONS = ('!=', '<', '<=', '>', '>=', '^=')
+SYMBOLS = (',', '(', ')', '=') + COMPARISONS
+
+
+class UldbError(Exception):
+    """Erreur dans une instruction ULDB: un message est affiché mais l'interpréteur continue."""
+
+
+class Parameter(NamedTuple):
+    """Valeur littérale d'une instruction: sa position parmi les valeurs de l'instruction et son type."""
+    index: int
+    type: FieldType
+
+
+class Name(NamedTuple):
+    """Nom (de table, de champ, de type...) ou * dans une instruction."""
+    name: str
+
+
+class Assignment(NamedTuple):
+    """Paramètre de la forme name=value."""
+    name: str
+    value: Parameter | Name
+
+
+class Condition(NamedTuple):
+    """Comparaison name operator value autre que l'égalité (qui est une Assignment)."""
+    name: str
+    operator: str
+    value: Parameter | Name
+
+
+class Range(NamedTuple):
+    """Condition name BETWEEN low AND high."""
+    name: str
+    low: Parameter | Name
+    high: Parameter | Name
+
+
+class Membership(NamedTuple):
+    """Condition name IN (value1,...)."""
+    name: str
+    values: tuple
+
+
+class Conjunction(NamedTuple):
+    """Condition operand1 AND operand2 AND ..."""
+    operands: tuple
+
+
+class Disjunction(NamedTuple):
+    """Condition operand1 OR operand2 OR ..."""
+    operands: tuple
+
+
+class Negation(NamedTuple):
+    """Condition NOT operand."""
+    operand: object
+
+
+class Call(NamedTuple):
+    """Appel name(argument1,...), par exemple l'agrégat COUNT(*)."""
+    name: str
+    arguments: tuple
+
+
+class Group(NamedTuple):
+    """Paramètres entre parenthèses, par exemple une entrée d'un insert_to groupé."""
+    arguments: tuple
+
+
+class Statement(NamedTuple):
+    """Arbre syntaxique d'une instruction: son nom, ses paramètres et ses clauses GROUP BY (champs),
+       ORDER BY (champ, décroissant) et LIMIT."""
+    command: str
+    arguments: tuple
+    group: tuple[str, ...] = ()
+    order: tuple[str, bool] | None = None
+    limit: Parameter | None = None
+
+
+Shape = tuple[str | Parameter, ...]
+
+
+def tokenize(line: str) -> tuple[Shape, list[int | str]]:
+    """Découpe l'instruction line en lexèmes. Renvoie sa forme (ses lexèmes, où chaque valeur littérale est remplacée
+       par un Parameter) et la liste de ses valeurs littérales."""
+    shape, values = [], []
+    for match in TOKEN.finditer(line.strip()):
+        kind, text = match.lastgroup, match.group(match.lastgroup)
+        if kind == 'error':
+            raise UldbError("unterminated string" if text == '"' else f"unexpected character {text}")
+        if kind == 'string':
+            shape.append(Parameter(len(values), FieldType.STRING))
+            values.append(text[1:-1])
+        elif kind == 'integer':
+            shape.append(Parameter(len(values), FieldType.INTEGER))
+            values.append(int(text))
+        else:
+            shape.append(text)
+    return tuple(shape), values
+
+
+class Parser:
+    """Analyseur descendant d'une forme d'instruction:
+           statement   := name '(' [argument {',' argument}] ')' ['GROUP' 'BY' name {',' name}]
+                          ['ORDER' 'BY' name ['ASC' | 'DESC']] ['LIMIT' entier]
+           argument    := disjunction
+           disjunction := conjunction {'OR' conjunction}
+           conjunction := negation {'AND' negation}
+           negation    := 'NOT' negation | primary
+           primary     := '(' [argument {',' argument}] ')' | name '(' [argument {',' argument}] ')'
+                        | value [('=' | comparaison) value | 'IN' '(' value {',' value} ')' | 'BETWEEN' value 'AND' value]
+           value       := name | paramètre
+       Un groupe d'un seul paramètre sert aussi de parenthèses dans les conditions."""
+
+    def __init__(self, shape: Shape):
+        """Constructeur de Parser"""
+        self.shape, self.cursor = shape, 0
+
+
+    def statement(self) -> Statement:
+        """Analyse toute la forme et renvoie l'arbre de l'instruction."""
+        command = self.name()
+        arguments = self.arguments()
+        group, order, limit = [], None, None
+        if self.peek() == 'GROUP':
+            self.cursor += 1
+            self.expect('BY')
+            group.append(self.name())
+            while self.peek() == ',':
+                self.cursor += 1
+                group.append(self.name())
+        if self.peek() == 'ORDER':
+            self.cursor += 1
+            self.expect('BY')
+            order = (self.name(), self.peek() == 'DESC')
+            if self.peek() in ('ASC', 'DESC'):
+                self.cursor += 1
+        if self.peek() == 'LIMIT':
+            self.cursor += 1
+            limit = self.peek()
+            if not isinstance(limit, Parameter) or limit.type is not FieldType.INTEGER:
+                raise UldbError(f"an integer was expected after LIMIT instead of {self.describe(limit)}")
+            self.cursor += 1
+        if self.cursor != len(self.shape):
+            raise UldbError("unexpected text after the instruction")
+        return Statement(command, arguments, tuple(group), order, limit)
+
+
+    def arguments(self) -> tuple:
+        """Analyse une liste de paramètres entre parenthèses."""
+        self.expect('(')
+        arguments = []
+        if self.peek() != ')':
+            arguments.append(self.argument())
+            while self.peek() == ',':
+                self.cursor += 1
+                arguments.append(self.argument())
+        self.expect(')')
+        return tuple(arguments)
+
+
+    def argument(self):
+        """Analyse un paramètre."""
+        return self.disjunction()
+
+
+    def disjunction(self):
+        """Analyse des conditions séparées par OR."""
+        operands = [self.conjunction()]
+        while self.peek() == 'OR':
+            self.cursor += 1
+            operands.append(self.conjunction())
+        return Disjunction(tuple(operands)) if len(operands) > 1 else operands[0]
+
+
+    def conjunction(self):
+        """Analyse des conditions séparées par AND."""
+        operands = [self.negation()]
+        while self.peek() == 'AND':
+            self.cursor += 1
+            operands.append(self.negation())
+        return Conjunction(tuple(operands)) if len(operands) > 1 else operands[0]
+
+
+    def negation(self):
+        """Analyse une condition éventuellement précédée de NOT."""
+        if self.peek() == 'NOT':
+            self.cursor += 1
+            return Negation(self.negation())
+        return self.primary()
+
+
+    def primary(self) -> Group | Call | Assignment | Condition | Membership | Range | Parameter | Name:
+        """Analyse un groupe entre parenthèses, un appel, une valeur, une affectation ou une comparaison."""
+        if self.peek() == '(':
+            return Group(self.arguments())
+        value = self.value()
+        operator = self.peek()
+        if operator == '(' and isinstance(value, Name):
+            return Call(value.name, self.arguments())
+        if operator not in ('=', 'IN', 'BETWEEN') + COMPARISONS:
+            return value
+        if not isinstance(value, Name):
+            raise UldbError("a value can not be assigned or compared")
+        self.cursor += 1
+        if operator == 'BETWEEN':
+            low = self.value()
+            self.expect('AND')
+            return Range(value.name, low, self.value())
+        if operator == 'IN':
+            values = self.arguments()
+            if not all(isinstance(member, Parameter) for member in values):
+                raise UldbError("IN needs a list of values")
+            return Membership(value.name, values)
+        return Assignment(value.name, self.value()) if operator == '=' else Condition(value.name, operator, self.value())
+
+
+    def value(self) -> Parameter | Name:
+        """Analyse une valeur littérale ou un nom."""
+        token = self.peek()
+        if isinstance(token, Parameter):
+            self.cursor += 1
+            return token
+        return Name(self.name())
+
+
+    def name(self) -> str:
+        """Analyse un nom."""
+        token = self.peek()
+        if not isinstance(token, str) or token in SYMBOLS:
+            raise UldbError(f"a name was expected instead of {self.describe(token)}")
+        self.cursor += 1
+        return token
+
+
+    def expect(self, symbol: str) -> None:
+        """Passe le symbole symbol, qui doit être le prochain lexème."""
+        if self.peek() != symbol:
+            raise UldbError(f"{symbol} was expected instead of {self.describe(self.peek())}")
+        self.cursor += 1
+
+
+    def peek(self) -> str | Parameter | None:
+        """Renvoie le prochain lexème (None à la fin de l'instruction)."""
+        return self.shape[self.cursor] if self.cursor < len(self.shape) else None
+
+
+    def describe(self, token: str | Parameter | None) -> str:
+        """Renvoie la description d'un lexème pour les messages d'erreur."""
+        if token is None:
+            return "the end of the instruction"
+        return f"a {token.type.name.lower()} value" if isinstance(token, Parameter) else token
+
+
+def parse(shape: Shape) -> Statement:
+    """Renvoie l'arbre syntaxique de l'instruction de forme shape."""
+    return Parser(shape).statement()
+
+
+class Plan:
+    """Instruction compilée: sa table, le chemin d'accès aux entrées (id, index ou parcours de la table) et les champs
+       à décoder sont résolus une fois pour toutes. execute ne reçoit plus que les valeurs littérales de l'instruction."""
+
+    def __init__(self, command: str, run: Callable[[list], Iterable], table: str | None = None, access: str | None = None,\
+                 fields: tuple[str, ...] = (), changes_schema: bool = False, rows: Callable[[list], int] | None = None,\
+                 tables: tuple[str, ...] | None = None):
+        """Constructeur de Plan. run reçoit les valeurs littérales et renvoie les résultats à afficher,
+           rows les reçoit aussi et renvoie le nombre estimé d'entrées parcourues. tables sont les tables dont le schéma
+           a servi à compiler le plan, (table,) par défaut."""
+        self.command, self.run, self.table, self.access, self.fields = command, run, table, access, fields
+        self.changes_schema = changes_schema # Les plans en cache ne sont plus valides après l'exécution de celui-ci
+        self.rows = rows
+        self.tables = tables if tables is not None else () if table is None else (table,)
+        self.versions: tuple[int, ...] = () # Versions du schéma des tables à la compilation (cf. Database.schema_version)
+
+
+    def execute(self, values: list[int | str]) -> Iterable:
+        """Exécute le plan avec les valeurs littérales values et renvoie les résultats à afficher."""
+        return self.run(values)
+
+
+    def describe(self, values: list[int | str]) -> str:
+        """Renvoie la description du plan avec les valeurs littérales values (cf. explain dans uldb), sans l'exécuter:
+           sa table, son chemin d'accès (scan: toute la liste chaînée des entrées est parcourue), le nombre estimé
+           d'entrées parcourues et les champs décodés."""
+        description = {'table': self.table, 'access': self.access,\
+                       'estimated_rows': None if self.rows is None else self.rows(values), 'fields': ','.join(self.fields)}
+        return ' '.join([f"{self.command}:"] + [f"{name}={value}" for name, value in description.items() if value not in (None, '')])
+
+
+def quiet(action: Callable[[list], object]) -> Callable[[list], Iterable]:
+    """Renvoie une fonction qui exécute action mais n'a aucun résultat à afficher."""
+    def run(values: list) -> Iterable:
+        action(values)
+        return ()
+    return run
+
+
+def plan(statement: Statement, db: Database) -> Plan:
+    """Compile l'instruction statement en un plan pour la DB db."""
+    if statement.command not in PLANNERS:
+        raise UldbError(f"unknown instruction {statement.command}")
+    clauses = {clause: value for clause, value in (('group', statement.group), ('order', statement.order),\
+                                                   ('limit', statement.limit)) if value}
+    for clause in clauses:
+        if clause not in CLAUSES.get(statement.command, ()):
+            raise UldbError(f"{statement.command} does not accept {clause.upper()}{'' if clause == 'limit' else ' BY'}")
+    return PLANNERS[statement.command](db, *statement.arguments, **clauses)
+
+
+def table_name(argument) -> str:
+    """Renvoie le nom de table argument."""
+    if not isinstance(argument, Name):
+        raise UldbError("a table name was expected")
+    return argument.name
+
+
+def field_names(db: Database, table: str, arguments: tuple) -> tuple[str, ...]:
+    """Renvoie les noms de champs arguments (* désigne tous les champs sauf id), après avoir vérifié qu'ils existent."""
+    signature = [field_name for field_name, _ in db.get_table_signature(table)]
+    if any(not isinstance(argument, Name) for argument in arguments):
+        raise UldbError("field names were expected")
+    fields = tuple(signature) if arguments == (Name('*'),) else tuple(argument.name for argument in arguments)
+    for field_name in fields:
+        if field_name not in signature and field_name != 'id':
+            raise ValueError(f"{field_name} is not a field of this table")
+    return fields
+
+
+def condition(db: Database, table: str, argument) -> tuple[Callable[[list], Predicate], str]:
+    """Vérifie la condition argument et renvoie la fonction qui construit son prédicat à partir des valeurs littérales
+       de l'instruction, ainsi que le chemin d'accès aux entrées qui la satisfont ('index' ou 'scan')."""
+    types = {'id': FieldType.INTEGER} | dict(db.get_table_signature(table))
+    parameters = []
+
+    def build(argument) -> Callable[[list], Predicate]:
+        """Renvoie la fonction qui construit le prédicat de la condition argument."""
+        if isinstance(argument, Group) and len(argument.arguments) == 1:
+            return build(argument.arguments[0])
+        if isinstance(argument, (Assignment, Condition)):
+            name, value = assignment(db, table, argument)
+            OPERATOR = '=' if isinstance(argument, Assignment) else argument.operator
+            if OPERATOR == '^=' and types[name] is not FieldType.STRING:
+                raise ValueError(f"{name} must be of type STRING to be matched by prefix")
+            parameters.append(value)
+            return lambda values: Comparison(name, OPERATOR, values[value.index])
+        if isinstance(argument, Range):
+            (name, low), (_, high) = (assignment(db, table, Condition(argument.name, 'BETWEEN', value))\
+                                      for value in (argument.low, argument.high))
+            parameters.extend((low, high))
+            return lambda values: Between(name, values[low.index], values[high.index])
+        if isinstance(argument, Membership):
+            for value in argument.values:
+                assignment(db, table, Assignment(argument.name, value))
+            parameters.extend(argument.values)
+            return lambda values: In(argument.name, [values[value.index] for value in argument.values])
+        if isinstance(argument, (Conjunction, Disjunction)):
+            operands, combine = [build(operand) for operand in argument.operands], And if isinstance(argument, Conjunction) else Or
+            return lambda values: combine(*(operand(values) for operand in operands))
+        if isinstance(argument, Negation):
+            operand = build(argument.operand)
+            return lambda values: Not(operand(values))
+        raise UldbError("a condition was expected")
+
+    predicate = build(argument)
+    # Le chemin d'accès ne dépend pas des valeurs: il est choisi avec des valeurs quelconques du bon type
+    placeholders = {value.index: 0 if value.type is FieldType.INTEGER else '' for value in parameters}
+    return predicate, db.access_path(table, predicate(placeholders))
+
+
+def assignment(db: Database, table: str, argument) -> tuple[str, Parameter]:
+    """Vérifie que argument est de la forme name=value (ou name operator value), où value est du type du champ name,
+       et renvoie (name, value)."""
+    if not isinstance(argument, (Assignment, Condition)):
+        raise UldbError("a parameter of the form name=value was expected")
+    if not isinstance(argument.value, Parameter):
+        raise UldbError(f"{argument.value.name} is neither an integer nor a string")
+    types = {'id': FieldType.INTEGER} | dict(db.get_table_signature(table))
+    if argument.name not in types:
+        raise ValueError(f"{argument.name} is not a field of this table")
+    if types[argument.name] is not argument.value.type:
+        raise ValueError(f"{argument.name} must be of type {types[argument.name].name}")
+    return argument.name, argument.value
+
+
+def plan_create_table(db: Database, table, *fields) -> Plan:
+    """create_table(table_name,name1=type1,...[,ULDB|HEAP|COLUMNAR]): crée une table, au format donné ou à celui
+       par défaut de la DB."""
+    table, signature, TABLE_FORMAT = table_name(table), [], None
+    if fields and isinstance(fields[-1], Name):
+        if fields[-1].name not in TableFormat.__members__:
+            raise UldbError("the table format should be ULDB, HEAP or COLUMNAR")
+        TABLE_FORMAT, fields = TableFormat[fields[-1].name], fields[:-1]
+    for field in fields:
+        if not isinstance(field, Assignment) or not isinstance(field.value, Name):
+            raise UldbError("fields should be of the form name=type")
+        if field.value.name not in FieldType.__members__:
+            raise UldbError(f"{field.value.name} is not a field type")
+        signature.append((field.name, FieldType[field.value.name]))
+    return Plan('create_table', quiet(lambda values: db.create_table(table, *signature, table_format = TABLE_FORMAT)), table,\
+                changes_schema = True)
+
+
+def plan_delete_table(db: Database, table) -> Plan:
+    """delete_table(table_name): supprime une table."""
+    table = table_name(table)
+    return Plan('delete_table', quiet(lambda values: db.delete_table(table)), table, changes_schema = True)
+
+
+def plan_list_tables(db: Database) -> Plan:
+    """list_tables(): affiche le nom des tables, un par ligne."""
+    return Plan('list_tables', lambda values: db.list_tables())
+
+
+def plan_insert_to(db: Database, table, *fields) -> Plan:
+    """insert_to(table_name,name1=value1,...): ajoute une entrée.
+       insert_to(table_name,(name1=value1,...),(name1=value1,...),...): ajoute plusieurs entrées en une fois."""
+    table = table_name(table)
+    if fields and all(isinstance(field, Group) for field in fields):
+        entries = [[assignment(db, table, field) for field in group.arguments] for group in fields]
+        return Plan('insert_to', quiet(lambda values: db.add_entries(table, [{name: values[value.index] for name, value in entry}\
+                                                                             for entry in entries])), table)
+    entry = [assignment(db, table, field) for field in fields]
+    return Plan('insert_to', quiet(lambda values: db.add_entry(table, {name: values[value.index] for name, value in entry})), table)
+
+
+def plan_from_if_get(db: Database, table, cond, *fields, order: tuple[str, bool] | None = None,\
+                     limit: Parameter | None = None) -> Plan:
+    """from_if_get(table_name,condition,name1,...) [ORDER BY name [ASC|DESC]] [LIMIT n]: affiche les champs demandés
+       des entrées satisfaisant la condition, une entrée par ligne (* désigne tous les champs sauf id). Seuls ces champs
+       sont décodés. La condition est une égalité name=value, une comparaison (!=, <, <=, >, >=, ^= pour un préfixe),
+       name IN (value1,...), name BETWEEN low AND high ou une combinaison de celles-ci avec AND, OR, NOT et des parenthèses.
+       Les entrées sont affichées dans l'ordre du champ de ORDER BY, au plus n si LIMIT est donné."""
+    table = table_name(table)
+    if not fields:
+        raise UldbError("from_if_get needs at least one field")
+    predicate, access = condition(db, table, cond)
+    fields = field_names(db, table, fields)
+    order_by, descending = (None, False) if order is None else (field_names(db, table, (Name(order[0]),))[0], order[1])
+    return Plan('from_if_get',\
+                lambda values: db.iter_select_where(table, fields, predicate(values), order_by, descending,\
+                                                    None if limit is None else values[limit.index]),\
+                table, access, fields, rows = lambda values: db.estimate_rows(table, predicate(values)))
+
+
+def plan_from_if_aggregate(db: Database, table, *arguments, group: tuple[str, ...] = ()) -> Plan:
+    """from_if_aggregate(table_name,[condition,]aggregate1,...) [GROUP BY name1,...]: affiche les agrégats COUNT(*),
+       COUNT(name), SUM(name), MIN(name) ou MAX(name) des entrées satisfaisant la condition (toutes si elle est omise),
+       une ligne par groupe: les valeurs des champs de GROUP BY puis les agrégats. Les entrées ne sont pas décodées."""
+    table = table_name(table)
+    if arguments and isinstance(arguments[0], Call):
+        cond, aggregates = None, arguments
+    else:
+        cond, aggregates = arguments[0] if arguments else None, arguments[1:]
+    if not aggregates:
+        raise UldbError("from_if_aggregate needs at least one aggregate")
+    functions = []
+    for call in aggregates:
+        if not isinstance(call, Call) or call.name not in AGGREGATES or len(call.arguments) != 1\
+           or not isinstance(call.arguments[0], Name):
+            raise UldbError(f"aggregates should be of the form {'|'.join(AGGREGATES)}(name)")
+        field = call.arguments[0].name
+        functions.append((call.name, field if field == '*' else field_names(db, table, call.arguments)[0]))
+    group = field_names(db, table, tuple(map(Name, group))) if group else ()
+    functions = tuple(functions)
+    if cond is None:
+        predicate = None
+        access = 'header' if not group and all(function == 'COUNT' for function, _ in functions) else 'scan'
+    else:
+        predicate, access = condition(db, table, cond)
+    return Plan('from_if_aggregate',\
+                lambda values: [row[0] if len(row) == 1 else row for row in\
+                                db.aggregate(table, functions, None if predicate is None else predicate(values), group)],\
+                table, access, group + tuple(field for _, field in functions if field != '*'),\
+                rows = lambda values: 0 if access == 'header' else\
+                                      db.estimate_rows(table, None if predicate is None else predicate(values)))
+
+
+def plan_join(db: Database, left, right, on, *fields) -> Plan:
+    """join(left_table,right_table,left_field=right_field,table.name1,...): affiche les paires d'entrées des deux tables
+       dont les champs de jointure ont la même valeur (left_field seul s'il a le même nom des deux côtés), ou seulement
+       les champs demandés, préfixés par le nom de leur table."""
+    left, right = table_name(left), table_name(right)
+    if isinstance(on, Name):
+        on = Assignment(on.name, on)
+    if not isinstance(on, Assignment) or not isinstance(on.value, Name):
+        raise UldbError("the join condition should be of the form left_field=right_field")
+    (left_field,), (right_field,) = field_names(db, left, (Name(on.name),)), field_names(db, right, (on.value,))
+    # Au plus: chaque table est parcourue une fois (sans index sur les champs de jointure)
+    rows = lambda values: db.estimate_rows(left) + db.estimate_rows(right)
+    if not fields:
+        return Plan('join', lambda values: db.join(left, right, (left_field, right_field)), left, rows = rows,\
+                    tables = (left, right))
+    if left == right:
+        raise UldbError("the fields of a table joined with itself are ambiguous")
+    selected, sides = ([], []), []
+    for field in fields:
+        table, _, field_name = field.name.rpartition('.') if isinstance(field, Name) else ('', '', '')
+        if table not in (left, right):
+            raise UldbError("joined fields should be of the form table_name.field_name")
+        sides.append(0 if table == left else 1)
+        selected[sides[-1]].extend(field_names(db, table, (Name(field_name),)))
+    # db.join renvoie les champs de gauche puis ceux de droite: ils sont remis dans l'ordre demandé
+    positions, seen = [], [0, len(selected[0])]
+    for side in sides:
+        positions.append(seen[side])
+        seen[side] += 1
+    reorder = None if positions == sorted(positions) else itemgetter(*positions)
+    selected = (tuple(selected[0]), tuple(selected[1]))
+
+    def run(values: list) -> Iterable:
+        rows = db.join(left, right, (left_field, right_field), selected)
+        return rows if reorder is None else map(reorder, rows)
+    return Plan('join', run, left, fields = tuple(field.name for field in fields), rows = rows, tables = (left, right))
+
+
+def plan_from_delete_where(db: Database, table, cond) -> Plan:
+    """from_delete_where(table_name,condition): supprime les entrées satisfaisant la condition (cf. from_if_get)."""
+    table = table_name(table)
+    predicate, access = condition(db, table, cond)
+    return Plan('from_delete_where', quiet(lambda values: db.delete_where(table, predicate(values))), table, access,\
+                rows = lambda values: db.estimate_rows(table, predicate(values)))
+
+
+def plan_from_update_where(db: Database, table, cond, update) -> Plan:
+    """from_update_where(table_name,condition,name=new_value): modifie les entrées satisfaisant la condition (cf. from_if_get)."""
+    table = table_name(table)
+    predicate, access = condition(db, table, cond)
+    if not isinstance(update, Assignment):
+        raise UldbError("the update should be of the form name=value")
+    update_name, update_value = assignment(db, table, update)
+    return Plan('from_update_where',\
+                quiet(lambda values: db.update_where(table, predicate(values), update_name, values[update_value.index])),\
+                table, access, (update_name,), rows = lambda values: db.estimate_rows(table, predicate(values)))
+
+
+def plan_create_index(db: Database, table, field, index_type = Name('HASH')) -> Plan:
+    """create_index(table_name,field_name[,HASH|BTREE]): indexe le champ field_name pour les conditions d'égalité (HASH)
+       ou aussi pour les intervalles, les préfixes et ORDER BY (BTREE)."""
+    table, (field_name,) = table_name(table), field_names(db, table_name(table), (field,))
+    if not isinstance(index_type, Name) or index_type.name not in IndexType.__members__:
+        raise UldbError("the index type should be HASH or BTREE")
+    INDEX_TYPE = IndexType[index_type.name]
+    return Plan('create_index', quiet(lambda values: db.create_index(table, field_name, INDEX_TYPE)), table, changes_schema = True)
+
+
+def plan_drop_index(db: Database, table, field) -> Plan:
+    """drop_index(table_name,field_name): supprime l'index du champ field_name."""
+    table, (field_name,) = table_name(table), field_names(db, table_name(table), (field,))
+    return Plan('drop_index', quiet(lambda values: db.drop_index(table, field_name)), table, changes_schema = True)
+
+
+def plan_vacuum(db: Database, table) -> Plan:
+    """vacuum(table_name): réencode la table sans place perdue et affiche le nombre de bytes récupérés."""
+    table = table_name(table)
+    return Plan('vacuum', lambda values: (db.vacuum(table),), table)
+
+
+def plan_begin(db: Database) -> Plan:
+    """begin(): commence une transaction. Les instructions suivantes ne sont écrites qu'ensemble, par commit(), et une
+       instruction qui échoue annule toute la transaction."""
+    return Plan('begin', quiet(lambda values: db.begin()))
+
+
+def plan_commit(db: Database) -> Plan:
+    """commit(): termine la transaction en écrivant toutes ses modifications en une fois."""
+    return Plan('commit', quiet(lambda values: db.commit()))
+
+
+def plan_rollback(db: Database) -> Plan:
+    """rollback(): termine la transaction en annulant toutes ses modifications."""
+    return Plan('rollback', quiet(lambda values: db.rollback()))
+
+
+def plan_stats(db: Database, switch = None) -> Plan:
+    """stats(ON|OFF): commence (en remettant tout à 0) ou arrête de collecter les statistiques des opérations de la DB.
+       stats(): affiche les statistiques de chaque opération exécutée depuis stats(ON), une par ligne (cf. Database.stats)."""
+    if switch is None:
+        return Plan('stats', lambda values: (f"{operation}: " + ' '.join(f"{name}={value:.6f}" if isinstance(value, float)\
+                                                                         else f"{name}={value}" for name, value in totals.items())
+                                             for operation, totals in db.stats().items()))
+    if not isinstance(switch, Name) or switch.name not in ('ON', 'OFF'):
+        raise UldbError("stats expects ON or OFF")
+    ENABLED = switch.name == 'ON'
+    return Plan('stats', quiet(lambda values: db.collect_stats(ENABLED)))
+
+
+CLAUSES = {'from_if_get': ('order', 'limit'), 'from_if_aggregate': ('group',)} # Clauses acceptées par chaque instruction
+
+PLANNERS = {
+    'create_table': plan_create_table,
+    'delete_table': plan_delete_table,
+    'list_tables': plan_list_tables,
+    'insert_to': plan_insert_to,
+    'from_if_get': plan_from_if_get,
+    'from_if_aggregate': plan_from_if_aggregate,
+    'join': plan_join,
+    'from_delete_where': plan_from_delete_where,
+    'from_update_where': plan_from_update_where,
+    'create_index': plan_create_index,
+    'drop_index': plan_drop_index,
+    'vacuum': plan_vacuum,
+    'begin': plan_begin,
+    'commit': plan_commit,
+    'rollback': plan_rollback,
+    'stats': plan_stats,
+}
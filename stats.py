@@ -0,0 +1,80 @@
+"""Statistiques d'exécution des opérations d'une Database (cf. Database.collect_stats).
+
+Pendant une opération publique d'une Database qui collecte ses statistiques, BinaryFile.stats est le collecteur de cette
+Database: les fichiers ouverts, les bytes lus et écrits et les déplacements dans les fichiers (goto et accès à une position
+hors projection en mémoire) y sont comptés, comme les headers décodés, les agrandissements du string buffer, les entrées
+parcourues et le temps passé à décoder des champs. À la fin de l'opération, son temps et ses compteurs sont ajoutés
+à ceux de toutes ses exécutions.
+Seul l'appel le plus externe est une opération: ce que fait add_entry en appelant add_entries lui est compté. Le temps
+d'une opération qui renvoie un itérateur est celui passé dans l'appel puis dans l'itérateur, pas entre ses valeurs.
+Sans collecteur, chaque point de mesure ne coûte qu'un test d'attribut.
+"""
+from binary import BinaryFile
+from contextlib import contextmanager
+from functools import wraps
+from time import perf_counter
+from types import GeneratorType
+from typing import Callable, Iterator
+
+END = object() # Fin d'un itérateur (cf. Stats.iterate)
+COUNTERS = ('opens', 'bytes_read', 'bytes_written', 'seeks', 'headers_parsed', 'string_buffer_resizes', 'entries_visited',
+            'decode_seconds')
+
+
+class Stats:
+    """Compteurs d'une Database et leurs totaux par opération."""
+
+    def __init__(self):
+        """Constructeur de Stats, tous les compteurs valent 0."""
+        self.opens = self.bytes_read = self.bytes_written = self.seeks = 0
+        self.headers_parsed = self.string_buffer_resizes = self.entries_visited = 0
+        self.decode_seconds = 0.0
+        self.operations: dict[str, dict[str, int | float]] = {} # calls, seconds et les COUNTERS, par opération
+        self.depth = 0 # Nombre d'opérations en cours de mesure
+
+
+    @contextmanager
+    def measure(self, operation: str, calls: int = 1) -> Iterator[None]:
+        """Mesure le bloc comme calls exécutions de l'opération operation."""
+        previous, BinaryFile.stats = BinaryFile.stats, self
+        before = [getattr(self, counter) for counter in COUNTERS]
+        self.depth += 1
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            seconds = perf_counter() - start
+            self.depth -= 1
+            BinaryFile.stats = previous
+            totals = self.operations.setdefault(operation, dict.fromkeys(('calls', 'seconds') + COUNTERS, 0))
+            totals['calls'] += calls
+            totals['seconds'] += seconds
+            for counter, value in zip(COUNTERS, before):
+                totals[counter] += getattr(self, counter) - value
+
+
+    def iterate(self, operation: str, iterator: Iterator) -> Iterator:
+        """Renvoie les valeurs d'iterator, renvoyé par l'opération operation, en mesurant chacune de ses reprises."""
+        try:
+            while True:
+                with self.measure(operation, 0):
+                    item = next(iterator, END)
+                if item is END:
+                    return
+                yield item
+        finally:
+            with self.measure(operation, 0):
+                iterator.close()
+
+
+def instrumented(method: Callable) -> Callable:
+    """Décore une méthode publique de Database pour que ses appels soient mesurés quand elle collecte ses statistiques."""
+    @wraps(method)
+    def wrapper(self, *args, **kwargs):
+        stats = self._stats
+        if stats is None or stats.depth:
+            return method(self, *args, **kwargs)
+        with stats.measure(method.__name__):
+            result = method(self, *args, **kwargs)
+        return stats.iterate(method.__name__, result) if isinstance(result, GeneratorType) else result
+    return wrapper
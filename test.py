@@ -1,8 +1,14 @@
 from contextlib import contextmanager
 from pathlib import Path
 import pytest
+import shutil
 COURS_PATH = Path('programme') / 'cours.table'
 
+@pytest.fixture(autouse = True, scope = 'module')
+def remove_test_db():
+    yield
+    shutil.rmtree('test_db', ignore_errors = True)
+
 def get_db(db_name: str) -> 'Database':
     from database import Database
     return Database(db_name)
@@ -91,6 +97,33 @@ def test_get_size():
         file.write_string('eée')
         assert file.get_size() == 6
 
+def test_positional_io():
+    from binary import BinaryFile
+    with tmpfile() as f:
+        file = BinaryFile(f)
+        file.write_integer(0, 8)
+        assert file.write_string_to('€', -4) == 5
+        assert file.get_size() == 9
+        assert file.read_string_from(4) == '€'
+        file.write_integer_to(7, 2, 0)
+        assert f.tell() == 8
+        assert file.read_integer(1) == 0xac - 0x100
+        assert file.read_integer_from(2, 0) == 7
+
+def test_mapped_reads_follow_file():
+    from binary import MappedBinaryFile
+    with tmpfile() as f:
+        file = MappedBinaryFile(f)
+        assert file.read_bytes_from(4, 0) == b''
+        file.write_string_to('Progra', 0)
+        assert file.read_string_from(0) == 'Progra'
+        file.write_integer_to(-5, 4, 8)  # le fichier grandit: nouvelle projection
+        assert file.read_integer_from(4, 8) == -5
+        f.truncate(4)
+        file.remap()
+        assert file.read_integer_from(2, 0) == 6
+        file.unmap()
+
 ########################################
 #               Partie 2               #
 ########################################
@@ -324,11 +357,42 @@ def test_delete_entries():
 
 def test_resize_after_delete():
     db = get_programme_db()
+    db.auto_vacuum = True
     fill_courses(db)
     size = _get_table_size('programme/cours.table')
     db.delete_entries('cours', 'CREDITS', 5)
     assert _get_table_size('programme/cours.table') < size
 
+def test_auto_vacuum_hysteresis():
+    from database import FieldType
+    from predicate import Comparison
+    db = get_empty_db('test_db')
+    db.create_table('t', ('a', FieldType.INTEGER))
+    db.add_entries('t', [{'a': i} for i in range(100)])
+    size = _get_table_size('test_db/t.table')
+    # Sans auto_vacuum, une suppression ne réencode jamais la table
+    db.delete_where('t', Comparison('a', '<', 60))
+    assert _get_table_size('test_db/t.table') == size
+    db.auto_vacuum = True
+    db.delete_entries('t', 'a', 60)
+    size = _get_table_size('test_db/t.table')
+    assert db.vacuum('t') == 0
+    # Des ajouts et suppressions alternés réutilisent la même relique: la table n'est plus réencodée
+    db.add_entry('t', {'a': 1000})
+    size = _get_table_size('test_db/t.table')
+    for i in range(20):
+        db.delete_entries('t', 'a', 1000 + i)
+        db.add_entry('t', {'a': 1001 + i})
+    assert _get_table_size('test_db/t.table') == size
+    # Un parcours pendant lequel les suppressions réencodent la table reprend après sa dernière entrée
+    db.SCAN_CHUNK = 4
+    deleted = []
+    for a in db.iter_select_where('t', ('a',), Comparison('a', '>=', 61)):
+        db.delete_entries('t', 'a', a)
+        deleted.append(a)
+    assert deleted == list(range(61, 100)) + [1020] and db.get_table_size('t') == 0
+    assert _get_table_size('test_db/t.table') < size
+
 def _get_table_size(p: str) -> int:
     from binary import BinaryFile
     with open(p, 'rb') as f:
@@ -462,3 +526,784 @@ def test_script_param():
     del _
     process = run(['python3', 'uldb.py', 'script.uldb'], check=True, capture_output=True, text=True)
     assert process.stdout.strip() == expected
+    assert process.stderr == '' # Le script s'exécute sans erreur sur une DB vide
+
+########################################
+#              Extensions              #
+########################################
+
+def test_header_cache():
+    db = fill_courses(get_programme_db())
+    header = db._headers['cours']
+    assert db.get_entry('cours', 'id', 2)['MNEMONIQUE'] == 102
+    assert db._headers['cours'] is header
+    # Un autre processus modifie la table: le header doit être relu
+    other = get_db('programme')
+    other.add_entry('cours', COURSES[0])
+    assert db.get_table_size('cours') == len(COURSES) + 1
+    assert db._headers['cours'] is not header
+
+def test_open_files_pool():
+    from database import FieldType
+    db = get_empty_db('test_db')
+    db.MAX_OPEN_FILES = 2
+    for name in ('a', 'b', 'c'):
+        db.create_table(name, ('x', FieldType.INTEGER))
+        db.add_entry(name, {'x': 1})
+    assert list(db._handles) == ['b', 'c']
+    db.get_table_size('b')
+    assert list(db._handles) == ['c', 'b']
+    db.delete_table('b')
+    assert list(db._handles) == ['c']
+    with db:
+        assert db.get_complete_table('a') == [{'x': 1, 'id': 1}]
+    assert not db._handles
+
+def test_bulk_string_decoding():
+    db = fill_courses(get_programme_db())
+    expected = db.get_complete_table('cours')
+    db.BULK_STRINGS = 1
+    assert db.get_complete_table('cours') == expected
+    assert db.select_entries('cours', ('NOM', 'id'), 'CREDITS', 10) == \
+        [('Programmation', 1), ('Algorithmique I', 3)]
+
+def test_hash_index():
+    import os.path
+    db = fill_courses(get_programme_db())
+    db.create_index('cours', 'CREDITS')
+    db.create_index('cours', 'NOM')
+    assert os.path.isfile('programme/cours.CREDITS.idx')
+    with pytest.raises(ValueError):
+        db.create_index('cours', 'CREDITS')
+    assert db.select_entries('cours', ('MNEMONIQUE',), 'CREDITS', 5) == [102, 105, 106]
+    db.add_entry('cours', COURSES[1] | {'MNEMONIQUE': 107})
+    db.update_entries('cours', 'MNEMONIQUE', 105, 'CREDITS', 10)
+    db.delete_entries('cours', 'MNEMONIQUE', 106)
+    db.update_entries('cours', 'MNEMONIQUE', 101, 'NOM', 'Progra')
+    # Une autre DB relit l'index depuis le fichier
+    for other in (db, get_db('programme')):
+        assert other.select_entries('cours', ('MNEMONIQUE',), 'CREDITS', 5) == [102, 107]
+        assert other.select_entry('cours', ('MNEMONIQUE',), 'NOM', 'Progra') == 101
+        assert other.get_entry('cours', 'NOM', 'Programmation') is None
+    db.drop_index('cours', 'CREDITS')
+    assert db.select_entries('cours', ('MNEMONIQUE',), 'CREDITS', 10) == [101, 103, 105]
+    db.delete_table('cours')
+    assert not os.path.exists('programme/cours.NOM.idx')
+
+def test_id_map():
+    import os
+    db = fill_courses(get_programme_db())
+    assert os.path.getsize('programme/cours.ids') == 4 * len(COURSES)
+    db.delete_entries('cours', 'id', 2)
+    assert db.get_entry('cours', 'id', 2) is None
+    assert db.select_entry('cours', ('MNEMONIQUE',), 'id', 3) == 103
+    db.update_entries('cours', 'id', 4, 'CREDITS', 6)
+    # Index des id manquant: les lectures parcourent la table, la prochaine écriture le reconstruit
+    os.remove('programme/cours.ids')
+    other = get_db('programme')
+    assert other.select_entries('cours', ('MNEMONIQUE', 'CREDITS'), 'id', 4) == [(105, 6)]
+    assert other.get_entry('cours', 'id', 2) is None
+    assert not os.path.exists('programme/cours.ids')
+    other.update_entries('cours', 'id', 4, 'CREDITS', 5)
+    assert os.path.getsize('programme/cours.ids') == 4 * len(COURSES)
+    assert db.select_entries('cours', ('MNEMONIQUE', 'CREDITS'), 'id', 4) == [(105, 5)]
+
+def test_journal_off_without_wal():
+    import os
+    from database import FieldType
+    db = get_empty_db('test_db')
+    if os.path.exists('test_db/uldb.wal'):
+        os.remove('test_db/uldb.wal')
+    db.create_table('t', ('A', FieldType.INTEGER))
+    db.add_entries('t', [{'A': i} for i in range(10)])
+    db.create_index('t', 'A')
+    db.update_entries('t', 'A', 3, 'A', 30)
+    db.delete_entries('t', 'A', 4)
+    assert get_db('test_db').select_entries('t', ('A',), 'A', 30) == [30]
+    assert not os.path.exists('test_db/uldb.wal')
+    with db.transaction():
+        db.add_entry('t', {'A': 11})
+    assert os.path.getsize('test_db/uldb.wal') == 0
+
+def test_reads_do_not_write():
+    import os
+    from database import Database, FieldType, TableFormat
+    for table_format in TableFormat:
+        db = get_empty_db('test_db')
+        db.create_table('t', ('A', FieldType.INTEGER), ('B', FieldType.STRING), table_format = table_format)
+        db.add_entries('t', [{'A': i, 'B': str(i)} for i in range(10)])
+        sidecars = [name for name in os.listdir('test_db') if name.split('.')[-1] in ('ids', 'zones', 'col', 'deleted')]
+        for name in sidecars:
+            os.remove(Path('test_db', name))
+        lock = Path('test_db', 't.lock').read_bytes()
+        # Les lectures n'écrivent rien et ne prennent pas de verrou exclusif (la génération ne change pas)
+        reader = get_db('test_db')
+        assert reader.select_entries('t', ('A',), 'id', 3) == [2]
+        assert reader.select_entries('t', ('A',), 'B', '7') == [7]
+        assert reader.aggregate('t', (('SUM', 'A'),)) == [(45,)]
+        assert Path('test_db', 't.lock').read_bytes() == lock
+        assert not any(os.path.exists(Path('test_db', name)) for name in sidecars)
+        # Une autre Database écrit entre-temps: la première relit le header avant de reconstruire
+        db.add_entry('t', {'A': 10, 'B': '10'})
+        reader.update_entries('t', 'A', 10, 'B', 'dix')
+        assert sorted(name for name in os.listdir('test_db') if name in sidecars) == sorted(sidecars)
+        assert db.select_entries('t', ('A',), 'id', 11) == [10]
+        assert db.select_entries('t', ('A',), 'B', 'dix') == [10]
+        assert db.aggregate('t', (('SUM', 'A'),)) == [(55,)]
+
+def test_add_entries():
+    db = fill_courses(get_programme_db())
+    expected = COURS_PATH.read_bytes()
+    db = get_programme_db()
+    db.add_entries('cours', [])
+    db.add_entries('cours', COURSES)
+    assert COURS_PATH.read_bytes() == expected
+    assert db.select_entry('cours', ('NOM',), 'id', 5) == 'Projet d\'informatique I'
+    with pytest.raises(ValueError):
+        db.add_entries('cours', [COURSES[0], {'MNEMONIQUE': 'x'}])
+    assert db.get_table_size('cours') == len(COURSES)
+
+def test_insert_to_batch():
+    from uldb import Interpreter
+    interpreter = Interpreter()
+    interpreter.db = get_programme_db()
+    interpreter.execute('insert_to(cours,(MNEMONIQUE=101,NOM="A, (b)",COORDINATEUR="C",CREDITS=5),'
+                        '(MNEMONIQUE=102,NOM="D",COORDINATEUR="E",CREDITS=10))')
+    assert interpreter.db.get_complete_table('cours') == [
+        {'MNEMONIQUE': 101, 'NOM': 'A, (b)', 'COORDINATEUR': 'C', 'CREDITS': 5, 'id': 1},
+        {'MNEMONIQUE': 102, 'NOM': 'D', 'COORDINATEUR': 'E', 'CREDITS': 10, 'id': 2},
+    ]
+
+def test_heap_format():
+    import os
+    from database import FieldType, TableFormat
+    db = get_empty_db('programme')
+    db.table_format = TableFormat.HEAP
+    db.create_table('cours', ('MNEMONIQUE', FieldType.INTEGER), ('NOM', FieldType.STRING),
+                    ('COORDINATEUR', FieldType.STRING), ('CREDITS', FieldType.INTEGER))
+    empty_size = COURS_PATH.stat().st_size
+    fill_courses(db)
+    # Les chaînes ne sont pas dans la table: seules les entrées s'y ajoutent
+    assert COURS_PATH.stat().st_size == empty_size + len(COURSES) * 4 * 7
+    assert os.path.getsize('programme/cours.strings') == sum(4 + len(c['NOM'].encode()) + len(c['COORDINATEUR'].encode())
+                                                             for c in COURSES)
+    db.update_entries('cours', 'MNEMONIQUE', 101, 'NOM', 'Programmation avancée')
+    db.update_entries('cours', 'MNEMONIQUE', 102, 'NOM', 'FDO')
+    other = get_db('programme')
+    assert other.get_table_signature('cours')[1] == ('NOM', FieldType.STRING)
+    assert other.select_entries('cours', ('NOM',), 'CREDITS', 10) == ['Programmation avancée', 'Algorithmique I']
+    assert other.get_entry('cours', 'NOM', 'FDO')['id'] == 2
+    other.delete_table('cours')
+    assert not os.path.exists('programme/cours.strings')
+
+def test_free_space_reuse():
+    import os
+    db = fill_courses(get_programme_db())
+    db.delete_entries('cours', 'MNEMONIQUE', 102)
+    db.delete_entries('cours', 'MNEMONIQUE', 105)
+    size = _get_table_size('programme/cours.table')
+    db.add_entries('cours', [COURSES[1], COURSES[3]])
+    assert _get_table_size('programme/cours.table') == size
+    # Sous des suppressions, insertions et modifications répétées, la table ne grandit plus
+    for i in range(20):
+        db.delete_entries('cours', 'MNEMONIQUE', 101)
+        db.add_entry('cours', COURSES[0])
+        db.update_entries('cours', 'MNEMONIQUE', 103, 'NOM', 'Algorithmique I' * 3)
+        db.update_entries('cours', 'MNEMONIQUE', 103, 'NOM', 'Algo I')
+        if i == 4: # Le string buffer a pu doubler une fois avant que ses places libres suffisent
+            size = _get_table_size('programme/cours.table')
+    assert _get_table_size('programme/cours.table') == size
+    other = get_db('programme')
+    assert sorted(entry['MNEMONIQUE'] for entry in other.get_complete_table('cours')) == [101, 102, 103, 105, 106]
+    assert other.select_entry('cours', ('NOM', 'id'), 'MNEMONIQUE', 101) == ('Programmation', 27)
+    assert other.select_entry('cours', ('NOM',), 'MNEMONIQUE', 103) == 'Algo I'
+
+def test_vacuum():
+    db = fill_courses(get_programme_db())
+    db.create_index('cours', 'CREDITS')
+    db.update_entries('cours', 'MNEMONIQUE', 101, 'NOM', 'Programmation' * 5)
+    db.delete_entries('cours', 'MNEMONIQUE', 103)
+    entries, size = db.get_complete_table('cours'), _get_table_size('programme/cours.table')
+    assert db.vacuum('cours') == size - _get_table_size('programme/cours.table') > 0
+    assert db.vacuum('cours') == 0
+    other = get_db('programme')
+    assert other.get_complete_table('cours') == entries
+    assert other.select_entries('cours', ('id',), 'CREDITS', 10) == [1]
+    assert other.get_entry('cours', 'id', 3) is None
+    db.add_entry('cours', COURSES[2])
+    assert other.select_entry('cours', ('MNEMONIQUE',), 'id', 6) == 103
+
+def test_vacuum_crash(monkeypatch):
+    import os
+    from database import FieldType, TableFormat
+    for table_format in (TableFormat.HEAP, TableFormat.COLUMNAR):
+        db = get_empty_db('programme')
+        db.create_table('cours', ('MNEMONIQUE', FieldType.INTEGER), ('NOM', FieldType.STRING),
+                        ('COORDINATEUR', FieldType.STRING), ('CREDITS', FieldType.INTEGER), table_format = table_format)
+        fill_courses(db)
+        db.create_index('cours', 'NOM')
+        db.delete_entries('cours', 'MNEMONIQUE', 101)
+        entries = db.get_complete_table('cours')
+        # Crash entre le remplacement du heap et celui de la table: la première Database qui la lit termine vacuum
+        replace = os.replace
+        def crash(source, destination):
+            if source.endswith('.table.tmp'):
+                raise KeyboardInterrupt
+            replace(source, destination)
+        monkeypatch.setattr(os, 'replace', crash)
+        with pytest.raises(KeyboardInterrupt):
+            db.vacuum('cours')
+        monkeypatch.setattr(os, 'replace', replace)
+        assert os.path.exists('programme/cours.vacuum') and not os.path.exists('programme/cours.strings.tmp')
+        other = get_db('programme')
+        assert other.get_complete_table('cours') == entries
+        assert other.get_entry('cours', 'NOM', 'Algorithmique I')['id'] == 3
+        assert not any(name.endswith(('.tmp', '.vacuum')) for name in os.listdir('programme'))
+        assert other.vacuum('cours') == 0
+        # Crash avant la validation: les nouveaux fichiers sont ignorés, l'ancienne table reste entière
+        other.delete_entries('cours', 'MNEMONIQUE', 102)
+        entries = other.get_complete_table('cours')
+        monkeypatch.setattr(other, '_sync_directory', lambda: (_ for _ in ()).throw(KeyboardInterrupt()))
+        with pytest.raises(KeyboardInterrupt):
+            other.vacuum('cours')
+        assert os.path.exists('programme/cours.table.tmp') and not os.path.exists('programme/cours.vacuum')
+        assert get_db('programme').get_complete_table('cours') == entries
+        get_db('programme').delete_table('cours')
+        assert not any(name.startswith('cours.') and name != 'cours.lock' for name in os.listdir('programme'))
+
+def test_iter_entries():
+    db = fill_courses(get_programme_db())
+    db.SCAN_CHUNK = 2
+    table = db.iter_table('cours')
+    assert next(table) == COURSES[0] | {'id': 1}
+    assert list(table) == [course | {'id': i} for i, course in enumerate(COURSES[1:], 2)]
+    assert list(db.iter_entries('cours', 'CREDITS', 10)) == db.get_entries('cours', 'CREDITS', 10)
+    assert list(db.iter_select('cours', ('id', 'NOM'), 'CREDITS', 5)) == [(2, COURSES[1]['NOM']), (4, COURSES[3]['NOM']),
+                                                                          (5, COURSES[4]['NOM'])]
+    with pytest.raises(ValueError):
+        next(db.iter_select('cours', ('PROF',), 'CREDITS', 0))
+
+def test_query_plans(capsys):
+    from query import Assignment, Group, Name, Parameter, parse, tokenize
+    from database import FieldType
+    from uldb import Interpreter
+    shape, values = tokenize('insert_to(cours,(NOM="a, (b)",CRED=-3))')
+    assert values == ['a, (b)', -3]
+    assert parse(shape).arguments == (Name('cours'), Group((Assignment('NOM', Parameter(0, FieldType.STRING)),
+                                                            Assignment('CRED', Parameter(1, FieldType.INTEGER)))))
+    assert tokenize('from_if_get(cours,CRED=5,NOM)')[0] == tokenize('from_if_get(cours, CRED=10, NOM)')[0]
+    interpreter = Interpreter()
+    interpreter.db = fill_courses(get_programme_db())
+    interpreter.execute('create_index(cours,CREDITS)')
+    interpreter.execute('from_if_get(cours,CREDITS=10,MNEMONIQUE)')
+    plan = interpreter.plans[tokenize('from_if_get(cours,CREDITS=10,MNEMONIQUE)')[0]]
+    assert (plan.access, plan.fields) == ('index', ('MNEMONIQUE',))
+    interpreter.execute('from_if_get(cours,CREDITS=5,MNEMONIQUE)')
+    assert len(interpreter.plans) == 1
+    interpreter.execute('from_if_get(cours,MNEMONIQUE="101",NOM)')
+    interpreter.execute('from_if_get(cours,CREDITS=5 NOM)')
+    output = capsys.readouterr()
+    assert output.out.split() == ['101', '103', '102', '105', '106']
+    assert output.err.count('Error: ') == 2 and len(interpreter.plans) == 1
+    # Un index supprimé par une autre Database invalide le plan en cache
+    get_db('programme').drop_index('cours', 'CREDITS')
+    interpreter.execute('explain(from_if_get(cours,CREDITS=10,MNEMONIQUE))')
+    assert capsys.readouterr().out.split()[2] == 'access=scan'
+    interpreter.execute('from_if_get(cours,CREDITS=10,MNEMONIQUE)')
+    assert capsys.readouterr().out.split() == ['101', '103']
+
+def test_predicates():
+    from predicate import Comparison, In, Not
+    db = fill_courses(get_programme_db())
+    mnemonics = lambda predicate: list(db.iter_select_where('cours', ('MNEMONIQUE',), predicate))
+    assert mnemonics(Comparison('CREDITS', '>=', 5) & Comparison('MNEMONIQUE', '<', 105)) == [101, 102, 103]
+    assert mnemonics(Comparison('NOM', '^=', 'Lang') | In('id', [1, 5])) == [101, 105, 106]
+    assert mnemonics(Not(Comparison('COORDINATEUR', '<', 'H'))) == [101, 103]
+    db.create_index('cours', 'CREDITS')
+    assert db.access_path('cours', In('CREDITS', [10, 0]) & Comparison('NOM', '!=', 'x')) == 'index'
+    assert db.access_path('cours', Comparison('CREDITS', '=', 10) | Comparison('NOM', '=', 'x')) == 'scan'
+    assert mnemonics(In('CREDITS', [10, 0]) & Comparison('NOM', '!=', 'Programmation')) == [103]
+    assert db.update_where('cours', In('id', [2, 4]), 'CREDITS', 6)
+    assert db.delete_where('cours', Comparison('CREDITS', '=', 6) & Comparison('NOM', '^=', 'Fonc'))
+    assert [entry['MNEMONIQUE'] for entry in db.iter_where('cours', Comparison('CREDITS', '>', 5))] == [101, 103, 105]
+    with pytest.raises(ValueError):
+        mnemonics(Comparison('CREDITS', '^=', 'x'))
+    with pytest.raises(ValueError):
+        db.delete_where('cours', In('PROF', [1]))
+    # Un prédicat qui ne définit pas compile ne peut pas être instancié
+    from predicate import Predicate
+    class Incomplete(Predicate):
+        def fields(self): return set()
+        def check(self, types): pass
+    with pytest.raises(TypeError):
+        Incomplete()
+
+def test_query_predicates(capsys):
+    from uldb import Interpreter
+    interpreter = Interpreter()
+    interpreter.db = fill_courses(get_programme_db())
+    interpreter.execute('from_if_get(cours,CREDITS>=5 AND NOT (MNEMONIQUE IN (101,102) OR NOM^="Lang"),MNEMONIQUE)')
+    interpreter.execute('from_update_where(cours,MNEMONIQUE>102 AND CREDITS=5,CREDITS=4)')
+    interpreter.execute('from_delete_where(cours,CREDITS<5 OR MNEMONIQUE=101)')
+    interpreter.execute('from_if_get(cours,CREDITS!=0,MNEMONIQUE)')
+    assert capsys.readouterr().out.split() == ['103', '106', '102', '103']
+
+def test_btree_index():
+    import os.path
+    import random
+    from btree import BTreeIndex
+    from database import IndexType
+    from predicate import Between, Comparison
+    db = fill_courses(get_programme_db())
+    db.create_index('cours', 'MNEMONIQUE', IndexType.BTREE)
+    db.create_index('cours', 'NOM', IndexType.BTREE)
+    assert os.path.isfile('programme/cours.MNEMONIQUE.btree')
+    assert db.access_path('cours', Between('MNEMONIQUE', 102, 105)) == 'index'
+    assert db.access_path('cours', Comparison('NOM', '^=', 'Lang')) == 'index'
+    assert db.access_path('cours', Comparison('MNEMONIQUE', '!=', 102)) == 'scan'
+    assert list(db.iter_select_where('cours', ('MNEMONIQUE',), Between('MNEMONIQUE', 102, 105))) == [102, 103, 105]
+    assert list(db.iter_select_where('cours', ('MNEMONIQUE',), Comparison('CREDITS', '>', 0), 'NOM', limit = 2)) == [103, 102]
+    db.add_entry('cours', COURSES[0] | {'MNEMONIQUE': 104})
+    db.update_entries('cours', 'MNEMONIQUE', 106, 'MNEMONIQUE', 100)
+    db.delete_entries('cours', 'MNEMONIQUE', 103)
+    for other in (db, get_db('programme')):
+        assert list(other.iter_select_where('cours', ('MNEMONIQUE',), Comparison('MNEMONIQUE', '>=', 0), 'MNEMONIQUE', True))\
+               == [105, 104, 102, 101, 100]
+        assert list(other.iter_select_where('cours', ('MNEMONIQUE',), Comparison('MNEMONIQUE', '<', 102))) == [101, 100]
+    with pytest.raises(ValueError):
+        next(db.iter_where('cours', Comparison('CREDITS', '>', 0), 'CREDITS', limit = -1))
+    # Assez d'entrées pour diviser les feuilles et la racine, dont des chaînes tronquées dans l'arbre
+    db.add_entries('cours', [COURSES[0] | {'MNEMONIQUE': random.randint(0, 999), 'NOM': 'x'*BTreeIndex.MAX_KEY + str(i)}
+                             for i in range(500)])
+    expected = sorted(entry['NOM'] for entry in db.iter_table('cours'))
+    assert list(db.iter_select_where('cours', ('NOM',), Comparison('id', '>', 0), 'NOM')) == expected
+    mnemonics = sorted(entry['MNEMONIQUE'] for entry in db.iter_table('cours'))
+    assert list(db.iter_select_where('cours', ('MNEMONIQUE',), Comparison('MNEMONIQUE', '>=', 0), 'MNEMONIQUE', True, 10))\
+           == mnemonics[::-1][:10]
+    assert sorted(db.iter_select_where('cours', ('MNEMONIQUE',), Between('MNEMONIQUE', 10, 20)))\
+           == [mnemonic for mnemonic in mnemonics if 10 <= mnemonic <= 20]
+    db.drop_index('cours', 'NOM')
+    assert not os.path.exists('programme/cours.NOM.btree')
+
+def test_query_order_by(capsys):
+    from uldb import Interpreter
+    interpreter = Interpreter()
+    interpreter.db = fill_courses(get_programme_db())
+    interpreter.execute('create_index(cours,MNEMONIQUE,BTREE)')
+    interpreter.execute('from_if_get(cours,MNEMONIQUE BETWEEN 102 AND 105,MNEMONIQUE) ORDER BY MNEMONIQUE DESC')
+    interpreter.execute('from_if_get(cours,CREDITS=5,MNEMONIQUE) ORDER BY NOM LIMIT 2')
+    interpreter.execute('from_if_get(cours,CREDITS=5,MNEMONIQUE) ORDER BY NOM LIMIT 1')
+    interpreter.execute('from_delete_where(cours,CREDITS=5) LIMIT 1')
+    interpreter.execute('create_index(cours,NOM,SORTED)')
+    output = capsys.readouterr()
+    assert output.out.split() == ['105', '103', '102', '102', '105', '102']
+    assert output.err.count('Error: ') == 2
+
+def test_aggregate():
+    from predicate import Comparison
+    db = fill_courses(get_programme_db())
+    assert db.aggregate('cours', (('COUNT', '*'),)) == [(5,)]
+    assert db.aggregate('cours', (('COUNT', '*'), ('SUM', 'CREDITS'), ('MIN', 'NOM'), ('MAX', 'MNEMONIQUE'))) \
+           == [(5, 35, 'Algorithmique I', 106)]
+    assert db.aggregate('cours', (('COUNT', 'NOM'), ('SUM', 'MNEMONIQUE')), group_by = ('CREDITS',)) == [(10, 2, 204), (5, 3, 313)]
+    assert db.aggregate('cours', (('MAX', 'COORDINATEUR'),), Comparison('MNEMONIQUE', '>', 102), ('CREDITS', 'NOM'))[0] \
+           == (10, 'Algorithmique I', 'Olivier Markowitch')
+    assert db.aggregate('cours', (('COUNT', '*'), ('MIN', 'CREDITS')), Comparison('CREDITS', '>', 10)) == [(0, None)]
+    assert db.aggregate('cours', (('COUNT', '*'),), Comparison('CREDITS', '>', 10), ('NOM',)) == []
+    for aggregates in ((('SUM', 'NOM'),), (('AVG', 'CREDITS'),), (('MAX', '*'),), (('COUNT', 'PROF'),)):
+        with pytest.raises(ValueError):
+            db.aggregate('cours', aggregates)
+
+def test_query_aggregate(capsys):
+    from query import Call, Name, parse, tokenize
+    from uldb import Interpreter
+    statement = parse(tokenize('from_if_aggregate(cours,COUNT(*)) GROUP BY CREDITS,NOM')[0])
+    assert statement.arguments[1] == Call('COUNT', (Name('*'),)) and statement.group == ('CREDITS', 'NOM')
+    interpreter = Interpreter()
+    interpreter.db = fill_courses(get_programme_db())
+    interpreter.execute('from_if_aggregate(cours,COUNT(*))')
+    interpreter.execute('from_if_aggregate(cours,CREDITS=5,SUM(MNEMONIQUE),MIN(NOM))')
+    interpreter.execute('from_if_aggregate(cours,COUNT(*)) GROUP BY CREDITS')
+    interpreter.execute('from_if_aggregate(cours,COUNT(*)) LIMIT 1')
+    interpreter.execute('from_if_aggregate(cours,CREDITS=5)')
+    output = capsys.readouterr()
+    assert output.out.splitlines() == ['5', "(313, 'Fonctionnement des ordinateurs')", '(10, 2)', '(5, 3)']
+    assert output.err.count('Error: ') == 2
+
+def test_join():
+    from database import FieldType, IndexType
+    db = fill_courses(get_programme_db())
+    db.create_table('inscriptions', ('COURS', FieldType.INTEGER), ('ETUDIANT', FieldType.STRING))
+    db.add_entries('inscriptions', [{'COURS': 103, 'ETUDIANT': 'Alice'}, {'COURS': 101, 'ETUDIANT': 'Bob'},
+                                    {'COURS': 103, 'ETUDIANT': 'Bob'}, {'COURS': 104, 'ETUDIANT': 'Eve'}])
+    expected = [(101, 'Bob'), (103, 'Alice'), (103, 'Bob')]
+    joined = lambda: sorted(db.join('cours', 'inscriptions', ('MNEMONIQUE', 'COURS'), (('MNEMONIQUE',), ('ETUDIANT',))))
+    assert joined() == expected
+    db.create_index('cours', 'MNEMONIQUE')
+    assert joined() == expected
+    db.drop_index('cours', 'MNEMONIQUE')
+    db.create_index('inscriptions', 'COURS', IndexType.BTREE)
+    assert joined() == expected
+    left, right = min(db.join('inscriptions', 'cours', ('COURS', 'MNEMONIQUE')), key = lambda pair: pair[0]['id'])
+    assert (left['ETUDIANT'], right) == ('Alice', COURSES[2] | {'id': 3})
+    assert sorted(db.join('inscriptions', 'inscriptions', 'ETUDIANT', (('id',), ('id',)))) \
+           == [(1, 1), (2, 2), (2, 3), (3, 2), (3, 3), (4, 4)]
+    assert list(db.join('inscriptions', 'cours', ('id', 'id'), ((), ('CREDITS',)))) == [10, 5, 10, 5]
+    with pytest.raises(ValueError):
+        next(db.join('cours', 'inscriptions', ('NOM', 'COURS')))
+    # Les tables ne restent pas verrouillées entre deux paquets, mais une jointure ne peut pas reprendre
+    db.SCAN_CHUNK = 1
+    pairs = db.join('inscriptions', 'cours', ('COURS', 'MNEMONIQUE'), (('ETUDIANT',), ()))
+    assert next(pairs) in ('Alice', 'Bob')
+    get_db('programme').add_entry('inscriptions', {'COURS': 101, 'ETUDIANT': 'Eve'})
+    with pytest.raises(ValueError):
+        list(pairs)
+
+def test_query_join(capsys):
+    from uldb import Interpreter
+    interpreter = Interpreter()
+    interpreter.db = fill_courses(get_programme_db())
+    interpreter.execute('create_table(inscriptions,COURS=INTEGER,ETUDIANT=STRING)')
+    interpreter.execute('insert_to(inscriptions,(COURS=102,ETUDIANT="Alice"),(COURS=107,ETUDIANT="Bob"))')
+    interpreter.execute('join(cours,inscriptions,MNEMONIQUE=COURS,inscriptions.ETUDIANT,cours.CREDITS)')
+    interpreter.execute('join(cours,inscriptions,MNEMONIQUE=COURS,NOM)')
+    interpreter.execute('join(cours,inscriptions,MNEMONIQUE=ETUDIANT)')
+    output = capsys.readouterr()
+    assert output.out.splitlines() == ["('Alice', 5)"]
+    assert output.err.count('Error: ') == 2
+
+def test_journal():
+    import os
+    from database import JournalMode
+    db = get_programme_db()
+    db.journal_mode = JournalMode.GROUP
+    size = os.path.getsize(COURS_PATH)
+    fill_courses(db)
+    # Les opérations sont appliquées à la table mais pas encore synchronisées: une autre Database les lit aussitôt
+    assert os.path.getsize(COURS_PATH) > size and db._journal.pending == len(COURSES) and not db._held
+    assert db.get_complete_table('cours') == [course | {'id': i + 1} for i, course in enumerate(COURSES)]
+    assert db.get_entry('cours', 'id', 3)['NOM'] == 'Algorithmique I'
+    db.sync()
+    assert db._journal.pending == 0
+    # Une opération interrompue par une exception est annulée entièrement
+    with pytest.raises(RuntimeError):
+        with db._operation():
+            db.add_entry('cours', COURSES[0])
+            db.delete_entries('cours', 'CREDITS', 5)
+            raise RuntimeError
+    assert db.get_table_size('cours') == len(COURSES)
+    db.journal_mode = JournalMode.SYNC
+    db.update_entries('cours', 'MNEMONIQUE', 101, 'NOM', 'Programmation et algorithmique')
+    assert db._journal.pending == 0
+    assert get_db('programme').get_entry('cours', 'id', 1)['NOM'] == 'Programmation et algorithmique'
+
+def _read_courses(_) -> list[int]:
+    db = get_db('programme')
+    db.LOCK_TIMEOUT = 0.05
+    return [entry['MNEMONIQUE'] for entry in db.get_complete_table('cours')]
+
+def test_group_commit():
+    import multiprocessing
+    from database import JournalMode
+    db = get_programme_db()
+    db.journal_mode = JournalMode.GROUP
+    # Une seule écriture en attente de fsync ne bloque pas la lecture de la table par un autre processus
+    db.add_entry('cours', COURSES[0])
+    assert db._journal.pending == 1
+    with multiprocessing.get_context('fork').Pool(1) as pool:
+        assert pool.map(_read_courses, [0]) == [[101]]
+    db.add_entry('cours', COURSES[1])
+    with multiprocessing.get_context('fork').Pool(1) as pool:
+        assert pool.map(_read_courses, [0]) == [[101, 102]]
+    assert db._journal.pending == 2
+    db.close()
+
+def test_journal_replay():
+    import os
+    from database import FieldType, JournalMode
+    db = get_empty_db('test_db')
+    db.create_table('t', ('x', FieldType.INTEGER), ('s', FieldType.STRING))
+    db.journal_mode = JournalMode.GROUP
+    db.add_entry('t', {'x': 0, 's': 'zéro'})
+    db.sync()
+    before = {name: Path('test_db', name).read_bytes() for name in os.listdir('test_db')}
+    db.add_entries('t', [{'x': i, 's': str(i)*i} for i in range(1, 40)])
+    db.delete_entries('t', 'x', 2)
+    expected, complete = db.get_complete_table('t'), Path('test_db', 'uldb.wal').read_bytes()
+    db.update_entries('t', 'x', 3, 's', 'trois')
+    wal = Path('test_db', 'uldb.wal').read_bytes()
+    db.close()
+    # Crash simulé: les fichiers n'ont pas reçu les opérations et la dernière est coupée au milieu de son écriture
+    for name, content in before.items():
+        Path('test_db', name).write_bytes(content)
+    Path('test_db', 'uldb.wal').write_bytes(wal[:(len(complete) + len(wal))//2])
+    db = get_db('test_db')
+    assert db.get_complete_table('t') == expected
+    assert os.path.getsize(Path('test_db', 'uldb.wal')) == 0
+
+def test_transaction():
+    import os
+    db = get_programme_db()
+    size = os.path.getsize(COURS_PATH)
+    with db.transaction():
+        fill_courses(db)
+        db.update_entries('cours', 'CREDITS', 5, 'CREDITS', 6)
+        assert db.get_table_size('cours') == len(COURSES)
+        assert os.path.getsize(COURS_PATH) == size
+        with pytest.raises(ValueError):
+            db.create_index('cours', 'NOM')
+    assert db._journal.pending == 0 and os.path.getsize(COURS_PATH) > size
+    assert [entry['CREDITS'] for entry in get_db('programme').get_complete_table('cours')] == [10, 6, 10, 6, 6]
+    # Une exception dans le bloc ne laisse aucune trace
+    with pytest.raises(RuntimeError):
+        with db.transaction():
+            db.delete_entries('cours', 'CREDITS', 6)
+            assert db.get_table_size('cours') == 2
+            raise RuntimeError
+    assert db.get_table_size('cours') == len(COURSES)
+    # Une instruction qui échoue annule toute la transaction
+    db.begin()
+    db.add_entry('cours', COURSES[0])
+    with pytest.raises(ValueError):
+        db.add_entry('cours', {'MNEMONIQUE': 'cent'})
+    with pytest.raises(ValueError):
+        db.add_entry('cours', COURSES[1])
+    with pytest.raises(ValueError):
+        db.commit()
+    assert db.get_table_size('cours') == len(COURSES)
+    with pytest.raises(ValueError):
+        db.rollback()
+
+def test_query_transaction(capsys):
+    from uldb import Interpreter
+    interpreter = Interpreter()
+    interpreter.db = fill_courses(get_programme_db())
+    for line in ('begin()', 'from_delete_where(cours,CREDITS=5)', 'from_if_aggregate(cours,COUNT(*))', 'rollback()',
+                 'from_if_aggregate(cours,COUNT(*))', 'begin()', 'begin()', 'from_update_where(cours,id=1,CREDITS=1)',
+                 'commit()', 'commit()', 'from_if_get(cours,id=1,CREDITS)'):
+        interpreter.execute(line)
+    output = capsys.readouterr()
+    assert output.out.splitlines() == ['2', '5', '1']
+    assert output.err.count('Error: ') == 2
+
+def _insert_courses(worker: int) -> None:
+    db = get_db('programme')
+    for i in range(40):
+        db.add_entry('cours', COURSES[i % len(COURSES)] | {'MNEMONIQUE': 1000*worker + i})
+
+def test_locks():
+    import multiprocessing
+    from predicate import Comparison
+    db = fill_courses(get_programme_db())
+    other = get_db('programme')
+    other.LOCK_TIMEOUT = 0.05
+    # Un parcours ne verrouille la table que pendant la lecture d'un paquet: entre deux paquets, même abandonné,
+    # il ne bloque pas les écritures et reprend ensuite après sa dernière entrée
+    db.SCAN_CHUNK = 2
+    table = db.iter_select_where('cours', ('MNEMONIQUE',), Comparison('CREDITS', '>', 0))
+    assert [next(table), next(table)] == [101, 102]
+    other.add_entry('cours', COURSES[0])
+    other.delete_entries('cours', 'MNEMONIQUE', 103)
+    assert list(table) == [105, 106, 101]
+    assert db.get_table_size('cours') == len(COURSES)
+    ordered = db.iter_select_where('cours', ('MNEMONIQUE',), Comparison('CREDITS', '>', 0), 'MNEMONIQUE')
+    assert [next(ordered), next(ordered)] == [101, 101]
+    other.add_entry('cours', COURSES[2])
+    with pytest.raises(ValueError):
+        list(ordered)
+    abandoned = db.iter_table('cours')
+    next(abandoned)
+    other.add_entry('cours', COURSES[1])
+    assert db.get_table_size('cours') == len(COURSES) + 2
+    # Des processus qui écrivent en même temps ne corrompent pas la table
+    with multiprocessing.get_context('fork').Pool(4) as pool:
+        pool.map(_insert_courses, range(1, 5))
+    entries = db.get_complete_table('cours')
+    assert len(entries) == db.get_table_size('cours') == len(COURSES) + 2 + 4*40
+    assert sorted(entry['id'] for entry in entries) == [i for i in range(1, len(entries) + 2) if i != 3]
+    assert sorted(entry['MNEMONIQUE'] for entry in entries)[-40:] == list(range(4000, 4040))
+
+def _try_insert_course(_) -> tuple[str, int]:
+    db = get_db('programme')
+    db.LOCK_TIMEOUT = 0.05
+    try:
+        db.add_entry('cours', COURSES[0])
+    except TimeoutError:
+        return 'locked', db.get_table_size('cours')
+    return 'written', db.get_table_size('cours')
+
+def test_lock_upgrade():
+    import multiprocessing
+    db = fill_courses(get_programme_db())
+    # Écrire dans une table pendant sa lecture est refusé, sans perdre le verrou partagé de la lecture:
+    # un autre processus peut toujours lire la table, mais pas y écrire
+    with db._open_table('cours'):
+        with pytest.raises(ValueError):
+            db.add_entry('cours', COURSES[0])
+        with multiprocessing.get_context('fork').Pool(1) as pool:
+            assert pool.map(_try_insert_course, [0]) == [('locked', len(COURSES))]
+        assert db.get_table_size('cours') == len(COURSES)
+    with multiprocessing.get_context('fork').Pool(1) as pool:
+        assert pool.map(_try_insert_course, [0]) == [('written', len(COURSES) + 1)]
+    assert db.get_table_size('cours') == len(COURSES) + 1
+
+def test_bench():
+    import bench
+    results = bench.run([50], string_length = 8, samples = 10, budget = 0.5)
+    assert results['add_entries@50']['samples'] == 1 and results['delete_entries@50']['samples'] == 10
+    assert all(result['p50'] <= result['p99'] for result in results.values())
+    assert bench.compare(results, results, 0.25) == []
+    slower = {key: result | {'throughput': result['throughput'] / 2} for key, result in results.items()}
+    assert len(bench.compare(slower, results, 0.25)) == len(results)
+    assert bench.compare(slower, results, 0.6) == []
+
+def test_stats(capsys):
+    from uldb import Interpreter
+    db = get_programme_db()
+    with pytest.raises(ValueError):
+        db.stats()
+    db.collect_stats()
+    fill_courses(db)
+    db.update_entries('cours', 'MNEMONIQUE', 101, 'NOM', 'Programmation' * 10) # Agrandit le string buffer
+    assert [entry['id'] for entry in db.iter_entries('cours', 'CREDITS', 5)] == [2, 4, 5]
+    stats = db.stats()
+    assert stats['add_entry']['calls'] == len(COURSES) and 'add_entries' not in stats # Seul l'appel externe compte
+    assert stats['add_entry']['bytes_written'] > 0
+    assert stats['update_entries']['string_buffer_resizes'] == 1
+    assert stats['iter_entries']['calls'] == 1 and stats['iter_entries']['entries_visited'] == len(COURSES)
+    assert all(totals['seconds'] > 0 for totals in stats.values())
+    db.collect_stats(False)
+    db.get_table_size('cours')
+    with pytest.raises(ValueError):
+        db.stats()
+    interpreter = Interpreter()
+    interpreter.db = db
+    for line in ('stats(ON)', 'from_if_get(cours,CREDITS=10,NOM)', 'stats()'):
+        interpreter.execute(line)
+    lines = capsys.readouterr().out.splitlines()
+    assert 'iter_select_where: calls=1 ' in '\n'.join(lines) and 'entries_visited=5' in lines[-1]
+
+def test_explain_profile(capsys):
+    from uldb import Interpreter
+    from database import IndexType
+    interpreter = Interpreter()
+    interpreter.db = fill_courses(get_programme_db())
+    interpreter.db.create_index('cours', 'CREDITS', IndexType.HASH)
+    for line in ('explain(from_if_get(cours,NOM^="Prog",MNEMONIQUE))', 'explain(from_if_get(cours,CREDITS=10,NOM,id))',
+                 'explain(from_delete_where(cours,CREDITS=5))', 'explain(from_if_aggregate(cours,COUNT(*)))'):
+        interpreter.execute(line)
+    assert capsys.readouterr().out.splitlines() == [
+        'from_if_get: table=cours access=scan estimated_rows=5 fields=MNEMONIQUE',
+        'from_if_get: table=cours access=index estimated_rows=2 fields=NOM,id',
+        'from_delete_where: table=cours access=index estimated_rows=3',
+        'from_if_aggregate: table=cours access=header estimated_rows=0']
+    assert interpreter.db.get_table_size('cours') == len(COURSES) # explain n'exécute rien
+    interpreter.execute('profile(from_if_get(cours,CREDITS=10,MNEMONIQUE) ORDER BY MNEMONIQUE DESC)')
+    output = capsys.readouterr().out.splitlines()
+    assert output[:2] == ['103', '101']
+    profile = dict(item.split('=') for item in output[2].split()[1:])
+    assert list(profile) == ['parse', 'plan', 'scan', 'decode', 'output', 'rows_scanned', 'rows_returned', 'bytes_read']
+    assert (profile['rows_scanned'], profile['rows_returned']) == ('2', '2') and int(profile['bytes_read']) > 0
+    interpreter.execute('profile(open(programme))')
+    assert capsys.readouterr().err.startswith('Error: ')
+
+def test_columnar_format():
+    import os
+    from database import FieldType, TableFormat
+    from predicate import Comparison
+    db = get_empty_db('programme')
+    db.table_format = TableFormat.COLUMNAR
+    db.create_table('cours', ('MNEMONIQUE', FieldType.INTEGER), ('NOM', FieldType.STRING),
+                    ('COORDINATEUR', FieldType.STRING), ('CREDITS', FieldType.INTEGER))
+    fill_courses(db)
+    assert os.path.getsize('programme/cours.CREDITS.col') == len(COURSES) * 4
+    db.update_entries('cours', 'MNEMONIQUE', 101, 'NOM', 'Programmation avancée')
+    db.update_entries('cours', 'MNEMONIQUE', 103, 'CREDITS', 15)
+    db.delete_entries('cours', 'MNEMONIQUE', 102)
+    other = get_db('programme')
+    assert other.select_entries('cours', ('NOM',), 'CREDITS', 5) == ['Langages de programmation I', 'Projet d\'informatique I']
+    assert list(other.iter_select_where('cours', ('id', 'NOM'), Comparison('CREDITS', '>', 5))) \
+           == [(1, 'Programmation avancée'), (3, 'Algorithmique I')]
+    assert other.aggregate('cours', (('COUNT', '*'), ('SUM', 'CREDITS'))) == [(4, 35)]
+    assert other.aggregate('cours', (('MAX', 'NOM'),), Comparison('MNEMONIQUE', '<', 105)) == [('Programmation avancée',)]
+    entries = other.get_complete_table('cours')
+    other.vacuum('cours')
+    # Les colonnes supprimées par vacuum sont reconstruites à la réouverture
+    assert get_db('programme').get_complete_table('cours') == entries
+    assert get_db('programme').select_entries('cours', ('MNEMONIQUE',), 'CREDITS', 15) == [103]
+    other.delete_table('cours')
+    assert [name for name in os.listdir('programme') if name.startswith('cours.')] == ['cours.lock']
+
+def test_create_table_format(capsys):
+    import os
+    from database import FieldType, TableFormat
+    from uldb import Interpreter
+    db = get_empty_db('programme')
+    db.create_table('heap', ('A', FieldType.STRING), table_format = TableFormat.HEAP)
+    assert db.table_format is TableFormat.ULDB and os.path.exists('programme/heap.strings')
+    interpreter = Interpreter()
+    interpreter.db = db
+    interpreter.execute('create_table(cours,MNEMONIQUE=INTEGER,NOM=STRING,COLUMNAR)')
+    interpreter.execute('create_table(uldb,MNEMONIQUE=INTEGER)')
+    interpreter.execute('create_table(other,MNEMONIQUE=INTEGER,CSV)')
+    assert capsys.readouterr().err == 'Error: the table format should be ULDB, HEAP or COLUMNAR\n'
+    assert os.path.exists('programme/cours.NOM.col') and not os.path.exists('programme/uldb.strings')
+    interpreter.execute('insert_to(cours,MNEMONIQUE=101,NOM="Programmation")')
+    interpreter.execute('from_if_get(cours,MNEMONIQUE=101,NOM)')
+    assert capsys.readouterr().out.split() == ['Programmation']
+    assert sorted(db.list_tables()) == ['cours', 'heap', 'uldb']
+
+def test_zone_maps():
+    from database import FieldType, TableFormat
+    from predicate import Between, Comparison
+    from zone import ZONE_SIZE
+    db = get_empty_db('programme')
+    for table_format in (TableFormat.ULDB, TableFormat.COLUMNAR):
+        db.create_table('notes', ('NUMERO', FieldType.INTEGER), ('NOM', FieldType.STRING), table_format = table_format)
+        db.add_entries('notes', [{'NUMERO': i, 'NOM': f'etudiant {i}'} for i in range(3*ZONE_SIZE)])
+        # Seule la zone qui contient la valeur cherchée est lue: les autres sont écartées par leurs minimum et maximum
+        # ou par leur filtre de Bloom (ces chaînes n'y donnent pas de faux positif)
+        for field_name, value, expected in (('NUMERO', 2500, [2501]), ('NOM', 'etudiant 42', [43]), ('NOM', 'etudiant 2000', [2001])):
+            with db.profiling() as stats:
+                assert db.select_entries('notes', ('id',), field_name, value) == expected
+            assert stats.entries_visited == ZONE_SIZE
+        # Une chaîne absente de la table est rejetée par le filtre de Bloom de toutes les zones: rien n'est lu
+        assert db._headers['notes'].zones.candidates('NOM', '=', 'absent') == set()
+        with db.profiling() as stats:
+            assert db.select_entries('notes', ('id',), 'NOM', 'absent') == []
+        assert stats.entries_visited == 0
+        assert db.estimate_rows('notes', Comparison('NOM', '=', 'absent')) == 0
+        assert db.estimate_rows('notes', Between('NUMERO', 10, 20)) == ZONE_SIZE
+        assert db.estimate_rows('notes', Comparison('NUMERO', '!=', 20)) == 3*ZONE_SIZE
+        # Une modification élargit le résumé de sa zone, une suppression le laisse valide
+        db.update_entries('notes', 'id', 1, 'NUMERO', 99999)
+        db.update_entries('notes', 'id', 2, 'NOM', 'nouveau')
+        db.delete_entries('notes', 'NUMERO', 2500)
+        other = get_db('programme')
+        assert other.select_entries('notes', ('id',), 'NUMERO', 99999) == [1]
+        assert other.select_entries('notes', ('id',), 'NOM', 'nouveau') == [2]
+        assert other.get_entries('notes', 'NUMERO', 2500) == []
+        assert other._headers['notes'].zones.stale()
+        other.vacuum('notes')
+        assert not other._headers['notes'].zones.stale()
+        assert get_db('programme').select_entries('notes', ('id',), 'NUMERO', 99999) == [1]
+        db.delete_table('notes')
+
+def test_journal_mode_change():
+    from database import JournalMode
+    db = fill_courses(get_programme_db())
+    assert db._handles['cours'].journal is None
+    db.journal_mode = JournalMode.SYNC
+    # Les fichiers déjà ouverts sont rouverts attachés au journal
+    db.add_entry('cours', COURSES[0])
+    assert db._handles['cours'].journal is db._journal and db._headers['cours'].id_map.journal is db._journal
+    db.journal_mode = JournalMode.GROUP
+    db.add_entry('cours', COURSES[1])
+    assert db._journal.pending == 1
+    with db.transaction():
+        with pytest.raises(ValueError):
+            db.journal_mode = JournalMode.OFF
+    db.journal_mode = JournalMode.OFF
+    assert db._journal.pending == 0 and get_db('programme').get_table_size('cours') == len(COURSES) + 2
+    db.add_entry('cours', COURSES[2])
+    assert db._handles['cours'].journal is None
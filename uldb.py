@@ -0,0 +1,140 @@
+"""Interpréteur du langage de requêtes ULDB.
+
+Usage: python3 uldb.py [script.uldb]
+Sans paramètre, les instructions sont lues en mode interactif jusqu'à quit (ou q).
+Toute instruction peut être passée à explain(instruction), qui affiche son plan sans l'exécuter, ou à
+profile(instruction), qui l'exécute puis affiche le temps de chacune de ses phases et ce qu'elle a lu.
+"""
+from database import Database
+from query import Name, Plan, Shape, UldbError, parse, plan, tokenize
+from collections import OrderedDict
+from time import perf_counter
+import sys
+
+PROMPT = 'uldb:: '
+WRAPPERS = ('explain', 'profile') # Instructions qui reçoivent une autre instruction
+
+
+class Interpreter:
+    """Exécute les instructions ULDB sur la DB ouverte (une seule par session).
+       Les plans des instructions sont gardés en cache par forme (cf. query): une instruction qui ne diffère d'une
+       précédente que par ses valeurs littérales n'est ni réanalysée ni recompilée, tant que le schéma de ses tables
+       n'a pas changé, même par une autre Database."""
+    PLAN_CACHE_SIZE = 128 # Nombre de plans gardés en cache
+
+    def __init__(self):
+        """Constructeur de Interpreter"""
+        self.db: Database | None = None
+        self.plans: OrderedDict[Shape, Plan] = OrderedDict() # Du moins au plus récemment utilisé
+
+
+    def execute(self, line: str) -> None:
+        """Exécute l'instruction line, en affichant un message d'erreur si elle est invalide."""
+        try:
+            start = perf_counter()
+            shape, values = tokenize(line)
+            if len(shape) > 3 and shape[0] in WRAPPERS and shape[1] == '(' and shape[-1] == ')':
+                # Les valeurs littérales de l'instruction reçue gardent leurs positions: son plan est celui du cache
+                getattr(self, shape[0])(shape[2:-1], values, start)
+                return
+            compiled = self.compile(shape)
+            for result in compiled.execute(values):
+                print(result)
+            if compiled.changes_schema:
+                self.plans.clear()
+        except (UldbError, ValueError, TypeError, TimeoutError) as error:
+            print(f"Error: {error}", file = sys.stderr)
+
+
+    def compile(self, shape: Shape) -> Plan:
+        """Renvoie le plan de l'instruction de forme shape, en le compilant s'il n'est pas en cache."""
+        if shape in self.plans:
+            cached = self.plans[shape]
+            if cached.versions == self.versions(cached.tables):
+                self.plans.move_to_end(shape)
+                return cached
+            del self.plans[shape] # Un index ou une table a changé: le chemin d'accès et les champs sont à revoir
+        statement = parse(shape)
+        if statement.command == 'open':
+            return Plan('open', lambda values: self.open(*statement.arguments))
+        if self.db is None:
+            raise UldbError("no database is open")
+        compiled = plan(statement, self.db)
+        compiled.versions = self.versions(compiled.tables)
+        self.plans[shape] = compiled
+        while len(self.plans) > self.PLAN_CACHE_SIZE:
+            self.plans.popitem(last = False)
+        return compiled
+
+
+    def versions(self, tables: tuple[str, ...]) -> tuple[int, ...]:
+        """Renvoie les versions actuelles du schéma des tables tables."""
+        return tuple(self.db.schema_version(table) for table in tables)
+
+
+    def explain(self, shape: Shape, values: list[int | str], start: float) -> None:
+        """explain(instruction): affiche le plan de l'instruction de forme shape (cf. Plan.describe), sans l'exécuter."""
+        print(self.compile(shape).describe(values))
+
+
+    def profile(self, shape: Shape, values: list[int | str], start: float) -> None:
+        """profile(instruction): exécute l'instruction de forme shape, dont le découpage a commencé au temps start,
+           puis affiche le temps (en secondes) de chacune de ses phases: analyse, planification (faite même si le plan
+           est en cache), parcours des entrées, décodage des champs et affichage. Affiche aussi les entrées parcourues,
+           les résultats et les bytes lus."""
+        statement = parse(shape)
+        if statement.command == 'open':
+            raise UldbError("open can not be profiled")
+        if self.db is None:
+            raise UldbError("no database is open")
+        planned = perf_counter()
+        compiled = plan(statement, self.db)
+        with self.db.profiling() as stats:
+            executed = perf_counter()
+            output_seconds, rows_returned = 0.0, 0
+            for result in compiled.execute(values):
+                printed = perf_counter()
+                print(result)
+                output_seconds += perf_counter() - printed
+                rows_returned += 1
+            execution_seconds = perf_counter() - executed - output_seconds
+        if compiled.changes_schema:
+            self.plans.clear()
+        phases = {'parse': planned - start, 'plan': executed - planned, 'scan': execution_seconds - stats.decode_seconds,\
+                  'decode': stats.decode_seconds, 'output': output_seconds}
+        print(' '.join([f"{statement.command}:"] + [f"{phase}={seconds:.6f}" for phase, seconds in phases.items()]\
+                       + [f"rows_scanned={stats.entries_visited}", f"rows_returned={rows_returned}", f"bytes_read={stats.bytes_read}"]))
+
+
+    def open(self, db_name: Name) -> tuple:
+        """open(db_name): ouvre la DB de nom db_name."""
+        if self.db is not None:
+            raise UldbError(f"the database {self.db.name} is already open")
+        if not isinstance(db_name, Name):
+            raise UldbError("a database name was expected")
+        self.db = Database(db_name.name)
+        return ()
+
+
+def main() -> None:
+    """Lance l'interpréteur en mode script (si un fichier est donné) ou en mode interactif."""
+    interpreter = Interpreter()
+    if len(sys.argv) > 1:
+        with open(sys.argv[1], encoding = 'utf-8') as script:
+            for line in script:
+                if line.strip():
+                    interpreter.execute(line)
+        return
+    while True:
+        try:
+            line = input(PROMPT)
+        except EOFError:
+            break
+        if line.strip() in ('quit', 'q'):
+            break
+        if line.strip():
+            interpreter.execute(line)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,341 @@
+"""Journal (write-ahead log) des DB ULDB.
+
+Quand il est activé (cf. Database.journal_mode), les écritures d'une opération dans les fichiers de la DB ne sont pas faites
+en place: elles modifient des copies en mémoire des pages touchées, que les lectures voient, et sont ajoutées d'un bloc
+au fichier <db>/uldb.wal à la fin de l'opération. Elles sont appliquées aux fichiers une fois le journal synchronisé
+sur le disque (fsync) après chaque opération, ou sans attendre la synchronisation d'un groupe d'opérations (cf. apply).
+Après un crash, les opérations complètes du journal sont rejouées à l'ouverture de la DB et une opération incomplète
+est ignorée: une opération est donc écrite entièrement ou pas du tout.
+Le journal n'a qu'un propriétaire à la fois: la Database qui y écrit le verrouille (cf. lock) jusqu'à ce qu'il soit vidé.
+"""
+from binary import BinaryFile
+from contextlib import contextmanager
+from lock import lock, unlock
+from typing import Iterator
+import os
+import struct
+import zlib
+
+WAL_MAGIC = b'ULDW'
+FRAME = struct.Struct('<4sII') # Une opération: magic, taille de ses enregistrements, CRC32 de ceux-ci
+RECORD = struct.Struct('<bH') # Type de l'enregistrement, longueur du nom du fichier (qui suit)
+WRITE, TRUNCATE = 1, 2
+WRITE_HEADER = struct.Struct('<qI') # Écriture: position, nombre de bytes (qui suivent)
+TRUNCATE_SIZE = struct.Struct('<q') # Troncature: nouvelle taille du fichier
+
+
+class Journal:
+    """Journal des écritures d'une DB. Les fichiers journalisés sont les BinaryFile attachés à ce journal
+       (cf. BinaryFile.journal), désignés par leur nom dans le dossier de la DB."""
+    PAGE_SIZE = 4096
+    CHECKPOINT_SIZE = 1 << 24 # Taille du journal à partir de laquelle les fichiers sont synchronisés et le journal vidé
+    LOCK_TIMEOUT = 10.0 # Secondes d'attente maximale du verrou du journal
+
+    def __init__(self, directory: str):
+        """Constructeur de Journal, le fichier du journal n'est ouvert qu'au premier besoin."""
+        self.directory, self.path = directory, os.path.join(directory, 'uldb.wal')
+        self.pages: dict[str, dict[int, bytearray]] = {} # Pages modifiées mais pas encore appliquées, par fichier
+        self.sizes: dict[str, int] = {} # Taille des fichiers qui ont des pages modifiées
+        self.floors: dict[str, int] = {} # Au-delà de cette position, le contenu sur le disque a été coupé (il vaut 0)
+        self.records: list[bytes] = [] # Enregistrements de l'opération en cours
+        self.before: dict[tuple[str, int], bytearray | None] = {} # Pages avant l'opération en cours, pour l'annuler
+        self.sizes_before: dict[str, tuple[int | None, int | None]] = {}
+        self.depth = 0 # Nombre d'opérations imbriquées en cours
+        self.pending = 0 # Nombre d'opérations écrites dans le journal mais pas encore synchronisées
+        self.touched: set[str] = set() # Fichiers modifiés depuis le dernier checkpoint
+        self.wal_fd: int | None = None
+        self.owned = False # Le journal est verrouillé par cette instance: il contient (peut-être) ses opérations
+
+
+    @contextmanager
+    def operation(self) -> Iterator[None]:
+        """Regroupe les écritures faites dans le bloc (y compris dans des opérations imbriquées) en une seule opération,
+           ajoutée au journal à la fin du bloc. Si le bloc lance une exception, ses écritures sont annulées."""
+        self.begin()
+        try:
+            yield
+        except BaseException:
+            self.end(abort = True)
+            raise
+        self.end()
+
+
+    def begin(self) -> None:
+        """Commence une opération, éventuellement imbriquée dans une autre (cf. operation)."""
+        self.depth += 1
+
+
+    def end(self, abort: bool = False) -> None:
+        """Termine l'opération commencée par le dernier begin. Si c'est la plus englobante, ses écritures sont ajoutées
+           au journal, ou annulées si abort est vrai."""
+        self.depth -= 1
+        if self.depth:
+            return
+        if abort:
+            self.abort()
+        else:
+            self.commit()
+
+
+    def write(self, binary_file: BinaryFile, pos: int, data: bytes) -> None:
+        """Écrit data à la position pos du fichier binary_file dans ses pages en mémoire."""
+        if not self.depth:
+            with self.operation():
+                return self.write(binary_file, pos, data)
+        name, PAGE_SIZE, END = binary_file.journal_name, self.PAGE_SIZE, pos + len(data)
+        self._save_size(binary_file)
+        pages = self.pages.setdefault(name, {})
+        for page in range(pos // PAGE_SIZE, (END - 1) // PAGE_SIZE + 1):
+            PAGE_START = page*PAGE_SIZE
+            if page not in pages:
+                self.before.setdefault((name, page), None)
+                pages[page] = bytearray(self._read_on_disk(binary_file, PAGE_SIZE, PAGE_START))
+            elif (name, page) not in self.before:
+                self.before[(name, page)] = bytearray(pages[page])
+            start, stop = max(pos, PAGE_START), min(END, PAGE_START + PAGE_SIZE)
+            pages[page][start - PAGE_START:stop - PAGE_START] = data[start - pos:stop - pos]
+        self.sizes[name] = max(self.sizes[name], END)
+        encoded_name = name.encode()
+        self.records.append(RECORD.pack(WRITE, len(encoded_name)) + encoded_name + WRITE_HEADER.pack(pos, len(data)) + data)
+
+
+    def truncate(self, binary_file: BinaryFile, size: int) -> None:
+        """Change la taille du fichier binary_file en size bytes dans ses pages en mémoire."""
+        if not self.depth:
+            with self.operation():
+                return self.truncate(binary_file, size)
+        name = binary_file.journal_name
+        self._save_size(binary_file)
+        pages = self.pages.setdefault(name, {})
+        # Les bytes coupés doivent se relire comme des zéros si le fichier grandit à nouveau
+        for page in [page for page in pages if (page + 1)*self.PAGE_SIZE > size]:
+            self.before.setdefault((name, page), bytearray(pages[page]))
+            START = max(size - page*self.PAGE_SIZE, 0)
+            pages[page][START:] = bytes(self.PAGE_SIZE - START)
+        self.sizes[name] = size
+        self.floors[name] = min(self.floors[name], size)
+        encoded_name = name.encode()
+        self.records.append(RECORD.pack(TRUNCATE, len(encoded_name)) + encoded_name + TRUNCATE_SIZE.pack(size))
+
+
+    def covers(self, binary_file: BinaryFile) -> bool:
+        """Renvoie True si le fichier binary_file a des pages modifiées en mémoire."""
+        return binary_file.journal_name in self.sizes
+
+
+    def size(self, binary_file: BinaryFile) -> int:
+        """Renvoie la taille du fichier binary_file, écritures en mémoire comprises."""
+        return self.sizes[binary_file.journal_name] if self.covers(binary_file) else binary_file.size_in_place()
+
+
+    def read(self, binary_file: BinaryFile, size: int, pos: int) -> bytes:
+        """Renvoie (au plus) size bytes du fichier binary_file lus à la position pos, écritures en mémoire comprises."""
+        if not self.covers(binary_file):
+            return binary_file.read_in_place(size, pos)
+        name, PAGE_SIZE = binary_file.journal_name, self.PAGE_SIZE
+        pages, END = self.pages[name], min(pos + size, self.sizes[name])
+        data = bytearray()
+        for page in range(pos // PAGE_SIZE, (END - 1) // PAGE_SIZE + 1) if pos < END else ():
+            PAGE_START = page*PAGE_SIZE
+            start, stop = max(pos, PAGE_START), min(END, PAGE_START + PAGE_SIZE)
+            if page in pages:
+                data += pages[page][start - PAGE_START:stop - PAGE_START]
+            else:
+                data += self._read_on_disk(binary_file, stop - start, start)
+        return bytes(data)
+
+
+    def commit(self) -> None:
+        """Ajoute les enregistrements de l'opération terminée au journal, en une écriture (sans le synchroniser)."""
+        if self.records:
+            payload = b''.join(self.records)
+            os.write(self._fd(), FRAME.pack(WAL_MAGIC, len(payload), zlib.crc32(payload)) + payload)
+            self.pending += 1
+        self.records.clear()
+        self.before.clear()
+        self.sizes_before.clear()
+
+
+    def abort(self) -> None:
+        """Annule les écritures de l'opération en cours: les pages en mémoire redeviennent celles d'avant l'opération."""
+        for (name, page), content in self.before.items():
+            if content is None:
+                del self.pages[name][page]
+            else:
+                self.pages[name][page] = content
+        for name, (size, floor) in self.sizes_before.items():
+            if size is None:
+                del self.sizes[name]
+                del self.floors[name]
+                self.pages.pop(name, None)
+            else:
+                self.sizes[name], self.floors[name] = size, floor
+        self.records.clear()
+        self.before.clear()
+        self.sizes_before.clear()
+
+
+    def sync(self) -> bool:
+        """Synchronise le journal sur le disque puis applique les pages en mémoire aux fichiers. Les fichiers sont
+           eux-mêmes synchronisés et le journal vidé s'il dépasse CHECKPOINT_SIZE. Renvoie True si des fichiers ont changé."""
+        if self.depth:
+            raise ValueError("the journal can not be synchronized during an operation")
+        if self.pending:
+            os.fsync(self._fd())
+            self.pending = 0
+        changed = self.apply()
+        if self.wal_fd is not None and os.fstat(self.wal_fd).st_size > self.CHECKPOINT_SIZE:
+            self.checkpoint()
+        return changed
+
+
+    def apply(self) -> bool:
+        """Applique les pages en mémoire aux fichiers, sans synchroniser le journal ni les fichiers: les autres processus
+           voient les écritures, mais un arrêt du système avant sync peut en perdre une partie.
+           Renvoie True si des fichiers ont changé."""
+        if self.depth:
+            raise ValueError("the journal can not be applied during an operation")
+        changed = bool(self.pages)
+        for name, pages in self.pages.items():
+            fd = os.open(os.path.join(self.directory, name), os.O_RDWR | os.O_CREAT)
+            try:
+                SIZE = self.sizes[name]
+                for page, content in sorted(pages.items()):
+                    if page*self.PAGE_SIZE < SIZE:
+                        os.pwrite(fd, bytes(content[:SIZE - page*self.PAGE_SIZE]), page*self.PAGE_SIZE)
+                if os.fstat(fd).st_size != SIZE:
+                    os.ftruncate(fd, SIZE)
+            finally:
+                os.close(fd)
+            self.touched.add(name)
+        self.pages.clear()
+        self.sizes.clear()
+        self.floors.clear()
+        return changed
+
+
+    def checkpoint(self) -> bool:
+        """Applique toutes les opérations aux fichiers, les synchronise sur le disque et vide le journal.
+           Renvoie True si des fichiers ont changé."""
+        changed = self.sync()
+        for name in self.touched:
+            try:
+                fd = os.open(os.path.join(self.directory, name), os.O_RDONLY)
+            except FileNotFoundError:
+                continue
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+        self.touched.clear()
+        if self.owned:
+            os.ftruncate(self.wal_fd, 0)
+            os.fsync(self.wal_fd)
+            unlock(self.wal_fd)
+            self.owned = False
+        return changed
+
+
+    def orphaned(self) -> bool:
+        """Renvoie True si le journal contient des opérations laissées par une Database arrêtée avant de l'avoir vidé.
+           Celles d'une Database qui le tient encore verrouillé ne le sont pas: elle les applique aux fichiers sous
+           le verrou des tables qu'elles modifient."""
+        try:
+            if self.owned or os.stat(self.path).st_size == 0:
+                return False
+        except FileNotFoundError:
+            return False
+        if self.wal_fd is None:
+            self.wal_fd = os.open(self.path, os.O_WRONLY | os.O_CREAT | os.O_APPEND)
+        try:
+            lock(self.wal_fd, True, 0, "the journal")
+        except TimeoutError:
+            return False
+        unlock(self.wal_fd)
+        return True
+
+
+    def replay(self) -> set[str]:
+        """Rejoue dans les fichiers les opérations complètes du journal laissé par une Database arrêtée (après un crash),
+           puis le vide. Rien n'est fait si cette Database tient encore le journal.
+           Renvoie les noms des fichiers modifiés."""
+        if not self.orphaned():
+            return set()
+        if self.wal_fd is None:
+            self.wal_fd = os.open(self.path, os.O_WRONLY | os.O_CREAT | os.O_APPEND)
+        try:
+            lock(self.wal_fd, True, 0, "the journal")
+        except TimeoutError:
+            return set() # Son propriétaire est toujours là
+        self.owned = True
+        with open(self.path, 'rb') as wal_file:
+            content = wal_file.read()
+        cursor, fds = 0, {}
+        try:
+            while cursor + FRAME.size <= len(content):
+                magic, length, checksum = FRAME.unpack_from(content, cursor)
+                payload = content[cursor + FRAME.size:cursor + FRAME.size + length]
+                if magic != WAL_MAGIC or len(payload) < length or zlib.crc32(payload) != checksum:
+                    break # Opération interrompue par le crash
+                self._redo(payload, fds)
+                cursor += FRAME.size + length
+            for fd in fds.values():
+                os.fsync(fd)
+        finally:
+            for fd in fds.values():
+                os.close(fd)
+        self.checkpoint()
+        return set(fds)
+
+
+    def close(self) -> None:
+        """Ferme le fichier du journal s'il est ouvert."""
+        if self.wal_fd is not None:
+            os.close(self.wal_fd)
+            self.wal_fd = None
+
+
+    def _redo(self, payload: bytes, fds: dict[str, int]) -> None:
+        """Refait les écritures et troncatures des enregistrements payload d'une opération."""
+        cursor = 0
+        while cursor < len(payload):
+            record_type, name_length = RECORD.unpack_from(payload, cursor)
+            name = payload[cursor + RECORD.size:cursor + RECORD.size + name_length].decode()
+            cursor += RECORD.size + name_length
+            if name not in fds:
+                fds[name] = os.open(os.path.join(self.directory, name), os.O_RDWR | os.O_CREAT)
+            if record_type == WRITE:
+                pos, data_length = WRITE_HEADER.unpack_from(payload, cursor)
+                cursor += WRITE_HEADER.size
+                os.pwrite(fds[name], payload[cursor:cursor + data_length], pos)
+                cursor += data_length
+            else:
+                os.ftruncate(fds[name], TRUNCATE_SIZE.unpack_from(payload, cursor)[0])
+                cursor += TRUNCATE_SIZE.size
+
+
+    def _save_size(self, binary_file: BinaryFile) -> None:
+        """Retient la taille du fichier binary_file avant la première écriture de l'opération en cours."""
+        self._fd() # Le journal est verrouillé dès la première écriture, pas au commit où l'opération serait déjà faite
+        name = binary_file.journal_name
+        if name not in self.sizes_before:
+            self.sizes_before[name] = (self.sizes.get(name), self.floors.get(name))
+        if name not in self.sizes:
+            self.sizes[name] = self.floors[name] = binary_file.size_in_place()
+
+
+    def _read_on_disk(self, binary_file: BinaryFile, size: int, pos: int) -> bytes:
+        """Renvoie exactement size bytes du fichier binary_file sur le disque à la position pos, complétés par des zéros
+           (en particulier au-delà de ce qu'une troncature a coupé)."""
+        data = binary_file.read_in_place(max(min(size, self.floors[binary_file.journal_name] - pos), 0), pos)
+        return data.ljust(size, b'\0')
+
+
+    def _fd(self) -> int:
+        """Renvoie le descripteur du fichier du journal, ouvert en ajout et verrouillé par cette instance."""
+        if self.wal_fd is None:
+            self.wal_fd = os.open(self.path, os.O_WRONLY | os.O_CREAT | os.O_APPEND)
+        if not self.owned:
+            lock(self.wal_fd, True, self.LOCK_TIMEOUT, "the journal")
+            self.owned = True
+        return self.wal_fd
@@ -0,0 +1,198 @@
+"""Résumés par zone des tables ULDB (zone maps).
+
+Les entrées d'une table sont groupées en zones de ZONE_SIZE id consécutifs: la zone z contient les id z*ZONE_SIZE + 1
+à (z + 1)*ZONE_SIZE. Le fichier <db>/<table>.zones contient un enregistrement de taille fixe par zone: un byte qui vaut 1
+si le résumé est périmé, puis pour chaque champ, dans l'ordre de la signature, le minimum et le maximum de ses valeurs
+(INTEGER, deux entiers de 4 bytes little-endian) ou un filtre de Bloom de BLOOM_BITS bits de ses chaînes encodées (STRING).
+Une zone sans entrée a un minimum plus grand que son maximum et des filtres vides.
+Un résumé décrit toujours un surensemble des valeurs de sa zone: un ajout ou une modification l'élargit, une suppression
+n'y change rien. Un résumé modifié ou dont des entrées ont été supprimées est marqué périmé, il n'est plus exact tant que
+vacuum ne l'a pas reconstruit, mais il sert toujours à écarter les zones qui ne peuvent contenir aucune entrée cherchée.
+"""
+from binary import BinaryFile
+from itertools import groupby
+from typing import Callable, Iterable, TYPE_CHECKING
+import os
+import struct
+import zlib
+
+if TYPE_CHECKING:
+    from wal import Journal
+
+ZONE_SIZE = 1024 # Nombre d'id par zone (multiple de 8, cf. column.DeletionBitmap)
+BLOOM_BITS = 8192 # Taille du filtre de Bloom d'un champ STRING par zone: environ 3% de faux positifs pour ZONE_SIZE chaînes
+BLOOM_HASHES = 3
+BOUNDS = struct.Struct('<ii')
+EMPTY_BOUNDS = BOUNDS.pack(2**31 - 1, -2**31)
+# Teste si une zone dont les valeurs sont entre low et high peut contenir une valeur telle que valeur operator value
+RANGE_TESTS: dict[str, Callable[[int, int, int | tuple[int, int]], bool]] = {
+    '=': lambda low, high, value: low <= value <= high,
+    '!=': lambda low, high, value: not low == high == value,
+    '<': lambda low, high, value: low < value,
+    '<=': lambda low, high, value: low <= value,
+    '>': lambda low, high, value: high > value,
+    '>=': lambda low, high, value: high >= value,
+    'between': lambda low, high, value: low <= value[1] and high >= value[0],
+}
+
+
+def zone_count(last_id: int) -> int:
+    """Renvoie le nombre de zones d'une table dont le dernier id utilisé est last_id."""
+    return (last_id + ZONE_SIZE - 1) // ZONE_SIZE
+
+
+def bloom_bits(value: bytes) -> list[int]:
+    """Renvoie les bits du filtre de Bloom qui représentent la chaîne encodée value (double hachage)."""
+    first, step = zlib.crc32(value), zlib.adler32(value) | 1
+    return [(first + i*step) % BLOOM_BITS for i in range(BLOOM_HASHES)]
+
+
+class ZoneMap:
+    """Résumés des zones d'une table: le fichier n'est lu qu'au premier besoin puis gardé en mémoire."""
+
+    def __init__(self, path: str, fields: list[tuple[str, bool]], journal: 'Journal | None' = None):
+        """Constructeur de ZoneMap pour les champs fields, des couples (nom, True si le champ est de type STRING) dans
+           l'ordre de la signature. Si journal est donné, les écritures dans le fichier passent par ce journal (cf. wal)."""
+        self.path, self.journal = path, journal
+        self.offsets: dict[str, tuple[int, bool]] = {} # Position du résumé de chaque champ dans un enregistrement
+        offset = 1
+        for field_name, string in fields:
+            self.offsets[field_name] = (offset, string)
+            offset += BLOOM_BITS // 8 if string else BOUNDS.size
+        self.record_size = offset
+        self.records: list[bytearray] | None = None
+        self.zones_file: BinaryFile | None = None
+
+
+    def exists(self, last_id: int) -> bool:
+        """Renvoie True si le fichier existe et contient le résumé de chaque zone des last_id premiers id."""
+        return os.path.exists(self.path) and self._file().get_size() >= self.record_size*zone_count(last_id)
+
+
+    def rebuild(self, entries: Iterable[tuple[int, list[int | bytes]]], last_id: int) -> None:
+        """Réécrit tout le fichier à partir des couples (id, valeurs des champs) entries des entrées existantes,
+           les chaînes étant encodées. Aucun résumé n'est périmé."""
+        records = [self._empty() for _ in range(zone_count(last_id))]
+        for zone, zone_entries in groupby(entries, lambda entry: (entry[0] - 1) // ZONE_SIZE):
+            self._widen(records[zone], [values for _, values in zone_entries])
+        if not os.path.exists(self.path):
+            self.close()
+            open(self.path, 'wb').close()
+        self._file().write_bytes_to(b''.join(records), 0)
+        self._file().truncate(self.record_size*len(records))
+        self.records = records
+
+
+    def load(self) -> list[bytearray]:
+        """Lit le fichier au premier appel et renvoie les enregistrements des zones."""
+        if self.records is None:
+            zones_file = self._file()
+            data = zones_file.read_bytes_from(zones_file.get_size(), 0)
+            self.records = [bytearray(data[pos:pos + self.record_size])\
+                            for pos in range(0, len(data) - self.record_size + 1, self.record_size)]
+        return self.records
+
+
+    def add(self, first_id: int, entries: list[list[int | bytes]]) -> None:
+        """Élargit les résumés des zones des valeurs des champs entries des entrées d'id first_id, first_id + 1, ...
+           (les chaînes étant encodées) et les écrit en une fois."""
+        if not entries:
+            return
+        records = self.load()
+        FIRST_ZONE, LAST_ZONE = (first_id - 1) // ZONE_SIZE, (first_id + len(entries) - 2) // ZONE_SIZE
+        while len(records) <= LAST_ZONE:
+            records.append(self._empty())
+        for zone in range(FIRST_ZONE, LAST_ZONE + 1):
+            START = max(zone*ZONE_SIZE + 1 - first_id, 0)
+            self._widen(records[zone], entries[START:(zone + 1)*ZONE_SIZE + 1 - first_id])
+        self._file().write_bytes_to(b''.join(records[FIRST_ZONE:LAST_ZONE + 1]), FIRST_ZONE*self.record_size)
+
+
+    def update(self, entry_ids: Iterable[int], field_name: str, value: int | bytes) -> None:
+        """Ajoute la nouvelle valeur value (encodée pour une chaîne) du champ field_name aux résumés des zones des entrées
+           d'id entry_ids, qui deviennent périmés, et les écrit."""
+        records, (OFFSET, STRING) = self.load(), self.offsets[field_name]
+        SIZE = BLOOM_BITS // 8 if STRING else BOUNDS.size
+        for zone in sorted({(entry_id - 1) // ZONE_SIZE for entry_id in entry_ids}):
+            record = records[zone]
+            record[0] = 1
+            self._widen(record, [[value]], {field_name: (OFFSET, STRING)})
+            self._file().write_bytes_to(bytes(record[:1]), zone*self.record_size)
+            self._file().write_bytes_to(bytes(record[OFFSET:OFFSET + SIZE]), zone*self.record_size + OFFSET)
+
+
+    def mark_stale(self, entry_ids: Iterable[int]) -> None:
+        """Marque périmés les résumés des zones des entrées d'id entry_ids (supprimées)."""
+        records = self.load()
+        for zone in {(entry_id - 1) // ZONE_SIZE for entry_id in entry_ids}:
+            if not records[zone][0]:
+                records[zone][0] = 1
+                self._file().write_integer_to(1, 1, zone*self.record_size)
+
+
+    def stale(self) -> bool:
+        """Renvoie True si au moins un résumé est périmé."""
+        return any(record[0] for record in self.load())
+
+
+    def candidates(self, field_name: str, operator: str, value: int | str | tuple) -> set[int] | None:
+        """Renvoie les zones qui peuvent contenir des entrées telles que field_name operator value d'après leurs résumés,
+           None si les résumés ne peuvent pas répondre (intervalles et préfixes de chaînes). L'opérateur between a pour valeur
+           le couple (minimum, maximum). Convient comme lookup de Predicate.candidates."""
+        records = self.load()
+        if field_name == 'id':
+            if operator not in RANGE_TESTS:
+                return None
+            test = RANGE_TESTS[operator]
+            return {zone for zone in range(len(records)) if test(zone*ZONE_SIZE + 1, (zone + 1)*ZONE_SIZE, value)}
+        OFFSET, STRING = self.offsets[field_name]
+        if STRING:
+            if operator != '=':
+                return None
+            bits = [(OFFSET + (bit >> 3), 1 << (bit & 7)) for bit in bloom_bits(value.encode())]
+            return {zone for zone, record in enumerate(records) if all(record[pos] & mask for pos, mask in bits)}
+        if operator not in RANGE_TESTS:
+            return None
+        test, unpack_bounds = RANGE_TESTS[operator], BOUNDS.unpack_from
+        return {zone for zone, record in enumerate(records) if test(*unpack_bounds(record, OFFSET), value)}
+
+
+    def close(self) -> None:
+        """Ferme le fichier s'il est ouvert, les résumés gardés en mémoire sont oubliés."""
+        if self.zones_file is not None:
+            self.zones_file.file.close()
+            self.zones_file = None
+        self.records = None
+
+
+    def _empty(self) -> bytearray:
+        """Renvoie l'enregistrement d'une zone sans entrée."""
+        record = bytearray(self.record_size)
+        for OFFSET, STRING in self.offsets.values():
+            if not STRING:
+                record[OFFSET:OFFSET + BOUNDS.size] = EMPTY_BOUNDS
+        return record
+
+
+    def _widen(self, record: bytearray, entries: list[list[int | bytes]], offsets: dict[str, tuple[int, bool]] | None = None)\
+               -> None:
+        """Ajoute les valeurs des champs entries d'entrées de la même zone au résumé record de cette zone.
+           offsets donne les champs des valeurs, tous ceux de la signature par défaut."""
+        for i, (OFFSET, STRING) in enumerate((offsets or self.offsets).values()):
+            values = [entry[i] for entry in entries]
+            if STRING:
+                for value in values:
+                    first, step = zlib.crc32(value), zlib.adler32(value) | 1
+                    for bit in range(first, first + BLOOM_HASHES*step, step):
+                        bit %= BLOOM_BITS
+                        record[OFFSET + (bit >> 3)] |= 1 << (bit & 7)
+            elif values:
+                low, high = BOUNDS.unpack_from(record, OFFSET)
+                BOUNDS.pack_into(record, OFFSET, min(low, min(values)), max(high, max(values)))
+
+
+    def _file(self) -> BinaryFile:
+        """Renvoie le fichier des résumés, ouvert sans buffer."""
+        if self.zones_file is None:
+            self.zones_file = BinaryFile(open(self.path, 'rb+', buffering = 0), self.journal)
+        return self.zones_file